@@ -0,0 +1,348 @@
+'''
+Benchmarks of the step loop, run without any parallel port hardware.
+
+$ python -m stepper_motor.benchmark
+$ python -m stepper_motor.benchmark --output results.json --baseline last.json
+
+Startup of the command line is timed first, for commands which do not move
+the motor, against starting the interpreter alone. Each run then moves a
+motor through a sweep of step delays and move lengths on the dry-run and
+simulated port backends, timing every port write against the deadline it
+was scheduled for. Results may be written to JSON and compared
+with the results of an earlier release to catch regressions.
+'''
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from array import array
+
+from stepper_motor.motor_position import (
+    COIL_PHASES,
+    STEPS_PER_REV,
+    StepperMotor,
+    logger,
+)
+from stepper_motor.ports import DryRunPort, SimulatedPort
+from stepper_motor.scheduler import StepScheduler, monotonic
+
+DRY_RUN = 'dry-run'
+SIMULATED = 'simulated'
+BACKENDS = (DRY_RUN, SIMULATED)
+
+DELAYS = (0.0, 0.0001, 0.0005, 0.002)
+LENGTHS = (100, 1000)
+
+# command lines of motor_position timed by time_startup
+STARTUP_COMMANDS = (('--status',), ('--list',), ('--plan', '--rotate', '90'))
+
+
+def max_step_rate(steps=20000, trace=False, stream=None):
+    '''
+    Measures the number of steps per second the step loop can issue with no
+    delay between steps.
+
+    :param steps: Number of steps to move
+    :type steps: int
+    :param trace: Enable the per step debug trace
+    :type trace: bool
+    :param stream: Where the trace is written, defaults to os.devnull
+    :type stream: file
+    :returns: Steps per second
+    :rtype: float
+    '''
+    stepper = StepperMotor(COIL_PHASES, delay=0, steps_per_rev=STEPS_PER_REV,
+                           port=DryRunPort())
+
+    level = logger.level
+    propagate = logger.propagate
+    handler = opened = None
+    if trace:
+        if stream is None:
+            stream = opened = open(os.devnull, 'w')
+        handler = logging.StreamHandler(stream)
+        logger.addHandler(handler)
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+    try:
+        start = monotonic()
+        stepper.turn_motor(float(steps) / STEPS_PER_REV)
+        elapsed = monotonic() - start
+    finally:
+        logger.setLevel(level)
+        logger.propagate = propagate
+        if handler:
+            logger.removeHandler(handler)
+        if opened is not None:
+            opened.close()
+    return steps / elapsed
+
+
+class _TimedPort(DryRunPort):
+    '''
+    Dry run port recording the time of every write.
+    '''
+    def __init__(self, clock):
+        self.clock = clock
+        self.times = array('d')
+
+    def setData(self, value):
+        self.times.append(self.clock())
+
+
+class _Clock(object):
+    # SimulatedPort reads the time from a clock object
+    def __init__(self, time):
+        self.time = time
+
+
+def time_startup(commands=STARTUP_COMMANDS, runs=10):
+    '''
+    Times command line runs of motor_position from process start to exit,
+    sharing a state file which the first run creates.
+
+    :param commands: Arguments of each command line to time
+    :type commands: sequence of tuples
+    :param runs: Number of times to run each command
+    :type runs: int
+    :returns: Command line, runs and median, min and max seconds of each
+        command, the first being the interpreter starting and exiting alone
+    :rtype: list of dicts
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        path for path in (root, env.get('PYTHONPATH')) if path)
+    directory = tempfile.mkdtemp()
+    state_file = os.path.join(directory, 'motor_state.ini')
+    command_lines = [[sys.executable, '-c', 'pass']] + [
+        [sys.executable, '-m', 'stepper_motor.motor_position',
+         '--state_file', state_file] + list(command)
+        for command in commands]
+    results = []
+    try:
+        with open(os.devnull, 'w') as devnull:
+            for command_line in command_lines:
+                durations = []
+                for _ in xrange(runs):
+                    start = monotonic()
+                    subprocess.check_call(command_line, env=env,
+                                          stdout=devnull, stderr=devnull)
+                    durations.append(monotonic() - start)
+                results.append({'command': ' '.join(command_line[1:]),
+                                'runs': runs,
+                                'median': percentile(durations, 0.5),
+                                'min': min(durations),
+                                'max': max(durations)})
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def percentile(values, fraction):
+    '''
+    :param values: Samples
+    :type values: sequence of floats
+    :param fraction: Fraction of samples at or below the result, 0-1
+    :type fraction: float
+    :returns: Nearest rank percentile, or 0.0 without samples
+    :rtype: float
+    '''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = int(round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def time_move(steps, delay, backend=DRY_RUN, scheduler=None):
+    '''
+    Moves a motor and measures how far from its deadline each step was
+    written.
+
+    The first step is due at the start of the move and each later step at
+    the deadline the previous step waited for, so the timing error includes
+    the cost of the step loop and port write as well as the lateness of the
+    scheduler.
+
+    :param steps: Signed number of steps to move
+    :type steps: int
+    :param delay: Delay between steps
+    :type delay: float
+    :param backend: DRY_RUN or SIMULATED
+    :type backend: str
+    :param scheduler: Scheduler pacing the steps, defaults to a new
+        StepScheduler
+    :type scheduler: StepScheduler
+    :returns: Summary of the move, times in seconds
+    :rtype: dict
+    '''
+    if scheduler is None:
+        scheduler = StepScheduler()
+    if backend == DRY_RUN:
+        port = _TimedPort(scheduler.clock)
+    elif backend == SIMULATED:
+        port = SimulatedPort(COIL_PHASES, clock=_Clock(scheduler.clock))
+    else:
+        raise ValueError("Unknown backend '%s', expected one of %s"
+                         % (backend, ', '.join(BACKENDS)))
+    stepper = StepperMotor(COIL_PHASES, delay=delay, scheduler=scheduler,
+                           steps_per_rev=STEPS_PER_REV, port=port)
+    plan = stepper.plan_steps(steps)
+    stepper.execute(plan)
+
+    origin = scheduler.origin
+    due = array('d', [origin])
+    due.extend(origin + offset for offset in plan.times[:-1])
+    errors = [written - deadline for written, deadline in zip(port.times, due)]
+
+    # the move ends once the last deadline has been waited for
+    overrun = scheduler.jitter()['overrun']
+    elapsed = plan.duration + overrun
+    result = {
+        'backend': backend,
+        'delay': delay,
+        'steps': len(plan),
+        'duration': plan.duration,
+        'elapsed': elapsed,
+        'overrun': overrun,
+        'steps_per_sec': len(plan) / elapsed if elapsed > 0 else None,
+        'p50': percentile(errors, 0.5),
+        'p99': percentile(errors, 0.99),
+        'max': max(errors) if errors else 0.0,
+    }
+    if backend == SIMULATED:
+        result['faults'] = len(port.faults)
+    return result
+
+
+def run_suite(delays=DELAYS, lengths=LENGTHS, backends=BACKENDS,
+              scheduler=None):
+    '''
+    Times moves of every combination of backend, delay and length.
+
+    :param delays: Delays between steps
+    :type delays: sequence of floats
+    :param lengths: Numbers of steps to move
+    :type lengths: sequence of ints
+    :param backends: Backends to move on
+    :type backends: sequence of str
+    :param scheduler: Scheduler pacing the steps, defaults to a new
+        StepScheduler per move
+    :type scheduler: StepScheduler
+    :returns: Results of time_move
+    :rtype: list of dicts
+    '''
+    return [time_move(length, delay, backend, scheduler)
+            for backend in backends
+            for delay in delays
+            for length in lengths]
+
+
+def compare(results, baseline, tolerance=0.2):
+    '''
+    Finds the moves which have become slower or less accurate than in a
+    baseline run.
+
+    :param results: Results of run_suite
+    :type results: list of dicts
+    :param baseline: Results of an earlier run_suite
+    :type baseline: list of dicts
+    :param tolerance: Fraction by which a measurement may worsen
+    :type tolerance: float
+    :returns: (result, field, baseline value) of each regression
+    :rtype: list of tuples
+    '''
+    previous = dict(((r['backend'], r['delay'], r['steps']), r)
+                    for r in baseline)
+    regressions = []
+    for result in results:
+        old = previous.get((result['backend'], result['delay'],
+                            result['steps']))
+        if old is None:
+            continue
+        # only unpaced moves measure the ceiling of the step rate
+        if result['delay'] == 0 and old['steps_per_sec'] and \
+           result['steps_per_sec'] < old['steps_per_sec'] * (1 - tolerance):
+            regressions.append((result, 'steps_per_sec', old['steps_per_sec']))
+        for field in ('p99', 'max'):
+            if result[field] > old[field] * (1 + tolerance) and \
+               result[field] - old[field] > 1e-5:
+                regressions.append((result, field, old[field]))
+    return regressions
+
+
+def report(results, stream=sys.stdout):
+    stream.write("%-10s %8s %6s %12s %10s %10s %10s %10s\n" % (
+        'backend', 'delay', 'steps', 'steps/sec', 'p50 us', 'p99 us',
+        'max us', 'overrun us'))
+    for r in results:
+        stream.write("%-10s %8.4f %6d %12.0f %10.1f %10.1f %10.1f %10.1f\n" % (
+            r['backend'], r['delay'], r['steps'], r['steps_per_sec'] or 0,
+            r['p50'] * 1e6, r['p99'] * 1e6, r['max'] * 1e6,
+            r['overrun'] * 1e6))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the step loop.")
+    parser.add_argument('-s', '--steps', type=int, default=20000,
+                        help='Number of steps to move when measuring the maximum step rate.')
+    parser.add_argument('--delays', type=float, nargs='+', default=DELAYS,
+                        help='Delays between steps to time moves with.')
+    parser.add_argument('--lengths', type=int, nargs='+', default=LENGTHS,
+                        help='Numbers of steps to time moves of.')
+    parser.add_argument('--backend', choices=BACKENDS, action='append',
+                        help='Backend to time moves on, may be repeated. Defaults to all.')
+    parser.add_argument('--startup_runs', type=int, default=10,
+                        help='Number of times to time each command line startup, 0 to skip.')
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Write the results to a JSON file.')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='JSON results of an earlier run to check for regressions.')
+    args = parser.parse_args()
+
+    startup = []
+    if args.startup_runs > 0:
+        startup = time_startup(runs=args.startup_runs)
+        for result in startup:
+            print "%-8.1f ms median startup  %s" % (result['median'] * 1000,
+                                                   result['command'])
+        print
+
+    rates = {}
+    for trace in (False, True):
+        rate = rates['trace' if trace else 'no_trace'] = \
+            max_step_rate(args.steps, trace=trace)
+        print "%-15s %10.0f steps/sec" % (
+            'with trace' if trace else 'without trace', rate)
+    print
+
+    results = run_suite(args.delays, args.lengths,
+                        args.backend or BACKENDS)
+    report(results)
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'max_step_rate': rates,
+                       'startup': startup,
+                       'results': results}, fh, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)['results']
+        regressions = compare(results, baseline)
+        for result, field, old in regressions:
+            print "Regression: %s delay %g, %d steps: %s %g was %g" % (
+                result['backend'], result['delay'], result['steps'], field,
+                result[field], old)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    '''
+    Bounded mapping which discards the least recently used entry when full and
+    counts hits and misses.
+    '''
+    def __init__(self, maxsize=128):
+        '''
+        :param maxsize: Maximum number of entries to keep
+        :type maxsize: int
+        '''
+        if maxsize < 1:
+            raise ValueError("Cache maxsize must be at least 1, got %s" % maxsize)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        '''
+        Returns the cached value for key, marking it as most recently used.
+
+        :param key: Cache key
+        :type key: hashable
+        :param default: Returned when key is not cached
+        :returns: Cached value or default
+        '''
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        '''
+        Caches value for key, discarding the least recently used entry if the
+        cache is full.
+
+        :param key: Cache key
+        :type key: hashable
+        :param value: Value to cache
+        '''
+        self._data.pop(key, None)
+        if len(self._data) >= self.maxsize:
+            self._data.popitem(last=False)
+        self._data[key] = value
+
+    def clear(self):
+        '''
+        Removes all entries and resets the statistics.
+        '''
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        '''
+        :returns: hits, misses, size and maxsize of the cache
+        :rtype: dict
+        '''
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._data), 'maxsize': self.maxsize}
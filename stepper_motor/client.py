@@ -0,0 +1,130 @@
+'''
+Thin client of stepper_motor.daemon. Only the standard library is imported so
+that each command starts quickly.
+
+$ python -m stepper_motor.client --rotate 45
+'''
+import json
+import socket
+
+DEFAULT_SOCKET = '/tmp/stepper_motor.sock'
+
+
+class DaemonError(Exception):
+    pass
+
+
+class MotorClient(object):
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=None):
+        '''
+        :param socket_path: Path of the daemon's Unix socket
+        :type socket_path: str
+        :param timeout: Seconds to wait for a response, defaults to forever
+            as moves may be long
+        :type timeout: float
+        '''
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(socket_path)
+        self.stream = self.socket.makefile('rw')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+    def send(self, command, value=None):
+        '''
+        :param command: Name of the command
+        :type command: str
+        :param value: Argument of the command, if any
+        :returns: Response of the daemon
+        :rtype: dict
+        :raises DaemonError: if the command failed
+        '''
+        request = {'command': command}
+        if value is not None:
+            request['value'] = value
+        self.stream.write(json.dumps(request) + '\n')
+        self.stream.flush()
+        line = self.stream.readline()
+        if not line:
+            raise DaemonError("Daemon closed the connection")
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise DaemonError(response.get('error'))
+        return response
+
+
+def send_command(command, value=None, socket_path=DEFAULT_SOCKET):
+    '''
+    Sends one command to the daemon.
+
+    :param command: Name of the command
+    :type command: str
+    :param value: Argument of the command, if any
+    :param socket_path: Path of the daemon's Unix socket
+    :type socket_path: str
+    :returns: Response of the daemon
+    :rtype: dict
+    '''
+    with MotorClient(socket_path) as client:
+        return client.send(command, value)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Control a motor through stepper_motor.daemon.")
+    parser.add_argument('-c', '--cycle', type=float, default=None,
+                        help='Number of clockwise loops to cycle the motor. Negative cycles turn the motor counter clockwise!')
+    parser.add_argument('-r', '--rotate', type=float, default=None,
+                        help='Angle to rotate motor clockwise to. Negative rotate turns the motor counter clockwise!')
+    parser.add_argument('-a', '--angle', type=float, default=None,
+                        help='Absolute angle to rotate motor to. Range 0-360 degrees.')
+    parser.add_argument('-d', '--delay', type=float, default=None,
+                        help='Change the delay between stepper positions.')
+    parser.add_argument('--reset', action='store_true', default=False,
+                        help='Reset stored state to 0 degrees before processing request.')
+    parser.add_argument('--stop', action='store_true', default=False,
+                        help='Stop the move in progress, e.g. one requested from another terminal.')
+    parser.add_argument('--shutdown', action='store_true', default=False,
+                        help='Stop the daemon.')
+    parser.add_argument('-s', '--socket', type=str, default=DEFAULT_SOCKET,
+                        help='Path of the daemon socket.')
+    args = parser.parse_args()
+
+    if len([arg for arg in (args.cycle, args.rotate, args.angle)
+            if arg is not None]) > 1:
+        parser.error('Cannot combine cycle, rotate and angle, please provide only one!')
+
+    commands = []
+    if args.stop:
+        commands.append(('stop', None))
+    if args.reset:
+        commands.append(('reset', None))
+    if args.delay is not None:
+        commands.append(('delay', args.delay))
+    if args.cycle is not None:
+        commands.append(('cycle', args.cycle))
+    elif args.rotate is not None:
+        commands.append(('rotate', args.rotate))
+    elif args.angle is not None:
+        commands.append(('angle', args.angle))
+    if args.shutdown:
+        commands.append(('shutdown', None))
+    if not commands:
+        commands.append(('state', None))
+
+    try:
+        with MotorClient(args.socket) as client:
+            for command, value in commands:
+                response = client.send(command, value)
+    except (socket.error, DaemonError) as err:
+        parser.exit(1, "%s\n" % err)
+    print "State index %02d, position %d, %03.2f degrees" % (
+        response['state'], response['position'], response['angle'])
@@ -0,0 +1,222 @@
+'''
+Long running server which keeps a StepperMotor and its port open and takes
+commands over a local Unix socket, saving the interpreter start up and state
+file read of running the command line tool for every move.
+
+$ python -m stepper_motor.daemon --socket /tmp/stepper_motor.sock
+
+The protocol is one JSON object per line in each direction. Requests have a
+command and, for most commands, a value:
+
+    {"command": "rotate", "value": 45}
+    {"ok": true, "state": 24, "position": 24, "angle": 45.0}
+
+Failed requests get {"ok": false, "error": "..."}. See stepper_motor.client
+for a command line client.
+
+Each connection is handled on a thread of its own. Moves, reset and delay
+wait for the move in progress, so moves never overlap, while state and stop
+answer at once: {"command": "stop"} stops the move in progress, decelerating
+with --stop_deceleration.
+'''
+import argparse
+import json
+import logging
+import os
+import SocketServer
+import threading
+
+from stepper_motor.client import DEFAULT_SOCKET
+from stepper_motor.motor_position import (
+    COIL_PHASES,
+    STEPS_PER_REV,
+    StepperMotor,
+    load_state,
+    save_state,
+    state_to_angle,
+)
+from stepper_motor.ports import ShadowPort, open_parallel
+from stepper_motor.state import Checkpoint, StateFile, StateLocked
+from stepper_motor.stop import StopToken
+
+logger = logging.getLogger(__name__)
+
+
+class MotorRequestHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                response = self.server.dispatch(request)
+            except Exception as err:
+                logger.warning("Request %s failed: %s", line.strip(), err)
+                response = {'ok': False, 'error': str(err)}
+            self.wfile.write(json.dumps(response) + '\n')
+            self.wfile.flush()
+
+
+class MotorServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    '''
+    Handles each connection on its own thread, taking turns to move the
+    motor so that moves requested by different clients never overlap.
+    '''
+    # connections do not keep the server from exiting
+    daemon_threads = True
+
+    def __init__(self, socket_path, stepper, state_file=None,
+                 deceleration=None):
+        '''
+        :param socket_path: Path of the Unix socket to listen on, replacing
+            any stale socket left by a previous server
+        :type socket_path: str
+        :param stepper: Motor to control
+        :type stepper: StepperMotor
+        :param state_file: State to save the position to after every move
+        :type state_file: StateFile
+        :param deceleration: Deceleration in steps per second squared to
+            stop a move with, defaults to stopping before the next step
+        :type deceleration: float
+        '''
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        SocketServer.UnixStreamServer.__init__(self, socket_path,
+                                               MotorRequestHandler)
+        self.stepper = stepper
+        self.state_file = state_file
+        self.stop_token = StopToken(deceleration)
+        # held while the motor moves or its settings change
+        self._moving = threading.Lock()
+        self.commands = {
+            'cycle': self.cycle,
+            'rotate': self.rotate,
+            'angle': self.angle,
+            'delay': self.delay,
+            'reset': self.reset,
+            'state': self.state,
+            'stop': self.stop,
+            'shutdown': self.shutdown_later,
+        }
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+    def dispatch(self, request):
+        '''
+        :param request: Decoded request
+        :type request: dict
+        :returns: Response to encode
+        :rtype: dict
+        '''
+        command = request.get('command')
+        if command not in self.commands:
+            raise ValueError("Unknown command '%s', expected one of %s"
+                             % (command, ', '.join(sorted(self.commands))))
+        if 'value' in request:
+            self.commands[command](request['value'])
+        else:
+            self.commands[command]()
+        return self.state()
+
+    def _move(self, plan):
+        # plan is called once the move before has finished, so that it
+        # starts from where that move ended
+        with self._moving:
+            self.stop_token.clear()
+            try:
+                self.stepper.execute(plan(), self.stop_token)
+            finally:
+                if self.state_file:
+                    save_state(self.state_file, self.stepper.position)
+
+    def cycle(self, cycles):
+        self._move(lambda: self.stepper.plan_motor(float(cycles)))
+
+    def rotate(self, degrees):
+        self._move(lambda: self.stepper.plan_rotate(float(degrees)))
+
+    def angle(self, angle):
+        self._move(lambda: self.stepper.plan_to_angle(float(angle)))
+
+    def delay(self, delay):
+        with self._moving:
+            self.stepper.delay = float(delay)
+
+    def reset(self, position=0):
+        '''
+        Sets the current position of the motor without moving it.
+        '''
+        with self._moving:
+            self.stepper.position = int(position)
+            if self.state_file:
+                save_state(self.state_file, self.stepper.position)
+
+    def stop(self):
+        '''
+        Stops the move in progress, if any. Moves requested afterwards run as
+        normal.
+        '''
+        self.stop_token.set()
+
+    def state(self):
+        stepper = self.stepper
+        return {'ok': True, 'state': stepper.state,
+                'position': stepper.position, 'delay': stepper.delay,
+                'angle': state_to_angle(stepper.state, stepper.steps_per_rev)}
+
+    def shutdown_later(self):
+        # shutdown waits for serve_forever to return so cannot be called
+        # from the thread handling this request
+        threading.Thread(target=self.shutdown).start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve motor commands over a Unix socket.")
+    parser.add_argument('-s', '--socket', type=str, default=DEFAULT_SOCKET,
+                        help='Path of the Unix socket to listen on.')
+    parser.add_argument('-d', '--delay', type=float, default=0.05,
+                        help='Delay between stepper positions. Controls speed of motor!')
+    parser.add_argument('--state_file', type=str, default='motor_state.ini',
+                        help='Path of file to store motor position state.')
+    parser.add_argument('--checkpoint', type=int, default=0, metavar='STEPS',
+                        help='Record the position every STEPS steps so that an interrupted move can be resumed.')
+    parser.add_argument('--stop_deceleration', type=float, default=400.0,
+                        help='Deceleration in steps per second squared to stop a move with on the stop command, 0 to stop at once.')
+    parser.add_argument('-v', '--verbose', action='store_true', default=False,
+                        help='Log every step of the motor (slows fast moves).')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(message)s',
+                        level=logging.DEBUG if args.verbose else logging.INFO)
+
+    state_file = StateFile(args.state_file)
+    # command line runs must not move the motor while the daemon owns it
+    try:
+        state_file.lock(blocking=False)
+    except StateLocked as err:
+        parser.error('%s, e.g. another daemon or a command line run' % err)
+    checkpoint_path = args.state_file + '.checkpoint'
+    if args.checkpoint or os.path.isfile(checkpoint_path):
+        checkpoint = Checkpoint(checkpoint_path)
+    else:
+        checkpoint = None
+    # the port stays open between moves so repeated values need not be
+    # written again
+    stepper = StepperMotor(COIL_PHASES, load_state(state_file, checkpoint),
+                           args.delay, steps_per_rev=STEPS_PER_REV,
+                           port=ShadowPort(open_parallel()))
+    if args.checkpoint:
+        stepper.checkpoint = checkpoint
+        stepper.checkpoint_every = args.checkpoint
+    server = MotorServer(args.socket, stepper, state_file,
+                         args.stop_deceleration or None)
+    logger.info("Listening on %s", args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,169 @@
+'''
+Moves a StepperMotor from the timers of an event loop rather than blocking
+the loop with sleeps, so many motors and network handlers can share one
+loop.
+
+Any loop which can call a function after a delay may be used, e.g. asyncio
+(or trollius) loop.call_later, Tornado IOLoop.call_later or Twisted
+reactor.callLater:
+
+    stepper = EventLoopStepper(motor, loop.call_later)
+    move = stepper.rotate(90)
+    move.add_done_callback(on_moved)
+
+Loop timers are only accurate to around a millisecond. For faster motors
+precise=True runs the steps on a MotorWorker thread, paced by its
+StepScheduler, and completes the futures on the loop through
+call_soon_threadsafe.
+'''
+from collections import deque
+
+from stepper_motor.scheduler import monotonic
+from stepper_motor.worker import MotorWorker, MoveFuture
+
+
+class EventLoopStepper(object):
+    def __init__(self, motor, call_later, call_soon_threadsafe=None,
+                 precise=False, clock=monotonic):
+        '''
+        :param motor: Motor to move, which should only be moved through this
+            object
+        :type motor: StepperMotor
+        :param call_later: Loop function scheduling a callback after a delay
+            in seconds, called as call_later(delay, callback)
+        :type call_later: callable
+        :param call_soon_threadsafe: Loop function scheduling a callback from
+            another thread, required when precise
+        :type call_soon_threadsafe: callable
+        :param precise: Run the steps on a worker thread rather than from
+            loop timers
+        :type precise: bool
+        :param clock: Clock with the same epoch as used to calculate delays
+        :type clock: callable
+        '''
+        self.motor = motor
+        self.call_later = call_later
+        self.call_soon_threadsafe = call_soon_threadsafe
+        self.clock = clock
+        self._moves = deque()
+        self._current = None
+        self._stopped = False
+        if precise:
+            if call_soon_threadsafe is None:
+                raise ValueError("call_soon_threadsafe is required to complete "
+                                 "precise moves on the loop")
+            self.worker = MotorWorker(motor)
+        else:
+            self.worker = None
+
+    @property
+    def moving(self):
+        return self._current is not None
+
+    def turn_motor(self, cycles):
+        '''
+        :param cycles: Loops to turn
+        :type cycles: float
+        :returns: Future of the new state position
+        :rtype: MoveFuture
+        '''
+        return self._submit('turn_motor', self.motor.plan_motor, cycles)
+
+    def rotate(self, degrees):
+        '''
+        :param degrees: Degrees to turn motor by
+        :type degrees: float
+        :returns: Future of the new state position
+        :rtype: MoveFuture
+        '''
+        return self._submit('rotate', self.motor.plan_rotate, degrees)
+
+    def turn_to_angle(self, angle):
+        '''
+        :param angle: Angle to turn to
+        :type angle: float
+        :returns: Future of the new state position
+        :rtype: MoveFuture
+        '''
+        return self._submit('turn_to_angle', self.motor.plan_to_angle, angle)
+
+    def stop(self):
+        '''
+        Stops the current move before its next step and cancels queued moves.
+        '''
+        if self.worker is not None:
+            self.worker.stop()
+            return
+        while self._moves:
+            self._moves.popleft()[0].cancel()
+        if self._current is not None:
+            self._stopped = True
+
+    def close(self):
+        '''
+        Stops the worker thread of a precise stepper.
+        '''
+        if self.worker is not None:
+            self.worker.shutdown()
+
+    def _submit(self, name, planner, argument):
+        future = MoveFuture()
+        if self.worker is not None:
+            moved = getattr(self.worker, name)(argument)
+            moved.add_done_callback(
+                lambda moved: self.call_soon_threadsafe(self._transfer, moved, future))
+            return future
+        # moves are planned when they start, from wherever the motor is
+        self._moves.append((future, planner, argument))
+        if self._current is None:
+            self._start_next()
+        return future
+
+    @staticmethod
+    def _transfer(moved, future):
+        if moved.cancelled():
+            future.cancel()
+            return
+        if not future.set_running():
+            return
+        error = moved.exception()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(moved.result())
+
+    def _start_next(self):
+        self._current = None
+        self._stopped = False
+        while self._moves:
+            future, planner, argument = self._moves.popleft()
+            if not future.set_running():
+                continue
+            try:
+                plan = planner(argument)
+            except Exception as err:
+                future.set_exception(err)
+                continue
+            self._current = [future, plan, 0, self.clock()]
+            self._step()
+            return
+
+    def _step(self):
+        future, plan, index, origin = self._current
+        motor = self.motor
+        if self._stopped or index >= len(plan):
+            future.set_result(motor.state)
+            self._start_next()
+            return
+        try:
+            motor.parallel_interface.setData(plan.values[index])
+        except Exception as err:
+            future.set_exception(err)
+            self._start_next()
+            return
+        motor.position = plan.position_at(index)
+        self._current[2] = index + 1
+        # deadlines are measured from the start of the move so that the
+        # latency of each timer does not accumulate
+        self.call_later(max(0.0, origin + plan.times[index] - self.clock()),
+                        self._step)
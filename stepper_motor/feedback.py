@@ -0,0 +1,322 @@
+'''
+Closed loop moves, checking the rotor against a feedback source after every
+step.
+
+    encoder = QuadratureEncoder(motor.parallel_interface, position=motor.position)
+    loop = ClosedLoop(motor, encoder, tolerance=2, retries=3)
+    loop.execute(motor.plan_rotate(90))
+
+A feedback source has a read(position) method returning the measured motor
+position in steps, or None when it cannot tell. QuadratureEncoder decodes an
+encoder wired to two parallel port status lines, IndexSensor an index pulse
+once per revolution, and SimulatedPort reports its modelled rotor.
+
+A rotor which falls more than tolerance steps behind the commanded position
+has stalled. ClosedLoop then takes the measured position as the motor's,
+slows down and moves on to the end of the move from there, raising
+StallError once it runs out of retries or the position is unknown.
+'''
+import copy
+import logging
+from array import array
+
+from stepper_motor.instruments import StepInstruments
+from stepper_motor.plan import PathPlan
+
+logger = logging.getLogger(__name__)
+
+# quadrature (A, B) codes in the order they are seen turning forwards, with
+# A as the high bit
+_QUADRATURE = (0, 2, 3, 1)
+_QUADRATURE_INDEX = dict((code, index) for index, code in
+                         enumerate(_QUADRATURE))
+
+
+class StallError(Exception):
+    def __init__(self, commanded, measured):
+        '''
+        :param commanded: Position the motor was commanded to
+        :type commanded: int
+        :param measured: Position measured, None if it is unknown
+        :type measured: int
+        '''
+        if measured is None:
+            message = "Motor stalled before position %d, position unknown" % commanded
+        else:
+            message = "Motor stalled at position %d, commanded %d" % (
+                measured, commanded)
+        super(StallError, self).__init__(message)
+        self.commanded = commanded
+        self.measured = measured
+
+
+class FeedbackSource(object):
+    # greatest number of steps between measurements, None for every step
+    interval = None
+
+    def read(self, position):
+        '''
+        :param position: Commanded position, which sources measuring the
+            position within a revolution resolve it near
+        :type position: int
+        :returns: Measured motor position, or None if it is not known now
+        :rtype: int
+        '''
+        raise NotImplementedError
+
+
+class QuadratureEncoder(FeedbackSource):
+    '''
+    Incremental encoder wired to two status lines of the port, decoded by
+    sampling the lines, which ClosedLoop does after every step. The lines
+    must not change more than once between samples, so encoders with more
+    than one count per step need sampling faster with poll().
+    '''
+    def __init__(self, port, a='getInAcknowledge', b='getInBusy',
+                 counts_per_step=1, position=0):
+        '''
+        :param port: Port with status line methods, e.g. ParallelPort
+        :type port: object
+        :param a: Method of the port reading the A line
+        :type a: str
+        :param b: Method of the port reading the B line
+        :type b: str
+        :param counts_per_step: Encoder counts per motor step
+        :type counts_per_step: float
+        :param position: Motor position the encoder starts at
+        :type position: int
+        '''
+        self._a = getattr(port, a)
+        self._b = getattr(port, b)
+        self.counts_per_step = counts_per_step
+        # counts with two lines changed between samples, so lost
+        self.errors = 0
+        self._state = self._sample()
+        self.position = position
+
+    @property
+    def position(self):
+        return self._start + int(round(self.count / float(self.counts_per_step)))
+
+    @position.setter
+    def position(self, position):
+        self._start = position
+        self.count = 0
+
+    def _sample(self):
+        return _QUADRATURE_INDEX[(bool(self._a()) << 1) | bool(self._b())]
+
+    def poll(self):
+        '''
+        Samples the lines, counting any change since the last sample.
+        '''
+        state = self._sample()
+        change = (state - self._state) % 4
+        if change == 1:
+            self.count += 1
+        elif change == 3:
+            self.count -= 1
+        elif change == 2:
+            self.errors += 1
+        self._state = state
+
+    def read(self, position=None):
+        self.poll()
+        return self.position
+
+
+class LimitSwitch(object):
+    '''
+    Switch or sensor on a status line of the port, e.g. a limit switch to
+    home against.
+    '''
+    def __init__(self, port, line='getInSelected', active=True):
+        '''
+        :param port: Port with status line methods, e.g. ParallelPort
+        :type port: object
+        :param line: Method of the port reading the switch
+        :type line: str
+        :param active: Line level when the switch is active
+        :type active: bool
+        '''
+        self._line = getattr(port, line)
+        self.active_level = active
+
+    def active(self):
+        '''
+        :returns: Whether the switch is active
+        :rtype: bool
+        '''
+        return bool(self._line()) == self.active_level
+
+
+class IndexSensor(LimitSwitch, FeedbackSource):
+    '''
+    Sensor on a status line of the port which is active at one position of
+    each revolution, e.g. an index pulse or a slotted disc, so gives the
+    position once per revolution.
+    '''
+    def __init__(self, port, steps_per_rev, line='getInPaperOut',
+                 index_position=0, active=True):
+        '''
+        :param port: Port with status line methods, e.g. ParallelPort
+        :type port: object
+        :param steps_per_rev: Number of steps in one revolution
+        :type steps_per_rev: int
+        :param line: Method of the port reading the sensor
+        :type line: str
+        :param index_position: State position the sensor is active at
+        :type index_position: int
+        :param active: Line level when the sensor is active
+        :type active: bool
+        '''
+        super(IndexSensor, self).__init__(port, line, active)
+        self.steps_per_rev = steps_per_rev
+        self.index_position = index_position
+        self.interval = steps_per_rev
+
+    def read(self, position):
+        if not self.active():
+            return None
+        # the index position nearest the commanded one
+        total = self.steps_per_rev
+        offset = (self.index_position - position) % total
+        if offset > total // 2:
+            offset -= total
+        return position + offset
+
+
+def _slowed(plan, speed):
+    # the plan at a fraction of its speed
+    if speed == 1.0:
+        return plan
+    slowed = copy.copy(plan)
+    slowed.times = array('d', [time / speed for time in plan.times])
+    return slowed
+
+
+class ClosedLoop(object):
+    def __init__(self, motor, source, tolerance=2, retries=3, backoff=0.5,
+                 min_speed=0.1):
+        '''
+        Checks the moves made through execute() against a feedback source,
+        through the post_step callback of the motor's instruments, which are
+        created for the move if it has none. Moves made on the motor itself
+        are not checked.
+
+        :param motor: Motor to check
+        :type motor: StepperMotor
+        :param source: Measures the motor position
+        :type source: FeedbackSource
+        :param tolerance: Steps the measured position may differ from the
+            commanded position
+        :type tolerance: int
+        :param retries: Times a move carries on after a stall
+        :type retries: int
+        :param backoff: Fraction of its speed a motor which stalls slows to,
+            for the rest of the move and later moves
+        :type backoff: float
+        :param min_speed: Slowest fraction of the planned speed to back off to
+        :type min_speed: float
+        '''
+        if not 0 < backoff <= 1:
+            raise ValueError("Backoff must be between 0 and 1, got %s" % backoff)
+        self.motor = motor
+        self.source = source
+        self.tolerance = tolerance
+        self.retries = retries
+        self.backoff = backoff
+        self.min_speed = min_speed
+        # fraction of the planned speed moves run at
+        self.speed = 1.0
+        self.stalls = 0
+        self.measured = None
+        self._measured_at = motor.position
+        self._post_step = None
+
+    def _check(self, position, value):
+        if self._post_step is not None:
+            self._post_step(position, value)
+        measured = self.source.read(position)
+        if measured is None:
+            interval = getattr(self.source, 'interval', None)
+            if interval is not None and \
+               abs(position - self._measured_at) > interval + self.tolerance:
+                # passed where the source should have seen the rotor
+                raise StallError(position, None)
+            return
+        self.measured = measured
+        self._measured_at = position
+        if abs(measured - position) > self.tolerance:
+            raise StallError(position, measured)
+
+    def reset_speed(self):
+        '''
+        Returns to the planned speed after backing off.
+        '''
+        self.speed = 1.0
+
+    def execute(self, plan, stop=None):
+        '''
+        Moves the motor through a plan, carrying on to its end position from
+        where the rotor is after each stall.
+
+        :param plan: Plan starting from the current state. Paths are not
+            supported, as after a stall the rest of the move is replanned as
+            one run to the end position
+        :type plan: MovePlan
+        :param stop: Stops the move, see StepperMotor.execute
+        :type stop: threading.Event or StopToken
+        :returns: New state position
+        :rtype: int
+        :raises StallError: if the motor stalls more than retries times,
+            with the motor position set to the measured position, or if its
+            position is unknown, leaving the position commanded
+        '''
+        if isinstance(plan, PathPlan):
+            raise ValueError("Closed loop moves cannot follow a path")
+        motor = self.motor
+        instruments = motor.instruments
+        if instruments is None:
+            motor.instruments = StepInstruments()
+        self._post_step = motor.instruments.post_step
+        motor.instruments.post_step = self._check
+        try:
+            return self._execute(plan, stop)
+        finally:
+            motor.instruments.post_step = self._post_step
+            motor.instruments = instruments
+            self._post_step = None
+
+    def _execute(self, plan, stop):
+        motor = self.motor
+        target = plan.end_position
+        self._measured_at = motor.position
+        attempts = 0
+        while True:
+            try:
+                return motor.execute(_slowed(plan, self.speed), stop)
+            except StallError as err:
+                self.stalls += 1
+                if err.measured is None:
+                    raise
+                motor.position = self._measured_at = err.measured
+                if motor.checkpoint is not None:
+                    motor.checkpoint.end(err.measured)
+                if attempts >= self.retries:
+                    raise
+                attempts += 1
+                self.speed = max(self.min_speed, self.speed * self.backoff)
+                logger.warning("%s, retrying at %d%% speed", err,
+                               self.speed * 100)
+                plan = motor.plan_steps(target - err.measured)
+
+    def turn_motor(self, cycles):
+        return self.execute(self.motor.plan_motor(cycles))
+
+    def turn_to_angle(self, angle, direction=None):
+        return self.execute(self.motor.plan_to_angle(angle,
+                                                     direction=direction))
+
+    def rotate(self, degrees):
+        return self.execute(self.motor.plan_rotate(degrees))
@@ -0,0 +1,371 @@
+'''
+Drives several motors, each with its own port, from worker processes.
+
+    fleet = Fleet([Rig('left', make_left_motor, cpu=1),
+                   Rig('right', make_right_motor, cpu=2)])
+    moves = [fleet.rotate('left', 90), fleet.rotate('right', -90)]
+    states = [move.result() for move in moves]
+    print fleet.stats()
+    fleet.shutdown()
+
+Each rig's motor is created and stepped in a process of its own, so that the
+step loops of different rigs do not compete for the GIL, and may be pinned to
+a CPU to keep other work off the core. The front end queues commands on each
+rig in turn and returns a MoveFuture of each result.
+'''
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import traceback
+from pickle import PicklingError
+
+from stepper_motor.stop import StopToken
+from stepper_motor.worker import MoveCancelled, MoveFuture
+
+try:
+    # to pin processes to a CPU on Python 2, which lacks sched_setaffinity
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# messages from the worker process about a command
+_STARTED = 'started'
+_RESULT = 'result'
+_ERROR = 'error'
+
+# commands planning a move, by the StepperMotor method planning it
+MOVES = {
+    'turn_motor': 'plan_motor',
+    'rotate': 'plan_rotate',
+    'turn_to_angle': 'plan_to_angle',
+    'follow_path': 'plan_path',
+}
+
+
+def pin_to_cpu(cpu):
+    '''
+    Restricts the current process to run on one CPU.
+
+    :param cpu: Index of the CPU
+    :type cpu: int
+    :returns: Whether the process was pinned, which needs Python 3.3 or
+        psutil on Linux
+    :rtype: bool
+    '''
+    setaffinity = getattr(os, 'sched_setaffinity', None)
+    try:
+        if setaffinity is not None:
+            setaffinity(0, [cpu])
+            return True
+        if psutil is not None and hasattr(psutil.Process, 'cpu_affinity'):
+            psutil.Process().cpu_affinity([cpu])
+            return True
+    except (OSError, ValueError) as err:
+        logger.warning("Cannot pin process to CPU %d: %s", cpu, err)
+        return False
+    logger.warning("Cannot pin process to CPU %d, install psutil", cpu)
+    return False
+
+
+class Rig(object):
+    def __init__(self, name, factory, cpu=None, deceleration=None):
+        '''
+        :param name: Name the rig is addressed by
+        :type name: str
+        :param factory: Creates the rig's StepperMotor, and its port, in the
+            worker process. Must be picklable where processes are not forked,
+            e.g. a module level function or functools.partial of one
+        :type factory: callable
+        :param cpu: CPU to pin the worker process to, defaults to any
+        :type cpu: int
+        :param deceleration: Deceleration in steps per second squared to
+            stop with, defaults to stopping before the next step
+        :type deceleration: float
+        '''
+        self.name = name
+        self.factory = factory
+        self.cpu = cpu
+        self.deceleration = deceleration
+
+    def __repr__(self):
+        return 'Rig(%r, cpu=%r)' % (self.name, self.cpu)
+
+
+class _RigStats(object):
+    # counters kept by the worker process
+    def __init__(self):
+        self.moves = 0
+        self.steps = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.jitter = None
+
+    def to_dict(self, motor, pinned):
+        return {'moves': self.moves,
+                'steps': self.steps,
+                'failures': self.failures,
+                'cancelled': self.cancelled,
+                'position': motor.position,
+                'state': motor.state,
+                'rpm': motor.rpm,
+                'measured_rpm': motor.measured_rpm(),
+                'jitter': self.jitter,
+                'plan_cache': motor.plan_cache.stats(),
+                'pid': os.getpid(),
+                'pinned': pinned}
+
+
+def _serve(rig, connection, event, generation):
+    # runs in the worker process until sent None
+    pinned = rig.cpu is not None and pin_to_cpu(rig.cpu)
+    motor = rig.factory()
+    stop = StopToken(rig.deceleration, event)
+    stats = _RigStats()
+    while True:
+        command = connection.recv()
+        if command is None:
+            break
+        number, sent, name, args = command
+        if sent == generation.value:
+            stop.clear()
+        if sent != generation.value:
+            # queued, or started, before the last stop
+            stats.cancelled += 1
+            connection.send((number, _ERROR, MoveCancelled()))
+            continue
+        connection.send((number, _STARTED, None))
+        result = error = None
+        try:
+            if name == 'stats':
+                result = stats.to_dict(motor, pinned)
+            elif name == 'set_rpm':
+                motor.rpm = args[0]
+            elif name == 'set_delay':
+                motor.delay = args[0]
+            else:
+                steps_moved = motor.steps_moved
+                if name in MOVES:
+                    plan = getattr(motor, MOVES[name])(*args)
+                    result = motor.execute(plan, stop)
+                elif name == 'execute':
+                    result = motor.execute(args[0], stop)
+                elif name == 'spin':
+                    result = motor.spin(args[0], stop)
+                else:
+                    raise ValueError("Unknown rig command '%s'" % name)
+                stats.moves += 1
+                stats.steps += motor.steps_moved - steps_moved
+                stats.jitter = motor.scheduler.jitter()
+        except Exception as err:
+            stats.failures += 1
+            error = err
+            logger.debug("Rig command failed\n%s", traceback.format_exc())
+        if error is None:
+            connection.send((number, _RESULT, result))
+            continue
+        try:
+            connection.send((number, _ERROR, error))
+        except (PicklingError, TypeError):
+            connection.send((number, _ERROR, RuntimeError(
+                "%s: %s" % (type(error).__name__, error))))
+    connection.close()
+
+
+class _RigProcess(object):
+    # front end of one rig's worker process
+    def __init__(self, rig):
+        self.rig = rig
+        self.event = multiprocessing.Event()
+        self.generation = multiprocessing.Value('i', 0)
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_serve, args=(rig, child, self.event, self.generation),
+            name='rig-%s' % rig.name)
+        self.process.daemon = True
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.numbers = itertools.count()
+        self.process.start()
+        child.close()
+        self.reader = threading.Thread(target=self._read,
+                                       name='rig-%s-results' % rig.name)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def send(self, name, args):
+        future = MoveFuture()
+        with self.lock:
+            number = next(self.numbers)
+            self.futures[number] = future
+            self.connection.send((number, self.generation.value, name, args))
+        return future
+
+    def stop(self):
+        with self.lock:
+            self.generation.value += 1
+            self.event.set()
+
+    def _read(self):
+        while True:
+            try:
+                number, kind, value = self.connection.recv()
+            except (EOFError, IOError):
+                break
+            with self.lock:
+                if kind == _STARTED:
+                    self.futures[number].set_running()
+                    continue
+                future = self.futures.pop(number)
+            if kind == _RESULT:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        with self.lock:
+            futures, self.futures = self.futures, {}
+        for future in futures.values():
+            future.set_exception(RuntimeError("Rig '%s' has stopped"
+                                              % self.rig.name))
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            try:
+                self.connection.send(None)
+            except IOError:
+                pass
+        if wait:
+            self.process.join()
+            self.reader.join()
+
+
+class Fleet(object):
+    def __init__(self, rigs):
+        '''
+        Starts a worker process for each rig.
+
+        :param rigs: Rigs to drive, with distinct names
+        :type rigs: iterable of Rig
+        '''
+        self._rigs = {}
+        self.names = []
+        try:
+            for rig in rigs:
+                if rig.name in self._rigs:
+                    raise ValueError("Rig names must be distinct, '%s' is repeated"
+                                     % rig.name)
+                self._rigs[rig.name] = _RigProcess(rig)
+                self.names.append(rig.name)
+        except Exception:
+            self.shutdown()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def _rig(self, name):
+        try:
+            return self._rigs[name]
+        except KeyError:
+            raise KeyError("Unknown rig '%s', expected one of %s"
+                           % (name, ', '.join(self.names)))
+
+    def submit(self, name, command, *args):
+        '''
+        Queues a command on a rig, to run after those queued before it.
+
+        :param name: Name of the rig
+        :type name: str
+        :param command: turn_motor, rotate, turn_to_angle, follow_path,
+            execute or spin to move, set_rpm or set_delay to change speed,
+            or stats
+        :type command: str
+        :returns: Future of the new state position after a move, or the
+            rig's statistics, which is running once the rig has started the
+            command. Use stop() rather than its cancel() to cancel commands
+        :rtype: MoveFuture
+        '''
+        return self._rig(name).send(command, args)
+
+    def turn_motor(self, name, cycles):
+        return self.submit(name, 'turn_motor', cycles)
+
+    def rotate(self, name, degrees):
+        return self.submit(name, 'rotate', degrees)
+
+    def turn_to_angle(self, name, angle, direction=None):
+        return self.submit(name, 'turn_to_angle', angle, None, direction)
+
+    def follow_path(self, name, waypoints):
+        return self.submit(name, 'follow_path', waypoints)
+
+    def execute(self, name, plan):
+        '''
+        :param plan: Plan compiled from the position the rig will be at when
+            the move starts
+        :type plan: MovePlan
+        '''
+        return self.submit(name, 'execute', plan)
+
+    def spin(self, name, direction=1):
+        '''
+        Turns a rig continuously until stop() is called. Commands queued
+        after it wait for the stop.
+        '''
+        return self.submit(name, 'spin', direction)
+
+    def set_rpm(self, name, rpm):
+        '''
+        Changes the speed of a rig's later moves.
+        '''
+        if rpm <= 0:
+            raise ValueError("Speed must be positive, got %s rpm" % rpm)
+        return self.submit(name, 'set_rpm', rpm)
+
+    def set_delay(self, name, delay):
+        return self.submit(name, 'set_delay', delay)
+
+    def stop(self, name=None):
+        '''
+        Stops the current move of a rig, decelerating if the rig has a
+        deceleration, and cancels its queued commands, whose futures raise
+        MoveCancelled. Commands queued afterwards run as normal.
+
+        :param name: Name of the rig, defaults to every rig
+        :type name: str
+        '''
+        names = self.names if name is None else [name]
+        for name in names:
+            self._rig(name).stop()
+
+    def stats(self, timeout=None):
+        '''
+        Collects the statistics of every rig, once the commands queued on it
+        before have finished.
+
+        :param timeout: Seconds to wait for each rig
+        :type timeout: float
+        :returns: Moves, steps, failures and cancelled commands, position,
+            state, commanded and measured rpm, jitter of the last move, plan
+            cache statistics, process id and whether the process is pinned
+            to a CPU, by rig name
+        :rtype: dict
+        '''
+        futures = [(name, self.submit(name, 'stats')) for name in self.names]
+        return dict((name, future.result(timeout))
+                    for name, future in futures)
+
+    def shutdown(self, wait=True):
+        '''
+        Stops the worker processes once their queued commands are finished.
+
+        :param wait: Wait for the processes to exit
+        :type wait: bool
+        '''
+        for rig in self._rigs.values():
+            rig.shutdown(wait)
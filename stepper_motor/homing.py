@@ -0,0 +1,141 @@
+'''
+Finds the motor position from a limit switch or index sensor, e.g. after a
+power cycle, instead of assuming the motor is where the state file says.
+
+    sensor = IndexSensor(motor.parallel_interface, motor.steps_per_rev)
+    home(motor, sensor, state_file=StateFile('motor_state.ini'))
+
+Homing searches for the sensor quickly, backs off until it is clear, then
+approaches it again slowly so that the position is taken from where the
+sensor becomes active at low speed, not from where a fast move overshot it.
+'''
+import logging
+
+from stepper_motor.kinematics import CLOCKWISE
+from stepper_motor.phases import to_half_position
+from stepper_motor.profiles import ConstantProfile
+
+logger = logging.getLogger(__name__)
+
+
+class HomingError(Exception):
+    pass
+
+
+class _Until(object):
+    # stops a move once the sensor reads active (or clear), or when the
+    # caller's stop is set
+    def __init__(self, sensor, active, stop):
+        self.sensor = sensor
+        self.active = active
+        self.stop = stop
+
+    def _stopped(self):
+        return self.stop is not None and self.stop.is_set()
+
+    def is_set(self):
+        if self._stopped():
+            return True
+        return self.sensor.active() == self.active
+
+    # the move slows to a stop as the caller's stop would have it, but stops
+    # at once on the sensor
+    @property
+    def ramp(self):
+        if self._stopped():
+            return getattr(self.stop, 'ramp', None)
+        return None
+
+    @property
+    def immediate(self):
+        return getattr(self.stop, 'immediate', False)
+
+
+def _seek(motor, sensor, active, steps, delay, stop):
+    # moves up to steps until the sensor reads active, returning False if
+    # stopped by the caller first
+    until = _Until(sensor, active, stop)
+    if until.is_set():
+        return not (stop is not None and stop.is_set())
+    plan = motor.plan_cache.compile(motor.phases, motor.position, steps,
+                                    ConstantProfile(delay))
+    motor.execute(plan, until)
+    if stop is not None and stop.is_set():
+        return False
+    if sensor.active() != active:
+        raise HomingError("Sensor not %s within %d steps"
+                          % ('found' if active else 'cleared', abs(steps)))
+    return True
+
+
+def home(motor, sensor, direction=CLOCKWISE, delay=None, slow_delay=None,
+         backoff=4, max_steps=None, home_position=None, stop=None,
+         state_file=None):
+    '''
+    Moves the motor to the sensor and sets its position there.
+
+    :param motor: Motor to home
+    :type motor: StepperMotor
+    :param sensor: Sensor with an active() method, e.g. a LimitSwitch or
+        IndexSensor from stepper_motor.feedback
+    :type sensor: object
+    :param direction: CLOCKWISE or ANTICLOCKWISE to search in
+    :type direction: int
+    :param delay: Delay between steps of the fast search, defaults to the
+        motor's delay
+    :type delay: float
+    :param slow_delay: Delay between steps of the slow approach, defaults to
+        four times delay
+    :type slow_delay: float
+    :param backoff: Steps to move past where the sensor clears before the
+        slow approach
+    :type backoff: int
+    :param max_steps: Furthest to search, defaults to one revolution
+    :type max_steps: int
+    :param home_position: Motor position at the sensor, defaults to the
+        index position of an IndexSensor, otherwise 0
+    :type home_position: int
+    :param stop: Stops homing, see StepperMotor.execute
+    :type stop: threading.Event or StopToken
+    :param state_file: State to save the home position to, in half steps
+    :type state_file: StateFile
+    :returns: New state position, or None if stopped before the sensor was
+        found
+    :rtype: int
+    :raises HomingError: if the sensor is not found, or does not clear,
+        within max_steps
+    '''
+    if delay is None:
+        delay = motor.delay
+    if slow_delay is None:
+        slow_delay = 4 * delay
+    if max_steps is None:
+        max_steps = motor.steps_per_rev
+    if home_position is None:
+        home_position = getattr(sensor, 'index_position', 0)
+    step = -1 if direction < 0 else 1
+
+    # start clear of the sensor, so that its edge is found
+    if not _seek(motor, sensor, False, -step * max_steps, delay, stop):
+        return None
+    logger.debug("Searching for the sensor")
+    if not _seek(motor, sensor, True, step * max_steps, delay, stop):
+        return None
+    logger.debug("Sensor found at position %d, backing off", motor.position)
+    if not _seek(motor, sensor, False, -step * max_steps, delay, stop):
+        return None
+    motor.execute(motor.plan_cache.compile(
+        motor.phases, motor.position, -step * backoff,
+        ConstantProfile(delay)), stop)
+    if not _seek(motor, sensor, True, step * max_steps, slow_delay, stop):
+        return None
+
+    logger.info("Homed at position %d, was %d", home_position, motor.position)
+    motor.position = home_position
+    if motor.checkpoint is not None:
+        motor.checkpoint.end(home_position)
+    if state_file is not None:
+        if motor.mode is not None:
+            home_position = to_half_position(motor.mode, home_position)
+        state_file.write(home_position)
+    return motor.state
@@ -0,0 +1,156 @@
+'''
+Opt-in instrumentation of the step loop.
+
+    motor.instruments = StepInstruments(post_step=check_encoder)
+    motor.turn_motor(2)
+    print motor.instruments.snapshot()
+
+StepperMotor only runs its instrumented step loop when instruments are set,
+so a motor without them pays for one attribute check per move.
+'''
+from bisect import bisect_left
+from collections import deque
+
+from stepper_motor.scheduler import monotonic
+
+# upper bounds in seconds of the step interval histogram buckets, the last
+# bucket counting every longer interval
+BUCKETS = (0.00001, 0.00002, 0.00005, 0.0001, 0.0002, 0.0005,
+           0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+
+class StepInstruments(object):
+    def __init__(self, pre_step=None, post_step=None, window=1024,
+                 tolerance=0.001, clock=monotonic, speed_window=16):
+        '''
+        :param pre_step: Called as pre_step(position, value) before each step
+            is written
+        :type pre_step: callable
+        :param post_step: Called as post_step(position, value) after each
+            step is written, raising ends the move
+        :type post_step: callable
+        :param window: Number of recent step intervals in the histogram
+        :type window: int
+        :param tolerance: Seconds a step may be late before its deadline
+            counts as missed
+        :type tolerance: float
+        :param clock: Clock timing the port writes
+        :type clock: callable
+        :param speed_window: Number of recent steps the measured speed is
+            averaged over
+        :type speed_window: int
+        '''
+        if window < 1:
+            raise ValueError("Histogram window must be at least 1, got %s" % window)
+        if speed_window < 2:
+            raise ValueError("Speed window must be at least 2, got %s" % speed_window)
+        self.pre_step = pre_step
+        self.post_step = post_step
+        self.tolerance = tolerance
+        self.clock = clock
+        self._intervals = deque(maxlen=window)
+        # write times of the latest steps of the current move
+        self._times = deque(maxlen=speed_window)
+        self.reset()
+
+    def reset(self):
+        '''
+        Clears the counters and histogram.
+        '''
+        self.steps = 0
+        self.missed = 0
+        self.write_time = 0.0
+        self._intervals.clear()
+        self._times.clear()
+        self._counts = [0] * (len(BUCKETS) + 1)
+        self._last = None
+
+    def begin(self):
+        '''
+        Starts a move, so that the time between moves is not counted as a
+        step interval.
+        '''
+        self._last = None
+        self._times.clear()
+
+    def step(self, write, position, value):
+        '''
+        Writes one step, timing the write and the interval since the last
+        step. The post_step callback is made by stepped().
+
+        :param write: Port write function
+        :type write: callable
+        :param position: Position the step moves to
+        :type position: int
+        :param value: Value written to the port
+        :type value: int
+        '''
+        if self.pre_step is not None:
+            self.pre_step(position, value)
+        clock = self.clock
+        start = clock()
+        write(value)
+        self.write_time += clock() - start
+        self.steps += 1
+
+        if self._last is not None:
+            intervals = self._intervals
+            counts = self._counts
+            if len(intervals) == intervals.maxlen:
+                counts[bisect_left(BUCKETS, intervals[0])] -= 1
+            interval = start - self._last
+            intervals.append(interval)
+            counts[bisect_left(BUCKETS, interval)] += 1
+        self._last = start
+        self._times.append(start)
+
+    def stepped(self, position, value):
+        '''
+        Called once the motor has moved to position by writing value.
+        '''
+        if self.post_step is not None:
+            self.post_step(position, value)
+
+    def waited(self, lateness):
+        '''
+        :param lateness: Seconds the scheduler was late for the step deadline
+        :type lateness: float
+        '''
+        if lateness > self.tolerance:
+            self.missed += 1
+
+    def steps_per_second(self):
+        '''
+        Measures the speed of the latest steps of the current or last move
+        from when they were written. Safe to call from another thread while
+        the motor moves.
+
+        :returns: Steps per second, 0 before the second step of a move
+        :rtype: float
+        '''
+        times = tuple(self._times)
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def snapshot(self):
+        '''
+        :returns: Counters and the histogram of recent step intervals, as
+            (upper bound, count) pairs with None bounding the last bucket
+        :rtype: dict
+        '''
+        intervals = list(self._intervals)
+        counts = list(self._counts)
+        if intervals:
+            summary = {'count': len(intervals),
+                       'mean': sum(intervals) / len(intervals),
+                       'min': min(intervals),
+                       'max': max(intervals)}
+        else:
+            summary = {'count': 0, 'mean': 0.0, 'min': 0.0, 'max': 0.0}
+        summary['histogram'] = zip(BUCKETS + (None,), counts)
+        return {'steps': self.steps,
+                'missed': self.missed,
+                'write_time': self.write_time,
+                'steps_per_second': self.steps_per_second(),
+                'intervals': summary}
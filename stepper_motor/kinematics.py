@@ -0,0 +1,249 @@
+'''
+Conversions between motor states, offsets within a revolution, angles and
+cycles to turn.
+
+The scalar functions convert one value, including speeds in rpm or degrees
+per second to and from the delay between steps. The plural functions convert
+sequences of values at once, with numpy when it is installed, and give
+exactly the same results as the scalar functions element by element.
+'''
+from array import array
+from itertools import izip, repeat
+
+from stepper_motor.lazy import optional_module
+
+# imported when first used
+numpy = optional_module('numpy')
+
+# directions angle_to_cycles may be forced to turn in
+CLOCKWISE = 1
+ANTICLOCKWISE = -1
+
+
+def state_to_angle(state, total_states):
+    '''
+    Converts a state to angle.
+
+    :param state: Motor position state as index
+    :type state: int
+    :param total_states: Number of motor positions
+    :type total_states: int
+    :returns: Angle
+    :rtype: float
+    '''
+    #Q: state 48 should return 720 or 0?
+    return 360.0 / total_states * state
+
+def state_to_offset(state, total_states):
+    '''
+    Converts state (index into motor input positions) into an offset from 0 - 1
+
+    :param state: Motor position state as index
+    :type state: int
+    :param total_states: Number of motor positions
+    :type total_states: int
+    :returns: Offset from 0 to 1
+    :rtype: float
+    '''
+    # if 24 positions, position 23 is the last index, but is not quite 360deg
+    # rotated (has 1 more step until one whole cycle offset)
+    return float(state) / total_states
+
+
+def offset_to_state(offset, total_states):
+    '''
+    Converts offset as above to state (index into motor input positions)
+
+    :param offset: Offset from 0 to 1
+    :type offset: float
+    :param total_states: Number of motor positions
+    :type total_states: int
+    :returns: Motor position state as index
+    :rtype: int
+    '''
+    assert 0 <= offset <= 1
+    return total_states * float(offset)
+
+
+def angle_to_cycles(angle, current_state, total_states, direction=None):
+    '''
+    Converts an absolute angle to the offset required to turn the motor from
+    the current state.
+
+    Note: will find the shortest rotation, clockwise or anti-clockwise, unless
+    a direction is given. Half a turn is made clockwise.
+
+    :param angle: Desired angle
+    :type angle: float
+    :param current_state: Motor position state as index
+    :type current_state: int
+    :param total_states: Number of motor positions
+    :type total_states: int
+    :param direction: CLOCKWISE or ANTICLOCKWISE to force the direction,
+        defaults to the shortest rotation
+    :type direction: int
+    :returns: Cycles to rotate motor
+    :rtype: float between -1 and 1
+    '''
+    current_offset = state_to_offset(current_state, total_states)
+    desired_offset = (angle%360 / 360.0)
+    # clockwise distance, 0 <= cycles < 1
+    cycles = (desired_offset - current_offset) % 1
+    if direction is None:
+        if cycles > 0.5:
+            cycles -= 1
+    elif direction == ANTICLOCKWISE:
+        if cycles:
+            cycles -= 1
+    elif direction != CLOCKWISE:
+        raise ValueError("Unknown direction %r, expected CLOCKWISE or "
+                         "ANTICLOCKWISE" % (direction,))
+    return cycles
+
+
+def rpm_to_delay(rpm, steps_per_rev):
+    '''
+    :param rpm: Speed in revolutions per minute
+    :type rpm: float
+    :param steps_per_rev: Number of steps in one revolution
+    :type steps_per_rev: int
+    :returns: Delay between steps
+    :rtype: float
+    '''
+    if rpm <= 0:
+        raise ValueError("Speed must be positive, got %s rpm" % rpm)
+    return 60.0 / (rpm * steps_per_rev)
+
+
+def delay_to_rpm(delay, steps_per_rev):
+    '''
+    :param delay: Delay between steps
+    :type delay: float
+    :param steps_per_rev: Number of steps in one revolution
+    :type steps_per_rev: int
+    :returns: Speed in revolutions per minute, infinite for no delay
+    :rtype: float
+    '''
+    if delay <= 0:
+        return float('inf')
+    return 60.0 / (delay * steps_per_rev)
+
+
+def degrees_per_second_to_delay(degrees_per_second, steps_per_rev):
+    '''
+    :param degrees_per_second: Speed in degrees per second
+    :type degrees_per_second: float
+    :param steps_per_rev: Number of steps in one revolution
+    :type steps_per_rev: int
+    :returns: Delay between steps
+    :rtype: float
+    '''
+    if degrees_per_second <= 0:
+        raise ValueError("Speed must be positive, got %s degrees per second"
+                         % degrees_per_second)
+    return 360.0 / (degrees_per_second * steps_per_rev)
+
+
+def delay_to_degrees_per_second(delay, steps_per_rev):
+    '''
+    :param delay: Delay between steps
+    :type delay: float
+    :param steps_per_rev: Number of steps in one revolution
+    :type steps_per_rev: int
+    :returns: Speed in degrees per second, infinite for no delay
+    :rtype: float
+    '''
+    if delay <= 0:
+        return float('inf')
+    return 360.0 / (delay * steps_per_rev)
+
+
+def _states(current_states, count):
+    # a single state applies to every angle
+    if isinstance(current_states, (int, long, float)):
+        return repeat(current_states, count)
+    return current_states
+
+
+def states_to_angles(states, total_states):
+    '''
+    :param states: Motor position states as indexes
+    :type states: sequence of ints
+    :param total_states: Number of motor positions
+    :type total_states: int
+    :returns: Angle of each state
+    :rtype: numpy.ndarray, or array('d') without numpy
+    '''
+    if numpy is not None:
+        return 360.0 / total_states * numpy.asarray(states, dtype='d')
+    return array('d', [state_to_angle(state, total_states) for state in states])
+
+
+def states_to_offsets(states, total_states):
+    '''
+    :param states: Motor position states as indexes
+    :type states: sequence of ints
+    :param total_states: Number of motor positions
+    :type total_states: int
+    :returns: Offset of each state from 0 to 1
+    :rtype: numpy.ndarray, or array('d') without numpy
+    '''
+    if numpy is not None:
+        return numpy.asarray(states, dtype='d') / total_states
+    return array('d', [state_to_offset(state, total_states)
+                       for state in states])
+
+
+def offsets_to_states(offsets, total_states):
+    '''
+    :param offsets: Offsets from 0 to 1
+    :type offsets: sequence of floats
+    :param total_states: Number of motor positions
+    :type total_states: int
+    :returns: State of each offset
+    :rtype: numpy.ndarray, or array('d') without numpy
+    '''
+    if numpy is not None:
+        offsets = numpy.asarray(offsets, dtype='d')
+        assert ((0 <= offsets) & (offsets <= 1)).all()
+        return total_states * offsets
+    return array('d', [offset_to_state(offset, total_states)
+                       for offset in offsets])
+
+
+def angles_to_cycles(angles, current_states, total_states, direction=None):
+    '''
+    Converts absolute angles to the cycles to turn to each from the current
+    states, as angle_to_cycles.
+
+    :param angles: Desired angles
+    :type angles: sequence of floats
+    :param current_states: Motor position state as index, either one for all
+        angles or one per angle
+    :type current_states: int or sequence of ints
+    :param total_states: Number of motor positions
+    :type total_states: int
+    :param direction: CLOCKWISE or ANTICLOCKWISE to force the direction,
+        defaults to the shortest rotation
+    :type direction: int
+    :returns: Cycles to rotate motor to each angle
+    :rtype: numpy.ndarray, or array('d') without numpy
+    '''
+    if direction not in (None, CLOCKWISE, ANTICLOCKWISE):
+        raise ValueError("Unknown direction %r, expected CLOCKWISE or "
+                         "ANTICLOCKWISE" % (direction,))
+    if numpy is None:
+        angles = list(angles)
+        return array('d', [
+            angle_to_cycles(angle, state, total_states, direction)
+            for angle, state in izip(angles, _states(current_states,
+                                                     len(angles)))])
+
+    current_offsets = numpy.asarray(current_states, dtype='d') / total_states
+    desired_offsets = numpy.mod(numpy.asarray(angles, dtype='d'), 360) / 360.0
+    cycles = numpy.mod(desired_offsets - current_offsets, 1)
+    if direction is None:
+        cycles = numpy.where(cycles > 0.5, cycles - 1, cycles)
+    elif direction == ANTICLOCKWISE:
+        cycles = numpy.where(cycles != 0, cycles - 1, cycles)
+    return cycles
@@ -0,0 +1,45 @@
+'''
+Optional dependencies which are only imported when first used.
+
+Importing numpy takes longer than the rest of a command line run, most of
+which never use it, so modules refer to it through optional_module(), which
+only checks that it is installed.
+'''
+import imp
+import importlib
+
+
+class LazyModule(object):
+    '''
+    Stands in for a module, importing it on first attribute access.
+    '''
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+
+    def __repr__(self):
+        return '<lazy module %r>' % self.__name
+
+    def __getattr__(self, attribute):
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name)
+        value = getattr(self.__module, attribute)
+        # found directly from now on
+        setattr(self, attribute, value)
+        return value
+
+
+def optional_module(name):
+    '''
+    :param name: Name of a top level module
+    :type name: str
+    :returns: Module imported on first use, or None if it is not installed
+    :rtype: LazyModule or None
+    '''
+    try:
+        found = imp.find_module(name)
+    except ImportError:
+        return None
+    if found[0] is not None:
+        found[0].close()
+    return LazyModule(name)
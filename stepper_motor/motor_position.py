@@ -1,110 +1,319 @@
 #! /usr/bin/python
+import logging
 import os
-import time
-
-try:
-    from parallel import Parallel
-except ImportError:
-    print "Requires Java Communications API and pyparallel"
-    print "http://sourceforge.net/projects/pyserial/files/pyparallel/0.2/"
-    #raise
-    
-    print "WARNING: Running in Dry Run mode without parallel port control!"
-    class Printer(object):
-        call_count = 0
-        def setData(self, x):
-            self.call_count += 1
-            #print "< would like to send '%s' to parallel port! >" % hex(x)
-    Parallel = Printer
-
-def state_to_angle(state, total_states):
+import signal
+import sys
+from itertools import izip
+
+from stepper_motor.kinematics import (
+    ANTICLOCKWISE,
+    CLOCKWISE,
+    angle_to_cycles,
+    degrees_per_second_to_delay,
+    delay_to_degrees_per_second,
+    delay_to_rpm,
+    offset_to_state,
+    rpm_to_delay,
+    state_to_angle,
+    state_to_offset,
+)
+from stepper_motor.path import compile_path, path_runs
+from stepper_motor.phases import (
+    DEFAULT_PINS,
+    HALF,
+    MODES,
+    from_half_position,
+    half_steps,
+    phase_table,
+    to_half_position,
+)
+from stepper_motor.plan import PlanCache
+from stepper_motor.ports import STATUS_LINES, open_parallel
+from stepper_motor.profiles import ConstantProfile
+from stepper_motor.scheduler import StepScheduler
+from stepper_motor.state import Checkpoint, StateFile, StateLocked, load_position
+from stepper_motor.stop import StopToken
+
+logger = logging.getLogger(__name__)
+
+# configure this per motor to be the coil sequence and the number of
+# steps to rotate a motor 360 degrees
+COIL_PHASES = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+STEPS_PER_REV = 192
+
+
+def load_state(state_file, checkpoint=None):
     '''
-    Converts a state to angle.
-    
-    :param state: Motor position state as index
-    :type state: int
-    :param total_states: Number of motor positions
-    :type total_states: int
-    :returns: Angle
-    :rtype: float
+    Reads the motor position from the state file, or the checkpoint of a move
+    which did not finish, creating the state file at position 0 if it does
+    not exist.
+    
+    :param state_file: State of the motor
+    :type state_file: StateFile
+    :param checkpoint: Checkpoint of the last move, if any
+    :type checkpoint: Checkpoint
+    :returns: Motor position
+    :rtype: int
     '''
-    #Q: state 48 should return 720 or 0?
-    return 360.0 / total_states * state
+    state = load_position(state_file, checkpoint)
+    if state is not None:
+        logger.info("Read in current state position as %02d", state)
+    else:
+        logger.info("Creating initial state file, assuming current state is 00")
+        state = 0
+        save_state(state_file, state)
+    return state
 
-def state_to_offset(state, total_states):
+
+def save_state(state_file, position):
     '''
-    Converts state (index into motor input positions) into an offset from 0 - 1
-    
-    :param state: Motor position state as index
-    :type state: int
-    :param total_states: Number of motor positions
-    :type total_states: int
-    :returns: Offset from 0 to 1
-    :rtype: float
+    :param state_file: State of the motor
+    :type state_file: StateFile
+    :param position: Motor position
+    :type position: int
     '''
-    # if 24 positions, position 23 is the last index, but is not quite 360deg
-    # rotated (has 1 more step until one whole cycle offset)
-    return float(state) / total_states
+    state_file.write(position)
 
 
-def offset_to_state(offset, total_states):
+def compact_phases(motor_inputs):
     '''
-    Converts offset as above to state (index into motor input positions)
+    Finds the shortest sequence of values which repeats to make up the motor
+    inputs, e.g. a coil sequence repeated for every step of a revolution.
     
-    :param offset: Offset from 0 to 1
-    :type offset: float
-    :param total_states: Number of motor positions
-    :type total_states: int
-    :returns: Motor position state as index
-    :rtype: int
+    :param motor_inputs: Ordered list of parallel values to turn motor
+    :type motor_inputs: list or tuple
+    :returns: Repeating coil phase values
+    :rtype: tuple
     '''
-    assert 0 <= offset <= 1
-    return total_states * float(offset)
+    motor_inputs = tuple(motor_inputs)
+    total = len(motor_inputs)
+    for period in xrange(1, total):
+        if total % period == 0 and \
+           motor_inputs[:period] * (total // period) == motor_inputs:
+            return motor_inputs[:period]
+    return motor_inputs
 
 
-def angle_to_cycles(angle, current_state, total_states):
+class PhaseSequence(object):
+    '''
+    Read only sequence of the motor input for every state of a revolution,
+    computed from the repeating coil phases rather than stored.
     '''
-    Converts an absolute angle to the offset required to turn the motor from
-    the current state.
+    def __init__(self, phases, steps_per_rev):
+        self.phases = phases
+        self.steps_per_rev = steps_per_rev
     
-    Note: will find the shortest rotation, clockwise or anti-clockwise.
+    def __len__(self):
+        return self.steps_per_rev
     
-    TODO: allow override to force direction if required.
+    def __getitem__(self, state):
+        if state < 0:
+            state += self.steps_per_rev
+        if not 0 <= state < self.steps_per_rev:
+            raise IndexError("state %d out of range" % state)
+        return self.phases[state % len(self.phases)]
     
-    :param angle: Desired angle
-    :type angle: float
-    :param current_state: Motor position state as index
-    :type current_state: int
-    :param total_states: Number of motor positions
-    :type total_states: int
-    :returns: Cycles to rotate motor
-    :rtype: float between -1 and 1
-    '''
-    current_offset = state_to_offset(current_state, total_states)
-    desired_offset = (angle%360 / 360.0)
-    #Q: Is there an easier way to find the minimum distance?
-    fwd_cycles = desired_offset - current_offset
-    rev_cycles = desired_offset - current_offset - 1
-    zero_first = lambda a, b: cmp(abs(a), abs(b))
-    return sorted((fwd_cycles, rev_cycles), zero_first)[0]
+    def __iter__(self):
+        phases = self.phases
+        total = len(phases)
+        for state in xrange(self.steps_per_rev):
+            yield phases[state % total]
+    
+    def __eq__(self, other):
+        return list(self) == list(other)
     
+    def __ne__(self, other):
+        return not self == other
 
 
 class StepperMotor(object):
-    def __init__(self, motor_inputs, state=0, delay=0.05):
+    def __init__(self, motor_inputs, state=0, delay=0.05, scheduler=None,
+                 profile=None, steps_per_rev=None, port=None, mode=None,
+                 pins=DEFAULT_PINS):
         '''
-        :param motor_inputs: Ordered list of parallel values to turn motor
+        :param motor_inputs: Ordered list of parallel values to turn motor.
+            With steps_per_rev this is the coil phase sequence which repeats
+            around the revolution, otherwise one value per step of a
+            revolution (from which the repeating phases are found). May be
+            None to use the phase table of mode
         :type motor_inputs: list or tuple
-        :param state: Initial starting state of motor position
+        :param state: Initial starting position of motor
         :type state: int
         :param delay: Delay between steps (speed)
         :type delay: float
+        :param scheduler: Paces the steps of each move, defaults to a hybrid
+            sleep/spin StepScheduler
+        :type scheduler: StepScheduler
+        :param profile: Motion profile giving the delay of each step of a
+            move, overrides delay
+        :type profile: MotionProfile
+        :param steps_per_rev: Number of steps in one revolution, defaults to
+            the length of motor_inputs
+        :type steps_per_rev: int
+        :param port: Port backend to write motor inputs to, defaults to the
+            parallel port
+        :type port: object with setData method, see stepper_motor.ports
+        :param mode: Stepping mode of the motor inputs, WAVE, FULL or HALF
+            from stepper_motor.phases, required to change mode with set_mode
+        :type mode: str
+        :param pins: Port bit of each coil end, in order, used with mode
+        :type pins: sequence of ints
         '''
-        self.MOTOR_INPUTS = motor_inputs
-        self.state = state
+        if motor_inputs is None:
+            if mode is None:
+                raise ValueError("Motor requires motor inputs or a mode")
+            motor_inputs = phase_table(mode, pins)
+        if steps_per_rev is None:
+            steps_per_rev = len(motor_inputs)
+            self.phases = compact_phases(motor_inputs)
+        else:
+            self.phases = tuple(motor_inputs)
+        if not self.phases or steps_per_rev < 1:
+            raise ValueError("Motor requires coil phases and at least one step per revolution")
+        if mode is not None and self.phases != phase_table(mode, pins):
+            raise ValueError("Motor inputs are not the %s step phases of pins %s"
+                             % (mode, ', '.join(hex(pin) for pin in pins)))
+        self.mode = mode
+        self.pins = tuple(pins)
+        self.steps_per_rev = steps_per_rev
+        # unbounded step count from 0, so that multiple turns are not lost
+        self.position = state
         self.delay = delay
-        # Setup parallel interface on first init
-        self.parallel_interface = Parallel()
+        self.scheduler = scheduler or StepScheduler()
+        self.profile = profile
+        # plans of recent moves, reused when a move is repeated
+        self.plan_cache = PlanCache()
+        # optionally record the position every checkpoint_every steps
+        self.checkpoint = None
+        self.checkpoint_every = 64
+        # optional StepInstruments, see stepper_motor.instruments
+        self.instruments = None
+        # steps written by execute and spin in either direction, so a move
+        # out and back counts both ways
+        self.steps_moved = 0
+        # the parallel port is opened by the first move, see parallel_interface
+        self._port = port
+    
+    @property
+    def parallel_interface(self):
+        '''
+        :returns: Port the motor inputs are written to, opening the parallel
+            port on first use if none was given
+        :rtype: object with setData method
+        '''
+        if self._port is None:
+            self._port = open_parallel()
+        return self._port
+    
+    @parallel_interface.setter
+    def parallel_interface(self, port):
+        self._port = port
+    
+    @property
+    def state(self):
+        '''
+        :returns: Index of the motor position within a revolution
+        :rtype: int
+        '''
+        return self.position % self.steps_per_rev
+    
+    @state.setter
+    def state(self, state):
+        self.position = state
+    
+    @property
+    def rpm(self):
+        '''
+        Speed of constant speed moves and spins in revolutions per minute,
+        setting it sets the delay.
+        
+        :rtype: float
+        '''
+        return delay_to_rpm(self.delay, self.steps_per_rev)
+    
+    @rpm.setter
+    def rpm(self, rpm):
+        self.delay = rpm_to_delay(rpm, self.steps_per_rev)
+    
+    @property
+    def degrees_per_second(self):
+        '''
+        Speed of constant speed moves and spins in degrees per second,
+        setting it sets the delay.
+        
+        :rtype: float
+        '''
+        return delay_to_degrees_per_second(self.delay, self.steps_per_rev)
+    
+    @degrees_per_second.setter
+    def degrees_per_second(self, degrees_per_second):
+        self.delay = degrees_per_second_to_delay(degrees_per_second,
+                                                 self.steps_per_rev)
+    
+    def measured_rpm(self):
+        '''
+        Measures the speed of the latest steps from when they were written,
+        to compare with the commanded rpm. May be called from another thread
+        while the motor moves.
+        
+        :returns: Revolutions per minute, or None without instruments
+        :rtype: float
+        '''
+        if self.instruments is None:
+            return None
+        return self.instruments.steps_per_second() * 60.0 / self.steps_per_rev
+    
+    def set_mode(self, mode, direction=1):
+        '''
+        Changes the stepping mode, e.g. to full step for fast moves and back
+        to half step for fine positioning, keeping the rotor where it is.
+        
+        A rotor between the positions the new mode can hold (e.g. on an odd
+        half step when changing to full step) is first moved one half step.
+        
+        :param mode: WAVE, FULL or HALF
+        :type mode: str
+        :param direction: Direction to move to a position the new mode can
+            hold, 1 for clockwise, -1 for anti-clockwise
+        :type direction: int
+        :returns: New state position
+        :rtype: int
+        '''
+        if self.mode is None:
+            raise ValueError("Motor mode is unknown, create the motor with a mode to change it")
+        phases = phase_table(mode, self.pins)
+        half_steps_per_rev = self.steps_per_rev * half_steps(self.mode)
+        if half_steps_per_rev % half_steps(mode):
+            raise ValueError("%d half steps per revolution cannot be driven in %s step mode"
+                             % (half_steps_per_rev, mode))
+        half_position = to_half_position(self.mode, self.position)
+        position = from_half_position(mode, half_position)
+        if position is None:
+            logger.debug("Moving a half step to %s step position", mode)
+            # in half step mode, so that the half step is made as a move and
+            # counted, instrumented and checkpointed like any other
+            half = phase_table(HALF, self.pins)
+            self.phases = half
+            self.steps_per_rev = half_steps_per_rev
+            self.position = half_position
+            self.mode = HALF
+            self.execute(self.plan_cache.compile(
+                half, half_position, -1 if direction < 0 else 1,
+                ConstantProfile(self.delay)))
+            position = from_half_position(mode, self.position)
+        self.phases = phases
+        self.steps_per_rev = half_steps_per_rev // half_steps(mode)
+        self.position = position
+        self.mode = mode
+        return self.state
+    
+    @property
+    def MOTOR_INPUTS(self):
+        '''
+        :returns: Motor input for every state of a revolution
+        :rtype: PhaseSequence
+        '''
+        return PhaseSequence(self.phases, self.steps_per_rev)
         
     #Q: Keep as a function or store state to self?
     def stepper_generator(self, state_steps):
@@ -121,52 +330,309 @@ class StepperMotor(object):
         else:
             step = 1
         
+        # checked once per move so that no formatting is done per step
+        # unless debug tracing has been enabled
+        trace = logger.isEnabledFor(logging.DEBUG)
+        phases = self.phases
         for virtual_state in xrange(self.state+1, self.state+state_steps+1, step):
             # NOTE: virtual_state is not used other than for informing the user the 
             # overall relative step we've applied!  
-            self.state += step
-            if self.state >= len(self.MOTOR_INPUTS):
-                # start at list 0
-                self.state = 0
-            elif self.state < 0:
-                # start at the end
-                self.state = len(self.MOTOR_INPUTS) -1
-            else:
-                # we're at an index within the current motor inputs list
-                pass
+            self.position += step
+            motor_command = phases[self.position % len(phases)]
             
-            motor_command = self.MOTOR_INPUTS[self.state]
-            
-            print "%+ 4d : Moving to internal state index %02d, %s hex %03.2f degrees" % (
-                virtual_state, self.state, hex(motor_command),
-                state_to_angle(self.state, len(self.MOTOR_INPUTS)))
+            if trace:
+                logger.debug(
+                    "%+ 4d : Moving to internal state index %02d, %s hex %03.2f degrees",
+                    virtual_state, self.state, hex(motor_command),
+                    state_to_angle(self.state, self.steps_per_rev))
     
             # present the required value
             yield motor_command
     
     
-    def turn_motor(self, cycles):
+    def steps_for_cycles(self, cycles):
         '''
-        Turns the motor the desired amount.
+        :param cycles: Loops to turn
+        :type cycles: float
+        :returns: Nearest number of steps possible
+        :rtype: int
+        '''
+        return int(round(cycles * self.steps_per_rev))
+    
+    def plan_steps(self, steps, start_position=None):
+        '''
+        Compiles a move of a number of steps without moving the motor, reusing
+        the plan of the same move from plan_cache.
+        
+        :param steps: Signed number of steps to move
+        :type steps: int
+        :param start_position: Position to move from, defaults to the current
+            position
+        :type start_position: int
+        :rtype: MovePlan
+        '''
+        if start_position is None:
+            start_position = self.position
+        profile = self.profile or ConstantProfile(self.delay)
+        return self.plan_cache.compile(self.phases, start_position, steps,
+                                       profile)
+    
+    def plan_motor(self, cycles, start_position=None):
+        '''
+        Compiles the move made by turn_motor without moving the motor.
         
         :param cycles: Loops to turn
         :type cycles: float
+        :param start_position: Position to move from, defaults to the current
+            position
+        :type start_position: int
+        :rtype: MovePlan
+        '''
+        return self.plan_steps(self.steps_for_cycles(cycles), start_position)
+    
+    def plan_to_angle(self, angle, start_position=None, direction=None):
+        '''
+        Compiles the move made by turn_to_angle without moving the motor.
+        
+        :param angle: Angle to turn to
+        :type angle: float
+        :param start_position: Position to move from, defaults to the current
+            position
+        :type start_position: int
+        :param direction: CLOCKWISE or ANTICLOCKWISE to force the direction,
+            defaults to the shortest rotation
+        :type direction: int
+        :rtype: MovePlan
+        '''
+        if start_position is None:
+            start_position = self.position
+        cycles = angle_to_cycles(angle, start_position % self.steps_per_rev,
+                                 self.steps_per_rev, direction)
+        return self.plan_motor(cycles, start_position)
+    
+    def plan_rotate(self, degrees, start_position=None):
+        '''
+        Compiles the move made by rotate without moving the motor.
+        
+        :param degrees: Degrees to turn motor by
+        :type degrees: float
+        :param start_position: Position to move from, defaults to the current
+            position
+        :type start_position: int
+        :rtype: MovePlan
+        '''
+        return self.plan_motor(degrees / 360.0, start_position)
+    
+    def plan_path(self, waypoints, start_position=None):
+        '''
+        Compiles the move made by follow_path without moving the motor.
+        
+        :param waypoints: Waypoints, or absolute angles, in order
+        :type waypoints: sequence of Waypoint or float
+        :param start_position: Position to move from, defaults to the current
+            position
+        :type start_position: int
+        :rtype: PathPlan
+        '''
+        if start_position is None:
+            start_position = self.position
+        runs = path_runs(waypoints, start_position, self.steps_per_rev)
+        profile = self.profile or ConstantProfile(self.delay)
+        return compile_path(self.phases, start_position, runs, profile)
+    
+    def execute(self, plan, stop=None, origin=None):
+        '''
+        Moves the motor through a compiled plan.
+        
+        :param plan: Plan starting from the current state
+        :type plan: MovePlan
+        :param stop: When set (e.g. from another thread) the move ends
+            before the next step, or slows to a stop along the plan if it is
+            a StopToken with a deceleration
+        :type stop: threading.Event or StopToken
+        :param origin: Scheduler clock time the plan's times are measured
+            from, e.g. the last deadline of the previous move so that moves
+            follow each other without a gap, defaults to now
+        :type origin: float
         :returns: New state position
         :rtype: int
         '''
-        # round to the nearest step possible
-        steps = int(round(cycles * len(self.MOTOR_INPUTS)))
+        write = self.parallel_interface.setData
+        scheduler = self.scheduler
+        total = self.steps_per_rev
+        # checked once per move so that no formatting is done per step
+        # unless debug tracing has been enabled
+        trace = logger.isEnabledFor(logging.DEBUG)
         
-        stepper = self.stepper_generator(steps)
+        checkpoint = self.checkpoint
+        if checkpoint is not None:
+            every = next_checkpoint = self.checkpoint_every
+            checkpoint.begin(plan.start_position)
+        else:
+            # never reached
+            next_checkpoint = -1
         
-        for motor_position in stepper:
-            ##print "turn motor to position %s" % hex(motor_position)
-            self.parallel_interface.setData(motor_position)
-            time.sleep(self.delay)
+        # each step has an absolute deadline from the start of the move so
+        # the time taken to write a step does not add to the move time
+        done = 0
+        scheduler.start(origin)
+        wait_until = scheduler.wait_until
+        instruments = self.instruments
+        try:
+            if instruments is None:
+                for value, deadline in izip(plan.values, plan.times):
+                    if stop is not None and stop.is_set():
+                        break
+                    write(value)
+                    done += 1
+                    if done == next_checkpoint:
+                        checkpoint.save(plan.position_at(done - 1))
+                        next_checkpoint += every
+                    if trace:
+                        state = plan.position_at(done - 1) % total
+                        logger.debug(
+                            "%+ 4d : Moving to internal state index %02d, %s hex %03.2f degrees",
+                            done * plan.direction, state, hex(value),
+                            state_to_angle(state, total))
+                    wait_until(deadline)
+            else:
+                # the same loop, timing each step
+                step = instruments.step
+                stepped = instruments.stepped
+                waited = instruments.waited
+                lateness = scheduler.lateness
+                instruments.begin()
+                for value, deadline in izip(plan.values, plan.times):
+                    if stop is not None and stop.is_set():
+                        break
+                    position = plan.position_at(done)
+                    step(write, position, value)
+                    done += 1
+                    stepped(position, value)
+                    if done == next_checkpoint:
+                        checkpoint.save(position)
+                        next_checkpoint += every
+                    if trace:
+                        state = position % total
+                        logger.debug(
+                            "%+ 4d : Moving to internal state index %02d, %s hex %03.2f degrees",
+                            done * plan.direction, state, hex(value),
+                            state_to_angle(state, total))
+                    wait_until(deadline)
+                    waited(lateness[-1])
+            
+            ramp = getattr(stop, 'ramp', None)
+            if ramp is not None and 0 < done < len(plan) and stop.is_set():
+                # slow to a stop along the rest of the plan
+                previous = plan.times[done - 2] if done > 1 else 0.0
+                delays = ramp(plan.times[done - 1] - previous)
+                for delay in delays[:len(plan) - done]:
+                    if stop.immediate:
+                        break
+                    value = plan.values[done]
+                    if instruments is None:
+                        write(value)
+                    else:
+                        instruments.step(write, plan.position_at(done), value)
+                    done += 1
+                    if instruments is not None:
+                        instruments.stepped(plan.position_at(done - 1), value)
+                    scheduler.wait(delay)
+        finally:
+            # record how far the motor got even if the move was interrupted
+            self.position = plan.position_at(done - 1)
+            self.steps_moved += done
+            if checkpoint is not None:
+                checkpoint.end(self.position)
+        return self.state
     
+    def spin(self, direction=1, stop=None):
+        '''
+        Turns the motor continuously until stopped. The delay may be changed
+        while spinning to change speed.
+        
+        :param direction: 1 for clockwise, -1 for anti-clockwise
+        :type direction: int
+        :param stop: When set (e.g. from another thread) the motor stops
+            before the next step, or slows to a stop if it is a StopToken
+            with a deceleration
+        :type stop: threading.Event or StopToken
+        :returns: New state position
+        :rtype: int
+        '''
+        write = self.parallel_interface.setData
+        scheduler = self.scheduler
+        phases = self.phases
+        total = len(phases)
+        step = -1 if direction < 0 else 1
+        checkpoint = self.checkpoint
+        if checkpoint is not None:
+            checkpoint.begin(self.position)
+        instruments = self.instruments
+        if instruments is not None:
+            instruments.begin()
+        start = self.position
+        scheduler.start()
+        try:
+            while stop is None or not stop.is_set():
+                position = self.position + step
+                if instruments is None:
+                    write(phases[position % total])
+                    self.position = position
+                    scheduler.wait(self.delay)
+                else:
+                    value = phases[position % total]
+                    instruments.step(write, position, value)
+                    self.position = position
+                    instruments.stepped(position, value)
+                    scheduler.wait(self.delay)
+                    instruments.waited(scheduler.lateness[-1])
+                if position % self.steps_per_rev == 0:
+                    # keep the same deadlines but discard the jitter recorded
+                    # so far so that it does not grow without limit
+                    scheduler.start(scheduler.deadline)
+                    if checkpoint is not None:
+                        checkpoint.save(position)
+            
+            ramp = getattr(stop, 'ramp', None)
+            if ramp is not None:
+                # slow to a stop, recording the steps as the loop above does
+                for delay in ramp(self.delay):
+                    if stop.immediate:
+                        break
+                    position = self.position + step
+                    value = phases[position % total]
+                    if instruments is None:
+                        write(value)
+                        self.position = position
+                        scheduler.wait(delay)
+                    else:
+                        instruments.step(write, position, value)
+                        self.position = position
+                        instruments.stepped(position, value)
+                        scheduler.wait(delay)
+                        instruments.waited(scheduler.lateness[-1])
+                    if checkpoint is not None and \
+                       position % self.steps_per_rev == 0:
+                        checkpoint.save(position)
+        finally:
+            self.steps_moved += abs(self.position - start)
+            if checkpoint is not None:
+                checkpoint.end(self.position)
         return self.state
+    
+    def turn_motor(self, cycles):
+        '''
+        Turns the motor the desired amount.
+        
+        :param cycles: Loops to turn
+        :type cycles: float
+        :returns: New state position
+        :rtype: int
+        '''
+        return self.execute(self.plan_motor(cycles))
             
-    def turn_to_angle(self, angle):
+    def turn_to_angle(self, angle, direction=None):
         '''
         Turns the motor to the desired absolute angle.
         
@@ -174,11 +640,25 @@ class StepperMotor(object):
         
         :param angle: Angle to turn to
         :type angle: float
+        :param direction: CLOCKWISE or ANTICLOCKWISE to force the direction,
+            defaults to the shortest rotation
+        :type direction: int
         :returns: New state position
         :rtype: int
         '''
-        cycles = self.angle_to_cycles(angle, self.state)
-        return self.turn_motor(cycles)
+        return self.execute(self.plan_to_angle(angle, direction=direction))
+    
+    def follow_path(self, waypoints):
+        '''
+        Turns the motor through a sequence of waypoints as one move, only
+        slowing down where it reverses, dwells or finishes.
+        
+        :param waypoints: Waypoints, or absolute angles, in order
+        :type waypoints: sequence of Waypoint or float
+        :returns: New state position
+        :rtype: int
+        '''
+        return self.execute(self.plan_path(waypoints))
     
     def rotate(self, degrees):
         '''
@@ -192,18 +672,28 @@ class StepperMotor(object):
         :returns: New state position
         :rtype: int
         '''
-        cycles = degrees / 360.0
-        return self.turn_motor(cycles)
+        return self.execute(self.plan_rotate(degrees))
 
 
-if __name__ == '__main__':
+def main(argv=None):
+    '''
+    Runs the command line, see --help.
+    
+    The modules behind --program, --home and --profile are imported only
+    when those options are given, and the parallel port is opened by the
+    first move, so that --list, --reset, --status and --plan start quickly
+    and never touch the hardware.
+    
+    :param argv: Command line arguments, defaults to sys.argv
+    :type argv: list of str
+    '''
     import argparse
     example = """
 
 Here follow some examples:
 
-Turn motor 1.3 turns anti clockwise, slowly from 0:
-$ motor_position.py --cycle -1.3 --delay 0.5 --reset
+Turn motor 1.3 turns anti clockwise, slowly from 0, showing each step:
+$ motor_position.py --cycle -1.3 --delay 0.5 --reset --verbose
 
    +1 : Moving to internal state index 23, 0xd hex 345.00 degrees
    +0 : Moving to internal state index 22, 0x9 hex 330.00 degrees
@@ -217,7 +707,7 @@ $ motor_position.py --cycle -1.3 --delay 0.5 --reset
 
 
 Turn motor 45 degrees (eighth a turn) clockwise from its current position:
-$ motor_position.py --rotate 45
+$ motor_position.py --rotate 45 --verbose
 
  Read in current state position as 17
   +18 : Moving to internal state index 18, 0x6 hex 270.00 degrees
@@ -227,7 +717,7 @@ $ motor_position.py --rotate 45
 
 
 Turn motor to 270 degrees absolute angle, from the current 300 degrees angle.
-$ motor_position.py --angle 270
+$ motor_position.py --angle 270 --verbose
 
  Read in current state position as 20
   +21 : Moving to internal state index 19, 0xe hex 285.00 degrees
@@ -243,73 +733,250 @@ $ motor_position.py --angle 270
                         help='Angle to rotate motor clockwise to. Negative rotate turns the motor counter clockwise!')
     parser.add_argument('-a', '--angle', type=float, default=None, 
                         help='Absolute angle to rotate motor to. Range 0-360 degrees.')
+    parser.add_argument('--program', type=str, default=None, metavar='FILE',
+                        help='Run a motion program of ROTATE, ANGLE, CYCLE, SPEED, WAIT and REPEAT commands, - to read from stdin.')
+    parser.add_argument('--direction', choices=('cw', 'ccw'), default=None,
+                        help='Direction to turn to an absolute angle in, defaults to the shortest rotation.')
+    parser.add_argument('--home', action='store_true', default=False,
+                        help='Find the position from a sensor on a status line of the parallel port, before any move.')
+    parser.add_argument('--home_line', choices=sorted(STATUS_LINES),
+                        default='paper_out',
+                        help='Status line of the home sensor, which is active at --home_angle.')
+    parser.add_argument('--home_angle', type=float, default=0.0,
+                        help='Angle of the home sensor.')
+    parser.add_argument('--home_direction', choices=('cw', 'ccw'), default='cw',
+                        help='Direction to search for the home sensor in.')
     parser.add_argument('-d', '--delay', type=float, default=0.05,
                         help='Delay between stepper positions. Controls speed of motor!')
+    parser.add_argument('--rpm', type=float, default=None,
+                        help='Speed in revolutions per minute, instead of a delay.')
+    parser.add_argument('-m', '--mode', choices=MODES, default=HALF,
+                        help='Stepping mode. Positions are stored in half steps so the mode may differ between runs.')
+    parser.add_argument('--pins', type=lambda pin: int(pin, 0), nargs='+',
+                        default=DEFAULT_PINS, metavar='PIN',
+                        help='Port bit of each coil end in the order they are energised, e.g. 0x01 0x04 0x02 0x08.')
+    parser.add_argument('-p', '--profile', choices=('trapezoidal', 's-curve'),
+                        default=None,
+                        help='Accelerate to max_speed at the start of each move and decelerate at the end, rather than stepping at a constant delay.')
+    parser.add_argument('--max_speed', type=float, default=200.0,
+                        help='Maximum speed in steps per second when using a profile.')
+    parser.add_argument('--acceleration', type=float, default=400.0,
+                        help='Acceleration in steps per second squared when using a profile.')
+    parser.add_argument('--stop_deceleration', type=float, default=400.0,
+                        help='Deceleration in steps per second squared to stop with when interrupted, 0 to stop at once.')
+    parser.add_argument('-s', '--status', action='store_true', default=False,
+                        help='Print the stored position without moving the motor.')
     parser.add_argument('-l', '--list', action='store_true',
                         default=False, help='List motor hex positions.')
     parser.add_argument('--state_file', type=str, default='motor_state.ini',
                         help='Path of file to store motor position state.')                 
     parser.add_argument('--reset', action='store_true', default=False,
                         help='Reset stored state to 0 degrees before processing request.')
-    args = parser.parse_args()
+    parser.add_argument('--lock_timeout', type=float, default=10.0, metavar='SECONDS',
+                        help='Seconds to wait for another run or the daemon to release the motor state.')
+    parser.add_argument('--checkpoint', type=int, default=0, metavar='STEPS',
+                        help='Record the position every STEPS steps so that an interrupted move can be resumed.')
+    parser.add_argument('--plan', action='store_true', default=False,
+                        help='Print the compiled move as JSON instead of moving the motor.')
+    parser.add_argument('-v', '--verbose', action='store_true', default=False,
+                        help='Log every step of the motor (slows fast moves).')
+    args = parser.parse_args(argv)
     
-    # todo: check arguments are valid, this is only a start - can't allow ANGLE too!
-    if (args.cycle and args.rotate) \
-       or (args.rotate and args.angle) \
-       or (args.angle and args.rotate):
+    logging.basicConfig(format='%(message)s',
+                        level=logging.DEBUG if args.verbose else logging.INFO)
+    
+    moves = [move for move in (args.cycle, args.rotate, args.angle)
+             if move is not None]
+    if len(moves) > 1:
         parser.error('Cannot combine cycle, rotate and angle, please provide only one!')
+    if args.program and (moves or args.plan):
+        parser.error('A program cannot be combined with cycle, rotate, angle or plan')
+    if args.rpm is not None and args.rpm <= 0:
+        parser.error('Speed must be a positive rpm')
+    if args.rpm is not None and args.profile:
+        parser.error('A profile sets its own speed, use --max_speed rather than --rpm')
+    if args.home and args.plan:
+        parser.error('The position is not known until homed, so cannot plan with --home')
+    if args.checkpoint and args.mode != HALF:
+        parser.error('Checkpoints record half step positions, so require --mode half')
+
+    if args.list:
+        steps_per_rev = STEPS_PER_REV // half_steps(args.mode)
+        print "Motor positions:"
+        for n, p in enumerate(PhaseSequence(phase_table(args.mode, args.pins),
+                                            steps_per_rev)):
+            print "%d : %03.2f deg : %s hex" % (n, state_to_angle(n, steps_per_rev), hex(p))
+        parser.exit()
 
+    state_file = StateFile(args.state_file)
+    checkpoint_path = args.state_file + '.checkpoint'
+    if args.status and not args.reset:
+        # only reads the state, so need not wait for a run or daemon holding
+        # the lock, and shows how far a move in progress has got
+        state = None
+        if os.path.isfile(checkpoint_path):
+            state = Checkpoint(checkpoint_path).recover()
+        if state is None:
+            state = state_file.read() or 0
+        print "Position %d half steps, state index %02d, %03.2f degrees" % (
+            state, state % STEPS_PER_REV,
+            state_to_angle(state % STEPS_PER_REV, STEPS_PER_REV))
+        parser.exit()
+    # held until we exit so that other runs wait rather than use stale state
+    try:
+        state_file.lock(timeout=args.lock_timeout)
+    except StateLocked as err:
+        parser.error('%s, e.g. the daemon' % err)
+    if args.checkpoint or os.path.isfile(checkpoint_path):
+        checkpoint = Checkpoint(checkpoint_path)
+    else:
+        checkpoint = None
     
     # if reset, do this first
     if args.reset:
-        if os.path.isfile(args.state_file):
-            print "Reseting state by deleting state file"
-            os.remove(args.state_file)
+        if state_file.remove():
+            logger.info("Reseting state by deleting state file")
         else:
-            print "File not found: %s" % os.path.abspath(args.state_file)
-
-    if os.path.isfile(args.state_file):
-        # read in state position
-        with open(args.state_file, 'r') as fh:
-            # currently storing this value only!
-            state = int(fh.read())
-            print "Read in current state position as %02d" % state
-    else:
-        print "Creating initial state file, assuming current state is 00"
-        state = 0
-        with open(args.state_file, 'w') as fh:
-            fh.write(str(state))
-            
-    #TODO: Allow overriding the motor inputs
-    
-    # configure this per motor to be all the values to rotate a motor 360 degrees
-    MOTOR_INPUTS = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D] * 24
+            logger.info("File not found: %s", os.path.abspath(args.state_file))
+        if checkpoint is not None:
+            checkpoint.end(0)
 
-    stepper = StepperMotor(MOTOR_INPUTS, state, args.delay)
+    state = load_state(state_file, checkpoint)
 
-    if args.list:
-        print "Motor positions:"
-        for n, p in enumerate(stepper.MOTOR_INPUTS):
-            print "%d : %03.2f deg : %s hex" % (n, state_to_angle(n, len(stepper.MOTOR_INPUTS)), hex(p))
+    if args.status:
+        print "Position %d half steps, state index %02d, %03.2f degrees" % (
+            state, state % STEPS_PER_REV,
+            state_to_angle(state % STEPS_PER_REV, STEPS_PER_REV))
         parser.exit()
+    if not moves and not args.program and not args.home:
+        if args.reset:
+            # only reset required, exit
+            parser.exit()
+        parser.error("You must provide cycle or rotate to work")
 
-    # calculate number of cycles to turn
-    if args.cycle:
-        new_state = stepper.turn_motor(args.cycles)
-    elif args.rotate:
-        new_state = stepper.rotate(args.rotate)
-    elif args.angle:
-        new_state = stepper.turn_to_angle(args.angle)
-    elif args.reset:
-        # only reset required, exit
-        parser.exit()
+    if args.profile == 'trapezoidal':
+        from stepper_motor.profiles import TrapezoidalProfile
+        profile = TrapezoidalProfile(args.max_speed, args.acceleration)
+    elif args.profile == 's-curve':
+        from stepper_motor.profiles import SCurveProfile
+        profile = SCurveProfile(args.max_speed, args.acceleration)
     else:
-        parser.error("You must provide cycle or rotate to work")
+        profile = None
+
+    # the stored state is in half steps
+    stepper = StepperMotor(None, state, args.delay, profile=profile,
+                           steps_per_rev=STEPS_PER_REV, mode=HALF,
+                           pins=args.pins)
+    if args.checkpoint:
+        stepper.checkpoint = checkpoint
+        stepper.checkpoint_every = args.checkpoint
+
+    stop = StopToken(args.stop_deceleration or None)
+    def interrupted(signum, frame):
+        if stop.is_set():
+            logger.info("Stopping at once")
+            stop.set(immediate=True)
+        else:
+            logger.info("Stopping, interrupt again to stop at once")
+            stop.set()
+    if not args.plan:
+        # before anything is written to the port, including the half step
+        # of a mode change, so that an interrupted run saves the position
+        signal.signal(signal.SIGINT, interrupted)
+        signal.signal(signal.SIGTERM, interrupted)
     
-    # save state to file
-    with open(args.state_file, 'w') as fh:
-        fh.write(str(new_state))
-        print "Saved new state index %02d to file: %s" % (
-            new_state, args.state_file)
+    if args.mode != HALF:
+        if args.plan and from_half_position(args.mode, state) is None:
+            parser.error('The motor is between %s step positions, move it a half step before planning'
+                         % args.mode)
+        stepper.set_mode(args.mode)
+    if args.rpm:
+        # in steps of the mode moved in
+        stepper.rpm = args.rpm
 
-    print "FINISHED"
\ No newline at end of file
+    directions = {'cw': CLOCKWISE, 'ccw': ANTICLOCKWISE}
+    def plan_move():
+        if args.cycle is not None:
+            return stepper.plan_motor(args.cycle)
+        if args.rotate is not None:
+            return stepper.plan_rotate(args.rotate)
+        if args.angle is not None:
+            return stepper.plan_to_angle(args.angle,
+                                         direction=directions.get(args.direction))
+        return None
+    
+    # compile the move before touching the motor, unless homing moves it
+    program = plan = None
+    if args.program:
+        from stepper_motor.program import ProgramError, ProgramRunner
+        try:
+            program = sys.stdin if args.program == '-' else open(args.program)
+        except IOError as err:
+            parser.error('Cannot read program: %s' % err)
+    elif not args.home:
+        plan = plan_move()
+    if args.home:
+        from stepper_motor.feedback import LimitSwitch
+        from stepper_motor.homing import HomingError, home
+        try:
+            sensor = LimitSwitch(stepper.parallel_interface,
+                                 STATUS_LINES[args.home_line])
+        except AttributeError:
+            parser.error('Homing requires a parallel port to read the sensor from')
+    
+    if args.plan:
+        print plan.to_json()
+        parser.exit()
+    
+    error = None
+    try:
+        if args.home:
+            try:
+                home(stepper, sensor, directions[args.home_direction],
+                     home_position=int(round(
+                         args.home_angle / 360.0 * stepper.steps_per_rev)),
+                     stop=stop)
+            except HomingError as err:
+                error = err
+            # from the home position
+            plan = plan_move()
+        if error is None and not stop.is_set():
+            if program is not None:
+                try:
+                    ProgramRunner(stepper).run(program, stop)
+                except ProgramError as err:
+                    error = err
+            elif plan is not None:
+                started = stepper.scheduler.clock()
+                stepper.execute(plan, stop)
+                elapsed = stepper.scheduler.clock() - started
+                steps = abs(stepper.position - plan.start_position)
+                if steps and elapsed > 0:
+                    # each step is followed by its delay, so the move lasts
+                    # until the last one has passed
+                    measured = steps * 60.0 / (elapsed * stepper.steps_per_rev)
+                    if profile is None:
+                        logger.info("Moved %d steps at %.1f rpm, commanded %.1f rpm",
+                                    steps, measured, stepper.rpm)
+                    else:
+                        logger.info("Moved %d steps at %.1f rpm on average",
+                                    steps, measured)
+    finally:
+        # save position to file, which keeps count of whole turns, wherever
+        # the move ended
+        new_state = stepper.set_mode(HALF)
+        save_state(state_file, stepper.position)
+        logger.info("Saved new state index %02d to file: %s",
+                    new_state, args.state_file)
+    
+    if error is not None:
+        parser.error(str(error))
+    if stop.is_set():
+        logger.info("Move stopped early")
+        parser.exit(1)
+
+    logger.info("FINISHED")
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
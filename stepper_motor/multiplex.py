@@ -0,0 +1,232 @@
+'''
+Several motors driven from the bits of one parallel port data register.
+
+Each motor is given a PortChannel for its bits (e.g. one 4 coil motor on the
+low nibble and another on the high nibble) which it writes to as if it owned
+the port. Coordinated moves of several motors are merged into a single time
+ordered sequence of whole register writes.
+'''
+from array import array
+from bisect import bisect_left
+from itertools import izip
+
+from stepper_motor.motor_position import StepperMotor
+from stepper_motor.ports import ShadowPort, open_parallel
+from stepper_motor.scheduler import StepScheduler
+
+
+class SharedPort(ShadowPort):
+    '''
+    Register whose bits are shared by several PortChannels. Updates which
+    leave the register unchanged are not written, and updates made together
+    inside batch() are written once.
+    '''
+    def __init__(self, port, value=0):
+        '''
+        :param port: Port to write the combined register value to
+        :type port: object with setData method
+        :param value: Assumed value of the register before the first write
+        :type value: int
+        '''
+        super(SharedPort, self).__init__(port)
+        self.value = value
+
+    def channel(self, shift, width=4):
+        '''
+        :param shift: Lowest bit of the register used by the channel
+        :type shift: int
+        :param width: Number of bits used by the channel
+        :type width: int
+        :rtype: PortChannel
+        '''
+        return PortChannel(self, shift, width)
+
+
+class PortChannel(object):
+    def __init__(self, shared, shift, width=4):
+        '''
+        :param shared: Port whose bits are used
+        :type shared: SharedPort
+        :param shift: Lowest bit of the register used by the channel
+        :type shift: int
+        :param width: Number of bits used by the channel
+        :type width: int
+        '''
+        if shift < 0 or width < 1 or shift + width > 8:
+            raise ValueError("Channel of %d bits from bit %d does not fit in "
+                             "an 8 bit register" % (width, shift))
+        self.shared = shared
+        self.shift = shift
+        self.mask = ((1 << width) - 1) << shift
+
+    def bits(self, value):
+        '''
+        :param value: Motor input value for the channel
+        :type value: int
+        :returns: Value shifted into the channel's bits of the register
+        :rtype: int
+        '''
+        return (value << self.shift) & self.mask
+
+    def setData(self, value):
+        self.shared.update(self.mask, self.bits(value))
+
+
+class CoordinatedPlan(object):
+    def __init__(self, values, times, plans, ticks):
+        '''
+        :param values: Whole register value to write at each tick
+        :type values: array('B')
+        :param times: Seconds from the start of the move by which each tick
+            must be complete
+        :type times: array('d')
+        :param plans: Motor and MovePlan pairs which were merged
+        :type plans: list of tuples
+        :param ticks: For each plan, the tick index of each of its steps
+        :type ticks: list of array('l')
+        '''
+        self.values = values
+        self.times = times
+        self.plans = plans
+        self.ticks = ticks
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def duration(self):
+        return self.times[-1] if self.times else 0.0
+
+
+class MultiMotorDriver(object):
+    def __init__(self, port=None, scheduler=None, resolution=1e-6):
+        '''
+        :param port: Port shared by the motors, defaults to the parallel port
+        :type port: object with setData method
+        :param scheduler: Paces the writes of coordinated moves
+        :type scheduler: StepScheduler
+        :param resolution: Steps of different motors due within this many
+            seconds of each other are written together
+        :type resolution: float
+        '''
+        self.shared = SharedPort(port if port is not None else open_parallel())
+        self.scheduler = scheduler or StepScheduler()
+        self.resolution = resolution
+        self.motors = []
+
+    def add_motor(self, motor_inputs, shift, width=4, **kwargs):
+        '''
+        Creates a motor driven by some bits of the shared port.
+
+        :param motor_inputs: Coil phase values of the motor, unshifted
+        :type motor_inputs: list or tuple
+        :param shift: Lowest bit of the register used by the motor
+        :type shift: int
+        :param width: Number of bits used by the motor
+        :type width: int
+        :param kwargs: Passed to StepperMotor
+        :returns: Motor which may also be moved on its own
+        :rtype: StepperMotor
+        '''
+        channel = self.shared.channel(shift, width)
+        for motor in self.motors:
+            if motor.parallel_interface.mask & channel.mask:
+                raise ValueError("Bits %s hex are already used by another motor"
+                                 % hex(motor.parallel_interface.mask & channel.mask))
+        motor = StepperMotor(motor_inputs, scheduler=self.scheduler, **kwargs)
+        motor.parallel_interface = channel
+        self.motors.append(motor)
+        return motor
+
+    def compile(self, plans):
+        '''
+        Merges the plans of several motors into one sequence of register
+        writes, combining steps due at the same time into one write.
+
+        :param plans: Motor and MovePlan pairs, each from the motor's position
+        :type plans: list of tuples
+        :rtype: CoordinatedPlan
+        '''
+        events = []
+        for index, (motor, plan) in enumerate(plans):
+            start = 0.0
+            for value, done in izip(plan.values, plan.times):
+                events.append((start, index, value))
+                start = done
+        events.sort()
+
+        register = self.shared.value
+        values = array('B')
+        starts = []
+        ticks = [array('l') for _ in plans]
+        for start, index, value in events:
+            channel = plans[index][0].parallel_interface
+            tick = len(values) - 1
+            motor_ticks = ticks[index]
+            # never write two steps of one motor at once as the first is lost
+            if not starts or start - starts[-1] > self.resolution or \
+               (motor_ticks and motor_ticks[-1] == tick):
+                values.append(0)
+                starts.append(start)
+                tick += 1
+            register = (register & ~channel.mask & 0xFF) | channel.bits(value)
+            values[tick] = register
+            motor_ticks.append(tick)
+
+        duration = max([plan.duration for motor, plan in plans] or [0.0])
+        times = array('d', starts[1:])
+        if values:
+            times.append(duration)
+        return CoordinatedPlan(values, times, list(plans), ticks)
+
+    def execute(self, coordinated):
+        '''
+        Moves the motors through a coordinated plan.
+
+        :param coordinated: Plan compiled from the motors' current positions
+        :type coordinated: CoordinatedPlan
+        :returns: New state of each motor
+        :rtype: list of int
+        '''
+        write = self.shared.port.setData
+        scheduler = self.scheduler
+        done = 0
+        scheduler.start()
+        wait_until = scheduler.wait_until
+        try:
+            for value, deadline in izip(coordinated.values, coordinated.times):
+                write(value)
+                done += 1
+                wait_until(deadline)
+        finally:
+            if done:
+                self.shared.value = self.shared.written = \
+                    coordinated.values[done - 1]
+            # record how far each motor got even if the move was interrupted
+            for (motor, plan), ticks in izip(coordinated.plans, coordinated.ticks):
+                motor.position = plan.position_at(bisect_left(ticks, done) - 1)
+        return [motor.state for motor, plan in coordinated.plans]
+
+    def turn_motors(self, cycles):
+        '''
+        Turns several motors at once.
+
+        :param cycles: Loops to turn each motor
+        :type cycles: list of (StepperMotor, float) tuples
+        :returns: New state of each motor, in the order given
+        :rtype: list of int
+        '''
+        plans = [(motor, motor.plan_motor(loops)) for motor, loops in cycles]
+        return self.execute(self.compile(plans))
+
+    def rotate_motors(self, degrees):
+        '''
+        Turns several motors by a number of degrees at once.
+
+        :param degrees: Degrees to turn each motor by
+        :type degrees: list of (StepperMotor, float) tuples
+        :returns: New state of each motor, in the order given
+        :rtype: list of int
+        '''
+        plans = [(motor, motor.plan_rotate(angle)) for motor, angle in degrees]
+        return self.execute(self.compile(plans))
@@ -0,0 +1,134 @@
+'''
+Plans a sequence of waypoints as one continuous move.
+
+    stepper.follow_path([90, Waypoint(rotate=45, dwell=0.5), 0])
+
+Consecutive waypoints reached turning the same way without a dwell are joined
+into one run, so that an accelerating profile only ramps down where the motor
+reverses, dwells or finishes rather than stopping at every waypoint. The
+whole step stream is compiled before the motor moves.
+'''
+from array import array
+
+from stepper_motor.kinematics import angle_to_cycles
+from stepper_motor.plan import PathPlan, compile_steps
+
+
+class Waypoint(object):
+    def __init__(self, angle=None, rotate=None, dwell=0.0, direction=None):
+        '''
+        :param angle: Absolute angle to turn to
+        :type angle: float
+        :param rotate: Degrees to turn by, instead of an angle
+        :type rotate: float
+        :param dwell: Seconds to hold still once reached
+        :type dwell: float
+        :param direction: CLOCKWISE or ANTICLOCKWISE to force the direction
+            turned to an absolute angle, defaults to the shortest rotation
+        :type direction: int
+        '''
+        if (angle is None) == (rotate is None):
+            raise ValueError("Waypoint requires either an angle or a rotation")
+        if dwell < 0:
+            raise ValueError("Waypoint dwell cannot be negative, got %s" % dwell)
+        self.angle = angle
+        self.rotate = rotate
+        self.dwell = dwell
+        self.direction = direction
+
+    def __repr__(self):
+        if self.angle is not None:
+            target = 'angle=%r' % self.angle
+        else:
+            target = 'rotate=%r' % self.rotate
+        return 'Waypoint(%s, dwell=%r)' % (target, self.dwell)
+
+    def steps_from(self, position, steps_per_rev):
+        '''
+        :param position: Motor position the waypoint is reached from
+        :type position: int
+        :param steps_per_rev: Number of steps in one revolution
+        :type steps_per_rev: int
+        :returns: Signed number of steps to the waypoint
+        :rtype: int
+        '''
+        if self.angle is not None:
+            cycles = angle_to_cycles(self.angle, position % steps_per_rev,
+                                     steps_per_rev, self.direction)
+        else:
+            cycles = self.rotate / 360.0
+        return int(round(cycles * steps_per_rev))
+
+
+def path_runs(waypoints, start_position, steps_per_rev):
+    '''
+    Groups waypoints into runs the motor makes without stopping.
+
+    :param waypoints: Waypoints, or absolute angles, in order
+    :type waypoints: sequence of Waypoint or float
+    :param start_position: Motor position before the path
+    :type start_position: int
+    :param steps_per_rev: Number of steps in one revolution
+    :type steps_per_rev: int
+    :returns: (signed steps, dwell after the run) of each run
+    :rtype: list of tuples
+    '''
+    runs = []
+    position = start_position
+    for waypoint in waypoints:
+        if not isinstance(waypoint, Waypoint):
+            waypoint = Waypoint(angle=waypoint)
+        steps = waypoint.steps_from(position, steps_per_rev)
+        position += steps
+        if runs and not steps:
+            # already there, hold at the end of the last run
+            runs[-1][1] += waypoint.dwell
+        elif runs and runs[-1][0] and not runs[-1][1] and \
+                (runs[-1][0] < 0) == (steps < 0):
+            # carry on at speed in the same direction
+            runs[-1][0] += steps
+            runs[-1][1] = waypoint.dwell
+        elif steps or waypoint.dwell:
+            runs.append([steps, waypoint.dwell])
+    return [tuple(run) for run in runs]
+
+
+def compile_path(phases, start_position, runs, profile):
+    '''
+    Compiles runs into one PathPlan.
+
+    A run of no steps, only possible first, holds the motor at its start
+    position by writing its current phase and waiting.
+
+    :param phases: Repeating coil phase values, indexed by position
+    :type phases: list or tuple
+    :param start_position: Motor position before the path
+    :type start_position: int
+    :param runs: (signed steps, dwell) of each run, see path_runs
+    :type runs: list of tuples
+    :param profile: Gives the delay of each step of a run
+    :type profile: MotionProfile
+    :rtype: PathPlan
+    '''
+    values = array('B')
+    times = array('d')
+    positions = array('l')
+    position = start_position
+    offset = 0.0
+    for steps, dwell in runs:
+        if not steps:
+            values.append(phases[position % len(phases)])
+            positions.append(position)
+            offset += dwell
+            times.append(offset)
+            continue
+        delays = array('d', profile.delays(steps))
+        delays[-1] += dwell
+        plan = compile_steps(phases, position, steps, delays)
+        values.extend(plan.values)
+        times.extend(offset + time for time in plan.times)
+        step = plan.direction
+        positions.extend(xrange(position + step, position + steps + step, step))
+        position += steps
+        offset = times[-1]
+    return PathPlan(values, times, positions, start_position)
@@ -0,0 +1,113 @@
+'''
+Coil phase tables for wave, full step and half step drive.
+
+Pins are the port bits of the coil ends in the order they are energised
+around the stator, e.g. A, B, A', B' for a two coil motor. Tables are built
+once per mode and pin mapping.
+
+Positions in each mode are related through half step positions, counted in
+half steps from the first half step phase:
+
+    half step    0    1    2    3    4 ...
+    full step    0         1         2 ...
+    wave        (0)   1         2      ...
+
+so the rotor keeps its position when the mode is changed, provided it is at
+a position the new mode can hold.
+'''
+from stepper_motor.cache import LRUCache
+
+WAVE = 'wave'
+FULL = 'full'
+HALF = 'half'
+MODES = (WAVE, FULL, HALF)
+
+# pins of the coil ends of the rig motor, giving its original half step table
+DEFAULT_PINS = (0x01, 0x04, 0x02, 0x08)
+
+_tables = LRUCache(32)
+
+
+def phase_table(mode=HALF, pins=DEFAULT_PINS):
+    '''
+    Builds the repeating coil phase sequence of a stepping mode.
+
+    Wave drive energises one coil end at a time. Full step energises two
+    neighbouring ends, lying half way between the wave positions. Half step
+    alternates between a full step and a full step combined with the next,
+    which energises three ends of which the outer two oppose each other,
+    holding the rotor on the middle end.
+
+    :param mode: WAVE, FULL or HALF
+    :type mode: str
+    :param pins: Port bit of each coil end, in order
+    :type pins: sequence of ints
+    :returns: Port value of each phase
+    :rtype: tuple
+    '''
+    pins = tuple(pins)
+    key = (mode, pins)
+    table = _tables.get(key)
+    if table is not None:
+        return table
+    if mode not in MODES:
+        raise ValueError("Unknown mode '%s', expected one of %s"
+                         % (mode, ', '.join(MODES)))
+    if len(pins) < 2:
+        raise ValueError("At least two coil ends are required, got %d"
+                         % len(pins))
+    count = len(pins)
+    full = [pins[n] | pins[(n + 1) % count] for n in xrange(count)]
+    if mode == WAVE:
+        table = pins
+    elif mode == FULL:
+        table = tuple(full)
+    else:
+        table = []
+        for n in xrange(count):
+            table.append(full[n])
+            table.append(full[n] | full[(n + 1) % count])
+        table = tuple(table)
+    _tables.put(key, table)
+    return table
+
+
+def half_steps(mode):
+    '''
+    :returns: Number of half steps in one step of a mode
+    :rtype: int
+    '''
+    return 1 if mode == HALF else 2
+
+
+def to_half_position(mode, position):
+    '''
+    :param mode: Mode the position is counted in
+    :type mode: str
+    :param position: Motor position
+    :type position: int
+    :returns: Position in half steps
+    :rtype: int
+    '''
+    if mode == HALF:
+        return position
+    if mode == FULL:
+        return 2 * position
+    return 2 * position - 1
+
+
+def from_half_position(mode, half_position):
+    '''
+    :param mode: Mode to count the position in
+    :type mode: str
+    :param half_position: Position in half steps
+    :type half_position: int
+    :returns: Motor position, or None if the mode cannot hold the rotor
+        there
+    :rtype: int or None
+    '''
+    if mode == HALF:
+        return half_position
+    if mode == FULL:
+        return half_position // 2 if half_position % 2 == 0 else None
+    return (half_position + 1) // 2 if half_position % 2 else None
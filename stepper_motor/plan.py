@@ -0,0 +1,283 @@
+'''
+Compiled moves: the port value written at each step and the time by which
+the step must be complete, computed before the move starts so that executing
+it only has to replay two flat arrays.
+'''
+import json
+from array import array
+
+from stepper_motor.cache import LRUCache
+from stepper_motor.lazy import optional_module
+
+# imported when first used
+numpy = optional_module('numpy')
+
+# shorter moves are summed in Python, which is quicker than importing numpy
+NUMPY_MIN_STEPS = 4096
+
+
+class MovePlan(object):
+    def __init__(self, values, times, start_position, steps):
+        '''
+        :param values: Port value to write for each step
+        :type values: array('B')
+        :param times: Seconds from the start of the move by which each step
+            must be complete (when the next value may be written)
+        :type times: array('d')
+        :param start_position: Motor position before the move
+        :type start_position: int
+        :param steps: Signed number of steps moved
+        :type steps: int
+        '''
+        if len(values) != len(times):
+            raise ValueError("Plan has %d values but %d times"
+                             % (len(values), len(times)))
+        if len(values) != abs(steps):
+            raise ValueError("Plan of %d steps has %d values"
+                             % (steps, len(values)))
+        self.values = values
+        self.times = times
+        self.start_position = start_position
+        self.steps = steps
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        '''
+        :returns: Iterator of (port value, time) tuples
+        '''
+        return iter(zip(self.values, self.times))
+
+    def __repr__(self):
+        return '%s(start_position=%d, steps=%+d, duration=%.6f)' % (
+            self.__class__.__name__, self.start_position, self.steps,
+            self.duration)
+
+    def __eq__(self, other):
+        if not isinstance(other, MovePlan):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    @property
+    def direction(self):
+        return -1 if self.steps < 0 else 1
+
+    @property
+    def duration(self):
+        '''
+        :returns: Seconds from the start of the move until the last step is
+            complete
+        :rtype: float
+        '''
+        return self.times[-1] if self.times else 0.0
+
+    @property
+    def end_position(self):
+        return self.start_position + self.steps
+
+    def position_at(self, index):
+        '''
+        :param index: Index of a step, -1 for before the first step
+        :type index: int
+        :returns: Motor position once the step has been written
+        :rtype: int
+        '''
+        return self.start_position + (index + 1) * self.direction
+
+    def rebase(self, start_position):
+        '''
+        Returns the same move from another position with the same coil phase,
+        sharing the value and time tables rather than copying them.
+
+        :param start_position: Motor position before the move
+        :type start_position: int
+        :rtype: MovePlan
+        '''
+        return MovePlan(self.values, self.times, start_position, self.steps)
+
+    def to_dict(self):
+        '''
+        :returns: JSON serialisable representation of the plan
+        :rtype: dict
+        '''
+        return {
+            'start_position': self.start_position,
+            'steps': self.steps,
+            'values': self.values.tolist(),
+            'times': self.times.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        :param data: As returned by to_dict
+        :type data: dict
+        :rtype: MovePlan
+        '''
+        return cls(array('B', data['values']), array('d', data['times']),
+                   data['start_position'], data['steps'])
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+
+def cumulative_times(delays):
+    '''
+    Converts the delay after each step into the time each step is complete.
+
+    :param delays: Delay after each step in seconds
+    :type delays: sequence of float
+    :rtype: array('d')
+    '''
+    if numpy is not None and len(delays) >= NUMPY_MIN_STEPS:
+        return array('d', numpy.cumsum(delays, dtype='d').tolist())
+    times = array('d')
+    total = 0.0
+    for delay in delays:
+        total += delay
+        times.append(total)
+    return times
+
+
+def compile_steps(phases, start_position, steps, delays):
+    '''
+    Compiles a move of a number of steps from a position into a MovePlan.
+
+    :param phases: Repeating coil phase values, indexed by position
+    :type phases: list or tuple
+    :param start_position: Motor position before the move
+    :type start_position: int
+    :param steps: Signed number of steps to move
+    :type steps: int
+    :param delays: Delay after each step in seconds
+    :type delays: sequence of float
+    :rtype: MovePlan
+    '''
+    total = len(phases)
+    step = -1 if steps < 0 else 1
+    # one cycle of phases in the order they are visited, repeated to length
+    cycle = array('B', [phases[(start_position + step * (n + 1)) % total]
+                        for n in xrange(total)])
+    values = cycle * (abs(steps) // total + 1)
+    del values[abs(steps):]
+    return MovePlan(values, cumulative_times(delays), start_position, steps)
+
+
+class PlanCache(object):
+    '''
+    Compiled moves, kept so that a move repeated from the same coil phase,
+    by the same number of steps and with the same profile, is not planned
+    again. Plans from the cache share their tables, which must not be
+    modified.
+    '''
+    def __init__(self, maxsize=64, max_steps=65536):
+        '''
+        :param maxsize: Maximum number of plans to keep
+        :type maxsize: int
+        :param max_steps: Longest move to keep the plan of, so that the cache
+            holds at most maxsize * max_steps steps
+        :type max_steps: int
+        '''
+        self._plans = LRUCache(maxsize)
+        self.max_steps = max_steps
+
+    def __len__(self):
+        return len(self._plans)
+
+    def compile(self, phases, start_position, steps, profile):
+        '''
+        Returns the plan of a move, compiling it unless it is cached.
+
+        :param phases: Repeating coil phase values, indexed by position
+        :type phases: list or tuple
+        :param start_position: Motor position before the move
+        :type start_position: int
+        :param steps: Signed number of steps to move
+        :type steps: int
+        :param profile: Gives the delay of each step. Moves with a profile
+            whose key is None are not cached
+        :type profile: MotionProfile
+        :rtype: MovePlan
+        '''
+        profile_key = profile.key
+        if profile_key is None or abs(steps) > self.max_steps:
+            return compile_steps(phases, start_position, steps,
+                                 profile.delays(steps))
+        key = (tuple(phases), start_position % len(phases), steps, profile_key)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = compile_steps(phases, start_position, steps,
+                                 profile.delays(steps))
+            self._plans.put(key, plan)
+        elif plan.start_position != start_position:
+            plan = plan.rebase(start_position)
+        return plan
+
+    def clear(self):
+        self._plans.clear()
+
+    def stats(self):
+        '''
+        :returns: hits, misses, size and maxsize of the cache
+        :rtype: dict
+        '''
+        return self._plans.stats()
+
+
+class PathPlan(MovePlan):
+    '''
+    Plan which may change direction or hold still, so records the position
+    after every step rather than a single direction.
+    '''
+    def __init__(self, values, times, positions, start_position):
+        '''
+        :param values: Port value to write for each step
+        :type values: array('B')
+        :param times: Seconds from the start of the move by which each step
+            must be complete
+        :type times: array('d')
+        :param positions: Motor position once each step has been written
+        :type positions: array('l')
+        :param start_position: Motor position before the move
+        :type start_position: int
+        '''
+        if len(positions) != len(values):
+            raise ValueError("Plan has %d values but %d positions"
+                             % (len(values), len(positions)))
+        self.positions = positions
+        # steps is the net move, which need not match the number of values
+        super(PathPlan, self).__init__(values, times, start_position,
+                                       len(values))
+        end_position = positions[-1] if positions else start_position
+        self.steps = end_position - start_position
+
+    def position_at(self, index):
+        if index < 0:
+            return self.start_position
+        return self.positions[index]
+
+    def rebase(self, start_position):
+        offset = start_position - self.start_position
+        return PathPlan(self.values, self.times,
+                        array('l', [position + offset
+                                    for position in self.positions]),
+                        start_position)
+
+    def to_dict(self):
+        data = super(PathPlan, self).to_dict()
+        data['positions'] = self.positions.tolist()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(array('B', data['values']), array('d', data['times']),
+                   array('l', data['positions']), data['start_position'])
@@ -0,0 +1,296 @@
+'''
+Port backends written to by StepperMotor.
+
+A port backend only needs a setData(value) method writing the 8 bit data
+register, matching pyparallel's Parallel class. DryRunPort stands in when
+there is no parallel port and SimulatedPort records every write against a
+VirtualClock and models the rotor, so long moves can be run and checked at
+CPU speed.
+'''
+import threading
+from array import array
+from contextlib import contextmanager
+
+from stepper_motor.scheduler import SLEEP, StepScheduler
+
+
+class Port(object):
+    def setData(self, value):
+        '''
+        :param value: Value of the 8 bit data register
+        :type value: int
+        '''
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class DryRunPort(Port):
+    '''
+    Counts writes without controlling any hardware.
+    '''
+    call_count = 0
+    value = None
+
+    def setData(self, value):
+        self.call_count += 1
+        self.value = value
+
+
+class ShadowPort(Port):
+    '''
+    Wraps a port, remembering the value last written so that writes which
+    would not change the register are skipped.
+
+    Bit masked updates made inside batch() are combined into one write when
+    the outermost batch ends, e.g. for several motors sharing the register
+    which step at the same time.
+    '''
+    def __init__(self, port, value=None):
+        '''
+        :param port: Port to write to
+        :type port: object with setData method
+        :param value: Value the register is known to hold, defaults to
+            unknown so that the first write is never skipped
+        :type value: int
+        '''
+        self.port = port
+        # register value including updates held by a batch
+        self.value = value
+        # register value last written to the port
+        self.written = value
+        self.writes = 0
+        self.saved = 0
+        self._held = 0
+        self._depth = 0
+        self._lock = threading.Lock()
+
+    def setData(self, value):
+        if value == self.written:
+            self.saved += 1
+            return
+        self.port.setData(value)
+        self.value = self.written = value
+        self.writes += 1
+
+    def update(self, mask, bits):
+        '''
+        Changes the masked bits of the register, leaving the rest alone.
+
+        :param mask: Bits of the register to change
+        :type mask: int
+        :param bits: New value of the masked bits
+        :type bits: int
+        '''
+        with self._lock:
+            self.value = ((self.value or 0) & ~mask & 0xFF) | (bits & mask)
+            if self._depth:
+                self._held += 1
+            else:
+                self.setData(self.value)
+
+    @contextmanager
+    def batch(self):
+        '''
+        Holds back updates, from any thread, until the outermost batch ends.
+        '''
+        with self._lock:
+            self._depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._depth -= 1
+                if not self._depth and self._held:
+                    held, self._held = self._held, 0
+                    # every held update but the one written was saved
+                    self.saved += held - 1
+                    self.setData(self.value)
+
+    def stats(self):
+        '''
+        :returns: Number of writes made and saved
+        :rtype: dict
+        '''
+        return {'writes': self.writes, 'saved': self.saved}
+
+    def close(self):
+        close = getattr(self.port, 'close', None)
+        if close is not None:
+            close()
+
+
+# pyparallel methods reading the status lines of the port, by name
+STATUS_LINES = {
+    'acknowledge': 'getInAcknowledge',
+    'busy': 'getInBusy',
+    'error': 'getInError',
+    'paper_out': 'getInPaperOut',
+    'selected': 'getInSelected',
+}
+
+
+class ParallelPort(Port):
+    '''
+    Parallel port driven through pyparallel, which is imported when the port
+    is opened.
+    '''
+    def __init__(self, port=0):
+        '''
+        :param port: Number or device path of the parallel port
+        :type port: int or str
+        '''
+        from parallel import Parallel
+        self.parallel = Parallel(port)
+        self.setData = self.parallel.setData
+
+    def __getattr__(self, name):
+        # status lines, e.g. getInBusy, are read straight from pyparallel
+        return getattr(self.parallel, name)
+
+
+def open_parallel(port=0):
+    '''
+    Opens the parallel port, importing pyparallel only now so that runs which
+    never move the motor do not load or probe the driver.
+
+    :param port: Number or device path of the parallel port
+    :type port: int or str
+    :returns: The port, or a DryRunPort without pyparallel
+    :rtype: ParallelPort or DryRunPort
+    '''
+    try:
+        return ParallelPort(port)
+    except ImportError:
+        print "Requires Java Communications API and pyparallel"
+        print "http://sourceforge.net/projects/pyserial/files/pyparallel/0.2/"
+        print "WARNING: Running in Dry Run mode without parallel port control!"
+        return DryRunPort()
+
+
+class VirtualClock(object):
+    '''
+    Clock which only moves forward when slept on, so timed moves take no real
+    time.
+    '''
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def scheduler(self):
+        '''
+        :returns: Scheduler sleeping on this clock
+        :rtype: StepScheduler
+        '''
+        return StepScheduler(SLEEP, clock=self.time, sleep=self.sleep)
+
+
+UNKNOWN = 'unknown'
+ILLEGAL = 'illegal'
+SKIPPED = 'skipped'
+
+
+class SimulatedPort(Port):
+    '''
+    Records writes and models a rotor following them, which reads back as a
+    feedback source (see stepper_motor.feedback) and through the status
+    lines: a quadrature encoder of one count per step on getInAcknowledge
+    (A) and getInBusy (B), and an index sensor on getInPaperOut.
+    '''
+    def __init__(self, phases, clock=None, min_interval=0.0, position=0,
+                 steps_per_rev=None, index_position=0):
+        '''
+        :param phases: Coil phase sequence of the simulated motor
+        :type phases: list or tuple
+        :param clock: Clock the writes are timed by, defaults to a new
+            VirtualClock
+        :type clock: VirtualClock
+        :param min_interval: Shortest time between steps the rotor can follow
+        :type min_interval: float
+        :param position: Starting position of the rotor, which is assumed to
+            be held at its phase
+        :type position: int
+        :param steps_per_rev: Number of steps in one revolution, needed for
+            the index sensor
+        :type steps_per_rev: int
+        :param index_position: State position the index sensor is active at
+        :type index_position: int
+        :raises ValueError: if a phase value repeats, e.g. a phase table
+            expanded to a whole revolution, as the rotor's phase could not be
+            told from the value written
+        '''
+        if len(set(phases)) != len(phases):
+            raise ValueError("Phase values must not repeat, give one cycle of phases")
+        self.phases = tuple(phases)
+        self.clock = clock or VirtualClock()
+        self.min_interval = min_interval
+        self.position = position
+        self.steps_per_rev = steps_per_rev
+        self.index_position = index_position
+        self.times = array('d')
+        self.values = array('B')
+        # (time, value, reason) of each write the rotor did not follow
+        self.faults = []
+        self._phase_index = dict((value, index) for index, value in
+                                 enumerate(self.phases))
+        self._last_step = None
+
+    def setData(self, value):
+        now = self.clock.time()
+        self.times.append(now)
+        self.values.append(value)
+
+        total = len(self.phases)
+        index = self._phase_index.get(value)
+        if index is None:
+            self.faults.append((now, value, UNKNOWN))
+            return
+        # signed phase difference between the command and the rotor
+        delta = (index - self.position) % total
+        if delta > total // 2:
+            delta -= total
+        if delta == 0:
+            return
+        if abs(delta) > 1:
+            self.faults.append((now, value, ILLEGAL))
+            return
+        if self._last_step is not None and \
+           now - self._last_step < self.min_interval:
+            self.faults.append((now, value, SKIPPED))
+            return
+        self.position += delta
+        self._last_step = now
+
+    def read(self, position=None):
+        '''
+        :returns: Position of the rotor
+        :rtype: int
+        '''
+        return self.position
+
+    def getInAcknowledge(self):
+        # quadrature codes 00, 10, 11, 01 in turn, A high at 1 and 2
+        return self.position % 4 in (1, 2)
+
+    def getInBusy(self):
+        return self.position % 4 in (2, 3)
+
+    def getInPaperOut(self):
+        if self.steps_per_rev is None:
+            return False
+        return self.position % self.steps_per_rev == self.index_position
+
+    @property
+    def writes(self):
+        '''
+        :returns: (time, value) of every write
+        :rtype: list of tuples
+        '''
+        return zip(self.times, self.values)
@@ -0,0 +1,157 @@
+'''
+Motion profiles which precompute the delay before each step of a move.
+
+Speeds are in steps per second and accelerations in steps per second squared.
+Accelerating profiles ramp the speed up from start_speed at the beginning of
+a move and back down symmetrically at the end, so short moves which cannot
+reach max_speed form a triangle.
+'''
+import math
+from array import array
+
+from stepper_motor.cache import LRUCache
+from stepper_motor.lazy import optional_module
+
+# imported when first used
+numpy = optional_module('numpy')
+
+
+class MotionProfile(object):
+    # number of move lengths to keep delay tables for
+    cache_size = 32
+
+    def __init__(self):
+        self._tables = LRUCache(self.cache_size)
+
+    def delays(self, steps):
+        '''
+        Returns the delay after each step of a move, cached per move length.
+
+        :param steps: Number of steps in the move, the sign is ignored
+        :type steps: int
+        :returns: Delay in seconds after each step
+        :rtype: array('d')
+        '''
+        steps = abs(steps)
+        table = self._tables.get(steps)
+        if table is None:
+            if numpy is not None:
+                table = array('d', self._numpy_delays(steps).tolist())
+            else:
+                table = array('d', self._python_delays(steps))
+            self._tables.put(steps, table)
+        return table
+
+    @property
+    def key(self):
+        '''
+        :returns: Parameters of the profile, equal only for profiles giving
+            the same delays, or None if plans using it cannot be cached
+        :rtype: tuple
+        '''
+        return None
+
+    def _numpy_delays(self, steps):
+        return numpy.array(self._python_delays(steps), dtype='d')
+
+    def _python_delays(self, steps):
+        raise NotImplementedError
+
+
+class ConstantProfile(MotionProfile):
+    def __init__(self, delay):
+        '''
+        :param delay: Delay between steps (speed)
+        :type delay: float
+        '''
+        super(ConstantProfile, self).__init__()
+        self.delay = delay
+
+    @property
+    def key(self):
+        return (self.__class__.__name__, self.delay)
+
+    def delays(self, steps):
+        # no need to cache a table of identical values
+        return array('d', [self.delay]) * abs(steps)
+
+
+class _RampProfile(MotionProfile):
+    def __init__(self, max_speed, acceleration, start_speed=None):
+        '''
+        :param max_speed: Cruising speed in steps per second
+        :type max_speed: float
+        :param acceleration: Acceleration in steps per second squared
+        :type acceleration: float
+        :param start_speed: Speed of the first and last steps, defaults to the
+            speed reached accelerating from rest over one step
+        :type start_speed: float
+        '''
+        super(_RampProfile, self).__init__()
+        if max_speed <= 0 or acceleration <= 0:
+            raise ValueError("max_speed and acceleration must be positive")
+        if start_speed is None:
+            start_speed = math.sqrt(2.0 * acceleration)
+        self.max_speed = float(max_speed)
+        self.acceleration = float(acceleration)
+        self.start_speed = min(float(start_speed), self.max_speed)
+
+    @property
+    def key(self):
+        return (self.__class__.__name__, self.max_speed, self.acceleration,
+                self.start_speed)
+
+    def _python_delays(self, steps):
+        ramp = self._ramp_speed
+        max_speed = self.max_speed
+        delays = []
+        for n in xrange(steps):
+            # the speed is limited by the distance from either end of the move
+            speed = min(max_speed, ramp(n), ramp(steps - 1 - n))
+            delays.append(1.0 / speed)
+        return delays
+
+    def _numpy_delays(self, steps):
+        n = numpy.arange(steps, dtype='d')
+        speed = numpy.minimum(self._numpy_ramp_speed(n),
+                              self._numpy_ramp_speed(steps - 1 - n))
+        return 1.0 / numpy.minimum(speed, self.max_speed)
+
+
+class TrapezoidalProfile(_RampProfile):
+    '''
+    Constant acceleration up to max_speed, cruise, then constant deceleration.
+    '''
+    def _ramp_speed(self, distance):
+        return math.sqrt(self.start_speed ** 2 + 2.0 * self.acceleration * distance)
+
+    def _numpy_ramp_speed(self, distance):
+        return numpy.sqrt(self.start_speed ** 2 + 2.0 * self.acceleration * distance)
+
+
+class SCurveProfile(_RampProfile):
+    '''
+    Acceleration rises smoothly from zero to the given peak and falls back to
+    zero on reaching max_speed, avoiding the jerk at the corners of the
+    trapezoidal profile at the cost of a longer ramp.
+    '''
+    def __init__(self, max_speed, acceleration, start_speed=None):
+        super(SCurveProfile, self).__init__(max_speed, acceleration, start_speed)
+        # v**2 follows a smoothstep over the ramp distance, whose steepest
+        # gradient (1.5 / distance) gives the peak acceleration
+        self._speed_range = self.max_speed ** 2 - self.start_speed ** 2
+        self._ramp_distance = 0.75 * self._speed_range / self.acceleration
+
+    def _ramp_speed(self, distance):
+        if distance >= self._ramp_distance:
+            return self.max_speed
+        x = distance / self._ramp_distance
+        return math.sqrt(self.start_speed ** 2 +
+                         self._speed_range * x * x * (3.0 - 2.0 * x))
+
+    def _numpy_ramp_speed(self, distance):
+        if not self._ramp_distance:
+            return numpy.full_like(distance, self.max_speed)
+        x = numpy.minimum(distance / self._ramp_distance, 1.0)
+        return numpy.sqrt(self.start_speed ** 2 +
+                          self._speed_range * x * x * (3.0 - 2.0 * x))
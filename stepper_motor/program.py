@@ -0,0 +1,322 @@
+'''
+Runs motion programs: text files of motor commands, one per line.
+
+    # square wave
+    SPEED 60rpm
+    REPEAT 10
+        ROTATE 90
+        WAIT 0.5
+        ANGLE 0 CCW
+    END
+
+Commands are case insensitive and # starts a comment:
+
+    ROTATE degrees          turn by degrees, negative anti-clockwise
+    CYCLE loops             turn by whole or part revolutions
+    ANGLE degrees [CW|CCW]  turn to an absolute angle, by default the
+                            shortest way
+    SPEED value unit        speed of later moves, in rpm, deg/s, steps/s or
+                            s (the delay between steps)
+    WAIT seconds            hold still
+    REPEAT count ... END    repeat the commands between, may be nested
+
+The program is read and compiled on a separate thread a few moves ahead of
+the motor, so long programs start at once, and each move is timed from the
+last deadline of the one before so that there is no gap between them.
+'''
+import re
+import threading
+from Queue import Empty, Full, Queue
+
+from stepper_motor.kinematics import (
+    ANTICLOCKWISE,
+    CLOCKWISE,
+    angle_to_cycles,
+    degrees_per_second_to_delay,
+    rpm_to_delay,
+)
+from stepper_motor.profiles import ConstantProfile
+
+ROTATE = 'ROTATE'
+CYCLE = 'CYCLE'
+ANGLE = 'ANGLE'
+SPEED = 'SPEED'
+WAIT = 'WAIT'
+REPEAT = 'REPEAT'
+END = 'END'
+
+# instructions passed from the compiling thread to the motor
+_MOVE = 'move'
+_FINISHED = 'finished'
+_FAILED = 'failed'
+# seconds between checks for a stop while waiting
+_POLL = 0.1
+
+_SPEED_PATTERN = re.compile(r'^([-+0-9.eE]+)\s*(rpm|deg/s|steps/s|s)$', re.I)
+_DIRECTIONS = {'CW': CLOCKWISE, 'CCW': ANTICLOCKWISE}
+
+
+class ProgramError(ValueError):
+    pass
+
+
+def _number(text, line_number, kind=float):
+    try:
+        return kind(text)
+    except ValueError:
+        raise ProgramError("Line %d: expected a number, got '%s'"
+                           % (line_number, text))
+
+
+def parse_line(line, line_number=0):
+    '''
+    :param line: Line of a program
+    :type line: str
+    :param line_number: Number of the line, for error messages
+    :type line_number: int
+    :returns: (command, argument, line number), or None for blank and
+        comment lines. SPEED arguments are (value, unit) and ANGLE arguments
+        (degrees, direction)
+    :rtype: tuple
+    :raises ProgramError: if the line is not a valid command
+    '''
+    line = line.split('#', 1)[0].strip()
+    if not line:
+        return None
+    words = line.split(None, 1)
+    command = words[0].upper()
+    text = words[1].strip() if len(words) > 1 else ''
+
+    if command == END:
+        if text:
+            raise ProgramError("Line %d: END takes no argument" % line_number)
+        return (END, None, line_number)
+    if not text:
+        raise ProgramError("Line %d: %s requires an argument"
+                           % (line_number, command))
+    if command in (ROTATE, CYCLE, WAIT):
+        argument = _number(text, line_number)
+        if command == WAIT and argument < 0:
+            raise ProgramError("Line %d: cannot WAIT %s seconds"
+                               % (line_number, text))
+    elif command == ANGLE:
+        parts = text.split()
+        if len(parts) > 2 or (len(parts) == 2 and
+                              parts[1].upper() not in _DIRECTIONS):
+            raise ProgramError("Line %d: expected ANGLE degrees [CW|CCW]"
+                               % line_number)
+        direction = _DIRECTIONS[parts[1].upper()] if len(parts) == 2 else None
+        argument = (_number(parts[0], line_number), direction)
+    elif command == SPEED:
+        match = _SPEED_PATTERN.match(text)
+        if not match:
+            raise ProgramError("Line %d: expected SPEED value rpm, deg/s, "
+                               "steps/s or s, got '%s'" % (line_number, text))
+        value = _number(match.group(1), line_number)
+        if value <= 0:
+            raise ProgramError("Line %d: speed must be positive, got '%s'"
+                               % (line_number, text))
+        argument = (value, match.group(2).lower())
+    elif command == REPEAT:
+        argument = _number(text, line_number, int)
+        if argument < 0:
+            raise ProgramError("Line %d: cannot REPEAT %d times"
+                               % (line_number, argument))
+    else:
+        raise ProgramError("Line %d: unknown command '%s'"
+                           % (line_number, words[0]))
+    return (command, argument, line_number)
+
+
+def _block(instructions, line_number):
+    # the instructions up to the END matching a REPEAT, which has been read
+    body = []
+    depth = 0
+    for instruction in instructions:
+        if instruction[0] == REPEAT:
+            depth += 1
+        elif instruction[0] == END:
+            if not depth:
+                return body
+            depth -= 1
+        body.append(instruction)
+    raise ProgramError("Line %d: REPEAT has no END" % line_number)
+
+
+def _expand(instructions):
+    for instruction in instructions:
+        command, argument, line_number = instruction
+        if command == REPEAT:
+            body = _block(instructions, line_number)
+            for _ in xrange(argument):
+                for repeated in _expand(iter(body)):
+                    yield repeated
+        elif command == END:
+            raise ProgramError("Line %d: END without REPEAT" % line_number)
+        else:
+            yield instruction
+
+
+def parse(lines):
+    '''
+    Parses a program as it is read, expanding REPEAT blocks. Only the body of
+    a REPEAT block is held in memory.
+
+    :param lines: Lines of the program, e.g. an open file
+    :type lines: iterable of str
+    :returns: Iterator of (command, argument, line number), see parse_line
+    :raises ProgramError: once the first invalid line is reached
+    '''
+    instructions = (parse_line(line, number)
+                    for number, line in enumerate(lines, 1))
+    return _expand(instruction for instruction in instructions
+                   if instruction is not None)
+
+
+def speed_to_delay(value, unit, steps_per_rev):
+    '''
+    :param value: Speed
+    :type value: float
+    :param unit: rpm, deg/s, steps/s or s (the delay itself)
+    :type unit: str
+    :param steps_per_rev: Number of steps in one revolution
+    :type steps_per_rev: int
+    :returns: Delay between steps
+    :rtype: float
+    '''
+    if unit == 'rpm':
+        return rpm_to_delay(value, steps_per_rev)
+    if unit == 'deg/s':
+        return degrees_per_second_to_delay(value, steps_per_rev)
+    if unit == 'steps/s':
+        return 1.0 / value
+    return value
+
+
+class ProgramRunner(object):
+    def __init__(self, motor, lookahead=16, tolerance=0.002):
+        '''
+        :param motor: Motor to run programs on
+        :type motor: StepperMotor
+        :param lookahead: Number of compiled instructions to keep ready
+        :type lookahead: int
+        :param tolerance: Seconds a move may start after the last deadline of
+            the move before and still be timed from it. A later move is timed
+            from when it starts, so that it does not rush to catch up.
+        :type tolerance: float
+        '''
+        self.motor = motor
+        self.lookahead = lookahead
+        self.tolerance = tolerance
+
+    def run(self, lines, stop=None):
+        '''
+        Runs a program, returning when it has finished or been stopped.
+
+        :param lines: Lines of the program, e.g. an open file
+        :type lines: iterable of str
+        :param stop: Stops the program, see StepperMotor.execute
+        :type stop: threading.Event or StopToken
+        :returns: New state position
+        :rtype: int
+        :raises ProgramError: when an invalid line is reached, after the
+            commands before it have run
+        '''
+        motor = self.motor
+        scheduler = motor.scheduler
+        queue = Queue(self.lookahead)
+        finished = threading.Event()
+        compiler = threading.Thread(target=self._compile,
+                                    args=(lines, queue, finished),
+                                    name='motion-program')
+        compiler.daemon = True
+        compiler.start()
+
+        origin = None
+        try:
+            while stop is None or not stop.is_set():
+                try:
+                    # with a timeout so that signals are handled meanwhile
+                    kind, argument = queue.get(timeout=_POLL)
+                except Empty:
+                    continue
+                if kind == _FINISHED:
+                    break
+                if kind == _FAILED:
+                    raise argument
+                if origin is not None and \
+                   scheduler.clock() - origin > self.tolerance:
+                    origin = None
+                if kind == _MOVE:
+                    motor.execute(argument, stop, origin)
+                    if motor.position != argument.end_position:
+                        # stopped part way
+                        break
+                elif kind == WAIT:
+                    end = scheduler.start(origin) + argument
+                    while scheduler.deadline < end and \
+                            (stop is None or not stop.is_set()):
+                        scheduler.wait(min(end - scheduler.deadline, _POLL))
+                elif kind == SPEED:
+                    motor.delay = argument
+                    continue
+                origin = scheduler.deadline
+        finally:
+            finished.set()
+            # unblock the compiling thread, which then ends unless it is
+            # waiting to read the program
+            try:
+                while True:
+                    queue.get_nowait()
+            except Empty:
+                pass
+            compiler.join(_POLL * 10)
+        return motor.state
+
+    def _compile(self, lines, queue, finished):
+        motor = self.motor
+        steps_per_rev = motor.steps_per_rev
+        position = motor.position
+        profile = motor.profile or ConstantProfile(motor.delay)
+        try:
+            for command, argument, line_number in parse(lines):
+                if command == SPEED:
+                    delay = speed_to_delay(argument[0], argument[1],
+                                           steps_per_rev)
+                    profile = ConstantProfile(delay)
+                    item = (SPEED, delay)
+                elif command == WAIT:
+                    item = (WAIT, argument)
+                else:
+                    if command == ANGLE:
+                        cycles = angle_to_cycles(argument[0],
+                                                 position % steps_per_rev,
+                                                 steps_per_rev, argument[1])
+                    elif command == ROTATE:
+                        cycles = argument / 360.0
+                    else:
+                        cycles = argument
+                    steps = int(round(cycles * steps_per_rev))
+                    if not steps:
+                        continue
+                    plan = motor.plan_cache.compile(motor.phases, position,
+                                                    steps, profile)
+                    position = plan.end_position
+                    item = (_MOVE, plan)
+                if not self._put(queue, item, finished):
+                    return
+        except Exception as err:
+            self._put(queue, (_FAILED, err), finished)
+        else:
+            self._put(queue, (_FINISHED, None), finished)
+
+    @staticmethod
+    def _put(queue, item, finished):
+        # waits for room unless the program has been abandoned
+        while not finished.is_set():
+            try:
+                queue.put(item, timeout=_POLL)
+                return True
+            except Full:
+                pass
+        return False
@@ -0,0 +1,125 @@
+'''
+Deadline based pacing of motor steps.
+
+Rather than sleeping for a fixed delay after every step (which lets the cost
+of generating and writing each step accumulate), each step is given an
+absolute deadline measured from the start of the move on a monotonic clock.
+'''
+import time
+from array import array
+
+try:
+    from time import monotonic
+except ImportError:
+    try:
+        # backport for Python 2, see requirements-timing.txt
+        from monotonic import monotonic
+    except ImportError:
+        monotonic = time.time
+
+
+SLEEP = 'sleep'
+HYBRID = 'hybrid'
+SPIN = 'spin'
+
+MODES = (SLEEP, HYBRID, SPIN)
+
+
+class StepScheduler(object):
+    def __init__(self, mode=HYBRID, spin_threshold=0.0005, clock=monotonic,
+                 sleep=time.sleep):
+        '''
+        :param mode: SLEEP sleeps until each deadline, SPIN busy waits and
+            HYBRID sleeps coarsely then busy waits for the last spin_threshold
+        :type mode: str
+        :param spin_threshold: Seconds before a deadline to stop sleeping and
+            start spinning in HYBRID mode
+        :type spin_threshold: float
+        :param clock: Monotonic clock returning seconds
+        :type clock: callable
+        :param sleep: Sleep function accepting seconds
+        :type sleep: callable
+        '''
+        if mode not in MODES:
+            raise ValueError("Unknown scheduler mode '%s', expected one of %s"
+                             % (mode, ', '.join(MODES)))
+        self.mode = mode
+        self.spin_threshold = spin_threshold
+        self.clock = clock
+        self.sleep = sleep
+        self.origin = None
+        self.deadline = None
+        # seconds late for each deadline of the current move
+        self.lateness = array('d')
+
+    def start(self, origin=None):
+        '''
+        Starts timing a new move, clearing the recorded jitter.
+
+        :param origin: Clock time to measure deadlines from, defaults to now
+        :type origin: float
+        :returns: Origin of the move
+        :rtype: float
+        '''
+        if origin is None:
+            origin = self.clock()
+        self.origin = self.deadline = origin
+        self.lateness = array('d')
+        return origin
+
+    def wait(self, delay):
+        '''
+        Advances the deadline by delay and waits until it is reached.
+
+        :param delay: Seconds from the previous deadline
+        :type delay: float
+        '''
+        self.deadline += delay
+        self._wait_for(self.deadline)
+
+    def wait_until(self, offset):
+        '''
+        Waits until offset seconds after the start of the move.
+
+        :param offset: Seconds from the origin of the move
+        :type offset: float
+        '''
+        self.deadline = self.origin + offset
+        self._wait_for(self.deadline)
+
+    def _wait_for(self, deadline):
+        clock = self.clock
+        if self.mode == SLEEP:
+            remaining = deadline - clock()
+            if remaining > 0:
+                self.sleep(remaining)
+        elif self.mode == HYBRID:
+            remaining = deadline - clock() - self.spin_threshold
+            if remaining > 0:
+                self.sleep(remaining)
+            while clock() < deadline:
+                pass
+        else:
+            while clock() < deadline:
+                pass
+        self.lateness.append(clock() - deadline)
+
+    def jitter(self):
+        '''
+        Summarises how late each deadline of the last move was met.
+
+        :returns: Step count, mean, min and max lateness in seconds and the
+            total overrun of the move beyond its final deadline
+        :rtype: dict
+        '''
+        lateness = self.lateness
+        if not lateness:
+            return {'steps': 0, 'mean': 0.0, 'min': 0.0, 'max': 0.0,
+                    'overrun': 0.0}
+        return {
+            'steps': len(lateness),
+            'mean': sum(lateness) / len(lateness),
+            'min': min(lateness),
+            'max': max(lateness),
+            'overrun': lateness[-1],
+        }
@@ -0,0 +1,244 @@
+'''
+Crash safe persistence of the motor position.
+
+StateFile replaces the state file atomically, so it always holds either the
+old or the new position, and takes an exclusive lock so that two processes do
+not drive the motor from the same state. Checkpoint keeps the position in a
+small memory mapped record during long moves so that a process which dies
+mid-move can resume from where the motor actually stopped.
+'''
+import errno
+import logging
+import mmap
+import os
+import struct
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # locking is not supported on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# seconds between attempts to take a lock with a timeout
+_LOCK_POLL = 0.05
+
+
+def _file_mode(path):
+    # permissions of the file, or those a new file gets under the umask, so
+    # that replacing the file does not leave it private to this user
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError as err:
+        if err.errno != errno.ENOENT:
+            raise
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+class StateLocked(Exception):
+    pass
+
+
+class StateFile(object):
+    def __init__(self, path):
+        '''
+        :param path: Path of file storing motor position state
+        :type path: str
+        '''
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._lock_fh = None
+
+    def __enter__(self):
+        self.lock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.unlock()
+
+    def lock(self, blocking=True, timeout=None):
+        '''
+        Takes an exclusive lock on the state, held until unlock() or the
+        process exits.
+
+        :param blocking: Wait for another process to release the lock
+        :type blocking: bool
+        :param timeout: Seconds to wait when blocking, defaults to no limit
+        :type timeout: float
+        :raises StateLocked: if another process holds the lock and it is not
+            released in time
+        '''
+        if self._lock_fh is not None or fcntl is None:
+            return
+        fh = open(self.lock_path, 'a')
+        if blocking and timeout is None:
+            flags = fcntl.LOCK_EX
+        else:
+            flags = fcntl.LOCK_EX | fcntl.LOCK_NB
+        give_up = time.time() + (timeout or 0)
+        while True:
+            try:
+                fcntl.flock(fh.fileno(), flags)
+                break
+            except IOError as err:
+                if err.errno not in (errno.EAGAIN, errno.EACCES):
+                    fh.close()
+                    raise
+                if not blocking or time.time() >= give_up:
+                    fh.close()
+                    raise StateLocked("Motor state %s is locked by another process"
+                                      % self.path)
+            time.sleep(_LOCK_POLL)
+        self._lock_fh = fh
+
+    def unlock(self):
+        if self._lock_fh is not None:
+            fcntl.flock(self._lock_fh.fileno(), fcntl.LOCK_UN)
+            self._lock_fh.close()
+            self._lock_fh = None
+
+    @property
+    def locked(self):
+        return self._lock_fh is not None
+
+    def read(self):
+        '''
+        :returns: Stored position, or None if there is no state file
+        :rtype: int or None
+        '''
+        try:
+            with open(self.path, 'r') as fh:
+                return int(fh.read())
+        except IOError as err:
+            if err.errno == errno.ENOENT:
+                return None
+            raise
+
+    def write(self, position):
+        '''
+        Replaces the state file with a new position. The position is written
+        and synced to a temporary file which is renamed over the state file,
+        then the directory is synced so that the rename survives a power cut.
+        The file keeps its permissions, or those of a new file under the
+        umask.
+
+        :param position: Motor position
+        :type position: int
+        '''
+        # imported here as runs which only read the state need not load it
+        import tempfile
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.motor_state')
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                # mkstemp creates files only the owner can read
+                os.fchmod(fh.fileno(), _file_mode(self.path))
+                fh.write(str(position))
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.rename(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        # the rename is only durable once the directory is synced
+        directory_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+
+    def remove(self):
+        '''
+        Deletes the state file if it exists.
+
+        :returns: Whether there was a file to delete
+        :rtype: bool
+        '''
+        try:
+            os.remove(self.path)
+        except OSError as err:
+            if err.errno == errno.ENOENT:
+                return False
+            raise
+        return True
+
+
+class Checkpoint(object):
+    # magic, moving flag, position
+    RECORD = struct.Struct('<4sIq')
+    MAGIC = 'SMCP'
+
+    def __init__(self, path):
+        '''
+        :param path: Path of the checkpoint file, created if needed
+        :type path: str
+        '''
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0644)
+        try:
+            if os.fstat(fd).st_size < self.RECORD.size:
+                os.ftruncate(fd, self.RECORD.size)
+            self._map = mmap.mmap(fd, self.RECORD.size)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        self._map.close()
+
+    def begin(self, position):
+        '''
+        Marks the start of a move from a position.
+        '''
+        self.save(position)
+
+    def save(self, position):
+        '''
+        Records the position reached during a move. This only writes to
+        memory, which the operating system keeps if the process dies.
+        '''
+        self.RECORD.pack_into(self._map, 0, self.MAGIC, 1, position)
+
+    def end(self, position):
+        '''
+        Marks the move as finished at a position.
+        '''
+        self.RECORD.pack_into(self._map, 0, self.MAGIC, 0, position)
+
+    def recover(self):
+        '''
+        :returns: Position reached by a move which did not finish, or None if
+            the last move finished
+        :rtype: int or None
+        '''
+        magic, moving, position = self.RECORD.unpack_from(self._map, 0)
+        if magic == self.MAGIC and moving:
+            return position
+        return None
+
+
+def load_position(state_file, checkpoint=None):
+    '''
+    Reads the motor position, preferring the checkpoint of a move which was
+    interrupted over the state file saved before it. A recovered position is
+    saved to the state file.
+
+    :param state_file: State of the motor
+    :type state_file: StateFile
+    :param checkpoint: Checkpoint of the last move, if any
+    :type checkpoint: Checkpoint
+    :returns: Motor position, or None if nothing has been stored
+    :rtype: int or None
+    '''
+    if checkpoint is not None:
+        position = checkpoint.recover()
+        if position is not None:
+            logger.warning("Last move did not finish, resuming from its "
+                           "checkpoint at position %d", position)
+            state_file.write(position)
+            checkpoint.end(position)
+            return position
+    return state_file.read()
@@ -0,0 +1,76 @@
+'''
+Cooperative cancellation of moves.
+
+A StopToken is passed as the stop argument of StepperMotor.execute or spin,
+in place of a threading.Event, and may be set from another thread or a
+signal handler. With a deceleration the motor is slowed to a stop over a few
+more steps rather than stopped dead, which at speed could lose steps.
+'''
+import math
+import threading
+
+
+class StopToken(object):
+    def __init__(self, deceleration=None, event=None):
+        '''
+        :param deceleration: Deceleration in steps per second squared to
+            stop with, defaults to stopping before the next step
+        :type deceleration: float
+        :param event: Event the stop is signalled with, e.g. a
+            multiprocessing.Event to stop a move in another process,
+            defaults to a new threading.Event
+        :type event: threading.Event
+        '''
+        if deceleration is not None and deceleration <= 0:
+            raise ValueError("Deceleration must be positive, got %s" % deceleration)
+        self.deceleration = deceleration
+        # skip or cut short the deceleration
+        self.immediate = False
+        self._event = event if event is not None else threading.Event()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def set(self, immediate=False):
+        '''
+        Requests the move to stop.
+
+        :param immediate: Stop before the next step, even if decelerating
+        :type immediate: bool
+        '''
+        if immediate:
+            self.immediate = True
+        self._event.set()
+
+    def clear(self):
+        self.immediate = False
+        self._event.clear()
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
+
+    def ramp(self, delay):
+        '''
+        Computes the delays of the steps taken to stop from a speed.
+
+        The speed falls by the deceleration until it is no faster than the
+        speed reached accelerating from rest over one step, from which the
+        motor can stop dead.
+
+        :param delay: Delay of the step before stopping
+        :type delay: float
+        :returns: Delay after each further step
+        :rtype: list of floats
+        '''
+        if self.deceleration is None or self.immediate or delay <= 0:
+            return []
+        deceleration = self.deceleration
+        stop_speed_squared = 2.0 * deceleration
+        speed_squared = (1.0 / delay) ** 2
+        delays = []
+        while True:
+            speed_squared -= 2.0 * deceleration
+            if speed_squared <= stop_speed_squared:
+                break
+            delays.append(1.0 / math.sqrt(speed_squared))
+        return delays
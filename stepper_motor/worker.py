@@ -0,0 +1,323 @@
+'''
+Runs the moves of a StepperMotor on a dedicated thread so that the caller is
+not blocked while the motor turns.
+
+    worker = MotorWorker(stepper)
+    move = worker.rotate(90)
+    ...  # do other work
+    new_state = move.result()
+    worker.spin(rpm=30)
+    worker.set_rpm(60)
+    worker.stop()
+'''
+import logging
+import threading
+from Queue import Queue
+
+from stepper_motor.stop import StopToken
+
+logger = logging.getLogger(__name__)
+
+
+class MoveCancelled(Exception):
+    pass
+
+
+class MoveTimeout(Exception):
+    pass
+
+
+PENDING = 'pending'
+RUNNING = 'running'
+FINISHED = 'finished'
+CANCELLED = 'cancelled'
+
+
+class MoveFuture(object):
+    '''
+    Result of a move queued on a MotorWorker.
+    '''
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._status = PENDING
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self._status)
+
+    def cancel(self):
+        '''
+        Cancels the move if it has not started.
+
+        :returns: Whether the move is cancelled
+        :rtype: bool
+        '''
+        with self._condition:
+            if self._status in (RUNNING, FINISHED):
+                return False
+            if self._status == PENDING:
+                self._status = CANCELLED
+                self._condition.notify_all()
+            else:
+                return True
+        self._run_callbacks()
+        return True
+
+    def cancelled(self):
+        return self._status == CANCELLED
+
+    def running(self):
+        return self._status == RUNNING
+
+    def done(self):
+        return self._status in (FINISHED, CANCELLED)
+
+    def result(self, timeout=None):
+        '''
+        Waits for the move to finish.
+
+        :param timeout: Seconds to wait, defaults to forever
+        :type timeout: float
+        :returns: New state position
+        :rtype: int
+        :raises MoveCancelled: if the move was cancelled before it started
+        :raises MoveTimeout: if the move did not finish in time
+        '''
+        with self._condition:
+            if timeout is None:
+                while not self.done():
+                    self._condition.wait()
+            elif not self.done():
+                self._condition.wait(timeout)
+            if self._status == CANCELLED:
+                raise MoveCancelled()
+            if self._status != FINISHED:
+                raise MoveTimeout()
+            if self._exception is not None:
+                raise self._exception
+            return self._result
+
+    def exception(self, timeout=None):
+        '''
+        Waits for the move to finish.
+
+        :param timeout: Seconds to wait, defaults to forever
+        :type timeout: float
+        :returns: Exception raised by the move, if any
+        :rtype: Exception or None
+        '''
+        try:
+            self.result(timeout)
+        except (MoveCancelled, MoveTimeout):
+            raise
+        except Exception as err:
+            return err
+        return None
+
+    def add_done_callback(self, callback):
+        '''
+        Calls callback with the future once it is done, immediately if it
+        already is. Callbacks are run on the worker thread.
+
+        :param callback: Function accepting the future
+        :type callback: callable
+        '''
+        with self._condition:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def set_running(self):
+        '''
+        :returns: False if the move was cancelled and should not be run
+        :rtype: bool
+        '''
+        with self._condition:
+            if self._status == CANCELLED:
+                return False
+            self._status = RUNNING
+            return True
+
+    def set_result(self, result):
+        with self._condition:
+            self._result = result
+            self._status = FINISHED
+            self._condition.notify_all()
+        self._run_callbacks()
+
+    def set_exception(self, exception):
+        with self._condition:
+            self._exception = exception
+            self._status = FINISHED
+            self._condition.notify_all()
+        self._run_callbacks()
+
+    def _run_callbacks(self):
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                logger.exception("Error in move callback %r", callback)
+
+
+class MotorWorker(object):
+    def __init__(self, motor, name='stepper-motor', deceleration=None):
+        '''
+        Starts a daemon thread which runs queued moves of the motor in turn.
+
+        :param motor: Motor to move, which should not be moved from any other
+            thread while the worker is running
+        :type motor: StepperMotor
+        :param name: Name of the thread
+        :type name: str
+        :param deceleration: Deceleration in steps per second squared to stop
+            the current move with, defaults to stopping before the next step
+        :type deceleration: float
+        '''
+        self.motor = motor
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._stop = StopToken(deceleration)
+        # moves queued before the last stop() have an older generation
+        self._generation = 0
+        self._thread = threading.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def _run(self):
+        while True:
+            command = self._queue.get()
+            if command is None:
+                break
+            generation, future, function, args = command
+            with self._lock:
+                if generation != self._generation:
+                    future.cancel()
+                if not future.set_running():
+                    continue
+                self._stop.clear()
+            try:
+                result = function(*args)
+            except Exception as err:
+                logger.exception("Motor move failed")
+                future.set_exception(err)
+            else:
+                future.set_result(result)
+
+    def submit(self, function, *args):
+        '''
+        Queues a call to run on the worker thread after the moves before it.
+
+        :param function: Called with args and the worker's StopToken
+        :type function: callable
+        :returns: Future of the result of the call
+        :rtype: MoveFuture
+        '''
+        future = MoveFuture()
+        with self._lock:
+            self._queue.put((self._generation, future, function,
+                             args + (self._stop,)))
+        return future
+
+    def execute(self, plan):
+        '''
+        :param plan: Plan compiled from the position the motor will be at
+            when the move starts
+        :type plan: MovePlan
+        :rtype: MoveFuture
+        '''
+        return self.submit(self.motor.execute, plan)
+
+    def _move(self, planner, argument, stop):
+        return self.motor.execute(planner(argument), stop)
+
+    def turn_motor(self, cycles):
+        '''
+        :param cycles: Loops to turn
+        :type cycles: float
+        :rtype: MoveFuture
+        '''
+        return self.submit(self._move, self.motor.plan_motor, cycles)
+
+    def rotate(self, degrees):
+        '''
+        :param degrees: Degrees to turn motor by
+        :type degrees: float
+        :rtype: MoveFuture
+        '''
+        return self.submit(self._move, self.motor.plan_rotate, degrees)
+
+    def turn_to_angle(self, angle):
+        '''
+        :param angle: Angle to turn to
+        :type angle: float
+        :rtype: MoveFuture
+        '''
+        return self.submit(self._move, self.motor.plan_to_angle, angle)
+
+    def spin(self, rpm=None, direction=1):
+        '''
+        Turns the motor continuously until stop() is called.
+
+        :param rpm: Speed in revolutions per minute, defaults to the current
+            delay of the motor
+        :type rpm: float
+        :param direction: 1 for clockwise, -1 for anti-clockwise
+        :type direction: int
+        :returns: Future of the state the motor stops at
+        :rtype: MoveFuture
+        '''
+        if rpm is not None:
+            self.set_rpm(rpm)
+        return self.submit(self.motor.spin, direction)
+
+    def set_delay(self, delay):
+        '''
+        Changes the speed of the motor, taking effect from the next step of a
+        spin or the next constant speed move.
+
+        :param delay: Delay between steps
+        :type delay: float
+        '''
+        self.motor.delay = delay
+
+    def set_rpm(self, rpm):
+        '''
+        :param rpm: Speed in revolutions per minute
+        :type rpm: float
+        '''
+        self.motor.rpm = rpm
+
+    def stop(self, immediate=False):
+        '''
+        Stops the current move, decelerating if the worker has a
+        deceleration, and cancels all queued moves. Moves queued afterwards
+        run as normal.
+
+        :param immediate: Stop before the next step even if decelerating
+        :type immediate: bool
+        '''
+        with self._lock:
+            self._generation += 1
+            self._stop.set(immediate)
+
+    def shutdown(self, wait=True):
+        '''
+        Stops the worker thread once the queued moves are finished.
+
+        :param wait: Wait for the thread to finish
+        :type wait: bool
+        '''
+        self._queue.put(None)
+        if wait:
+            self._thread.join()
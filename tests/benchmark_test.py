@@ -0,0 +1,82 @@
+import mock
+import os
+import unittest
+
+from stepper_motor.benchmark import (
+    DRY_RUN,
+    SIMULATED,
+    compare,
+    max_step_rate,
+    percentile,
+    run_suite,
+    time_move,
+    time_startup,
+)
+from stepper_motor.ports import VirtualClock
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_percentile(self):
+        values = range(101)
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 1.0), 100)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_max_step_rate_closes_trace_stream(self):
+        stream = open(os.devnull, 'w')
+        self.addCleanup(stream.close)
+        with mock.patch('stepper_motor.benchmark.open', create=True,
+                        return_value=stream):
+            self.assertTrue(max_step_rate(48, trace=True) > 0)
+        self.assertTrue(stream.closed)
+
+    def test_time_move_virtual_clock(self):
+        # steps are written exactly on time when writing takes no time
+        result = time_move(500, 0.01, DRY_RUN, VirtualClock().scheduler())
+        self.assertEqual(result['steps'], 500)
+        self.assertAlmostEqual(result['duration'], 5.0)
+        self.assertAlmostEqual(result['elapsed'], 5.0)
+        self.assertAlmostEqual(result['steps_per_sec'], 100.0)
+        self.assertAlmostEqual(result['p99'], 0.0)
+        self.assertAlmostEqual(result['max'], 0.0)
+        self.assertAlmostEqual(result['overrun'], 0.0)
+        self.assertNotIn('faults', result)
+
+    def test_time_move_simulated(self):
+        result = time_move(-300, 0.01, SIMULATED, VirtualClock().scheduler())
+        self.assertEqual(result['steps'], 300)
+        self.assertEqual(result['faults'], 0)
+
+    def test_time_move_unknown_backend(self):
+        self.assertRaises(ValueError, time_move, 10, 0, 'serial')
+
+    def test_run_suite(self):
+        results = run_suite(delays=(0.0, 0.0001), lengths=(10, 50))
+        self.assertEqual(len(results), 8)
+        self.assertEqual(set(r['backend'] for r in results),
+                         set([DRY_RUN, SIMULATED]))
+        for result in results:
+            self.assertTrue(result['p50'] <= result['p99'] <= result['max'])
+
+    def test_time_startup(self):
+        results = time_startup(commands=(('--status',),), runs=2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['command'], '-c pass')
+        self.assertTrue(results[1]['command'].endswith('--status'))
+        for result in results:
+            self.assertEqual(result['runs'], 2)
+            self.assertTrue(0 < result['min'] <= result['median'] <= result['max'])
+
+    def test_compare(self):
+        baseline = [{'backend': DRY_RUN, 'delay': 0.0, 'steps': 100,
+                     'steps_per_sec': 100000.0, 'p99': 1e-5, 'max': 2e-5}]
+        same = [dict(baseline[0])]
+        self.assertEqual(compare(same, baseline), [])
+
+        slower = [dict(baseline[0], steps_per_sec=50000.0, max=1e-3)]
+        regressions = compare(slower, baseline)
+        self.assertEqual([field for _, field, _ in regressions],
+                         ['steps_per_sec', 'max'])
+        self.assertEqual(regressions[0][2], 100000.0)
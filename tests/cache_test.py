@@ -0,0 +1,31 @@
+import unittest
+
+from stepper_motor.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, LRUCache, 0)
+
+    def test_discards_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # using 'a' makes 'b' the oldest
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_stats(self):
+        cache = LRUCache(4)
+        cache.put('a', 1)
+        cache.get('a')
+        self.assertEqual(cache.get('z', 'missing'), 'missing')
+        self.assertEqual(cache.stats(),
+                         {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 4})
+        cache.clear()
+        self.assertEqual(cache.stats(),
+                         {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 4})
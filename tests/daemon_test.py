@@ -0,0 +1,97 @@
+import mock
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from stepper_motor.client import DaemonError, MotorClient, send_command
+from stepper_motor.daemon import MotorServer
+from stepper_motor.motor_position import StepperMotor
+from stepper_motor.state import StateFile
+
+PHASES = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+
+
+class TestMotorServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tempdir, 'motor.sock')
+        self.state_file = os.path.join(self.tempdir, 'motor_state.ini')
+        self.stepper = StepperMotor(PHASES, delay=0, steps_per_rev=24)
+        # setData is created up front, as mock creates child mocks on first
+        # use and the server and test threads could each create one
+        self.stepper.parallel_interface = mock.Mock(setData=mock.Mock())
+        self.server = MotorServer(self.socket_path, self.stepper,
+                                  StateFile(self.state_file))
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       args=(0.01,))
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.tempdir)
+
+    def test_commands(self):
+        with MotorClient(self.socket_path, timeout=5) as client:
+            response = client.send('rotate', 90)
+            self.assertEqual(response['state'], 6)
+            self.assertEqual(response['angle'], 90)
+            self.assertEqual(client.send('cycle', -1)['position'], -18)
+            self.assertEqual(client.send('angle', 0)['state'], 0)
+            self.assertEqual(client.send('delay', 0.001)['delay'], 0.001)
+        with open(self.state_file) as fh:
+            self.assertEqual(fh.read(), '-24')
+        self.assertEqual(self.stepper.parallel_interface.setData.call_count, 36)
+
+    def test_reset(self):
+        self.stepper.position = 30
+        response = send_command('reset', socket_path=self.socket_path)
+        self.assertEqual(response['position'], 0)
+        self.assertEqual(send_command('state', socket_path=self.socket_path),
+                         response)
+        with open(self.state_file) as fh:
+            self.assertEqual(fh.read(), '0')
+
+    @mock.patch('stepper_motor.daemon.logger')
+    def test_errors(self, logger):
+        with MotorClient(self.socket_path, timeout=5) as client:
+            self.assertRaises(DaemonError, client.send, 'jump')
+            self.assertRaises(DaemonError, client.send, 'rotate', 'left')
+            # the connection is still usable
+            self.assertEqual(client.send('rotate', 15)['state'], 1)
+
+    def test_stop(self):
+        self.stepper.delay = 0.01
+        move = threading.Thread(target=send_command, args=('cycle', 10),
+                                kwargs={'socket_path': self.socket_path})
+        move.start()
+        setData = self.stepper.parallel_interface.setData
+        deadline = time.time() + 5
+        while setData.call_count < 5:
+            if time.time() > deadline:
+                self.fail('Move did not start')
+            time.sleep(0.01)
+        # answered while the move is still running
+        self.assertTrue(send_command('state', socket_path=self.socket_path)
+                        ['position'] < 240)
+        send_command('stop', socket_path=self.socket_path)
+        move.join(5)
+        self.assertFalse(move.is_alive())
+        self.assertTrue(5 <= self.stepper.position < 240)
+        with open(self.state_file) as fh:
+            self.assertEqual(fh.read(), str(self.stepper.position))
+        # later moves run to the end
+        position = self.stepper.position
+        self.stepper.delay = 0
+        self.assertEqual(send_command('cycle', 1, socket_path=self.socket_path)
+                         ['position'], position + 24)
+
+    def test_stale_socket_replaced(self):
+        server = MotorServer(self.socket_path + '2', self.stepper)
+        server.server_close()
+        self.assertFalse(os.path.exists(self.socket_path + '2'))
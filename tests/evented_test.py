@@ -0,0 +1,100 @@
+import heapq
+import mock
+import threading
+import unittest
+
+from stepper_motor.evented import EventLoopStepper
+from stepper_motor.motor_position import StepperMotor
+from stepper_motor.worker import MoveCancelled
+
+PHASES = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+
+
+class FakeLoop(object):
+    "Runs timers in order against a virtual clock."
+    def __init__(self):
+        self.now = 0.0
+        self.timers = []
+        self.delays = []
+
+    def time(self):
+        return self.now
+
+    def call_later(self, delay, callback):
+        self.delays.append(delay)
+        heapq.heappush(self.timers, (self.now + delay, len(self.delays), callback))
+
+    def run(self):
+        while self.timers:
+            self.now, _, callback = heapq.heappop(self.timers)
+            callback()
+
+
+class TestEventLoopStepper(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = FakeLoop()
+        self.motor = StepperMotor(PHASES, delay=0.01, steps_per_rev=24)
+        self.motor.parallel_interface = mock.Mock()
+        self.stepper = EventLoopStepper(self.motor, self.loop.call_later,
+                                        clock=self.loop.time)
+
+    def test_moves_without_blocking(self):
+        first = self.stepper.rotate(45)
+        second = self.stepper.turn_to_angle(0)
+        # the first step is written straight away, the rest from timers
+        self.assertEqual(self.motor.parallel_interface.setData.call_count, 1)
+        self.assertTrue(self.stepper.moving)
+        self.assertFalse(first.done())
+        self.loop.run()
+        self.assertEqual(first.result(), 3)
+        self.assertEqual(second.result(), 0)
+        self.assertFalse(self.stepper.moving)
+        self.assertEqual(self.motor.parallel_interface.setData.call_count, 6)
+        self.assertAlmostEqual(self.loop.now, 0.06)
+
+    def test_late_timers_do_not_accumulate(self):
+        self.loop.call_later = mock.Mock(side_effect=self.loop.call_later)
+        self.stepper.call_later = self.loop.call_later
+        self.stepper.turn_motor(0.25)
+        # a timer which fires late shortens the delay of the next
+        self.loop.now += 0.004
+        delay, callback = self.loop.call_later.call_args[0]
+        self.loop.timers = []
+        callback()
+        self.assertAlmostEqual(self.loop.call_later.call_args[0][0], 0.016)
+
+    def test_stop(self):
+        first = self.stepper.turn_motor(1)
+        second = self.stepper.turn_motor(1)
+        for _ in range(3):
+            self.loop.now, _, callback = heapq.heappop(self.loop.timers)
+            callback()
+        self.stepper.stop()
+        self.loop.run()
+        self.assertEqual(first.result(), 4)
+        self.assertRaises(MoveCancelled, second.result)
+
+    def test_failed_write(self):
+        self.motor.parallel_interface.setData.side_effect = IOError('port')
+        self.assertRaises(IOError, self.stepper.rotate(45).result)
+        self.assertFalse(self.stepper.moving)
+
+    def test_precise_requires_threadsafe_callback(self):
+        self.assertRaises(ValueError, EventLoopStepper, self.motor,
+                          self.loop.call_later, precise=True)
+
+    def test_precise(self):
+        self.motor.delay = 0
+        done = threading.Event()
+        def call_soon_threadsafe(callback, *args):
+            callback(*args)
+            done.set()
+        stepper = EventLoopStepper(self.motor, self.loop.call_later,
+                                   call_soon_threadsafe, precise=True)
+        try:
+            move = stepper.rotate(90)
+            self.assertTrue(done.wait(1))
+            self.assertEqual(move.result(0), 6)
+        finally:
+            stepper.close()
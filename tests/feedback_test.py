@@ -0,0 +1,172 @@
+import mock
+import unittest
+
+from stepper_motor.feedback import (
+    ClosedLoop,
+    IndexSensor,
+    QuadratureEncoder,
+    StallError,
+)
+from stepper_motor.instruments import StepInstruments
+from stepper_motor.motor_position import StepperMotor
+from stepper_motor.ports import SimulatedPort, VirtualClock
+
+PHASES = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+
+
+class TestQuadratureEncoder(unittest.TestCase):
+
+    def test_counts_simulated_rotor(self):
+        port = SimulatedPort(PHASES, position=5)
+        encoder = QuadratureEncoder(port, position=5)
+        for value in PHASES[6:] + PHASES[:2]:
+            port.setData(value)
+            self.assertEqual(encoder.read(), port.position)
+        for value in reversed(PHASES[:3]):
+            port.setData(value)
+            encoder.poll()
+        self.assertEqual(encoder.position, 8)
+        self.assertEqual(encoder.errors, 0)
+
+    def test_counts_per_step(self):
+        lines = mock.Mock(getInAcknowledge=mock.Mock(return_value=0),
+                          getInBusy=mock.Mock(return_value=0))
+        encoder = QuadratureEncoder(lines, counts_per_step=2, position=10)
+        for a, b in ((1, 0), (1, 1), (0, 1)):
+            lines.getInAcknowledge.return_value = a
+            lines.getInBusy.return_value = b
+            encoder.poll()
+        self.assertEqual(encoder.count, 3)
+        self.assertEqual(encoder.position, 12)
+        # both lines changed, so a count was lost
+        lines.getInAcknowledge.return_value = 1
+        lines.getInBusy.return_value = 0
+        encoder.poll()
+        self.assertEqual(encoder.errors, 1)
+
+
+class TestIndexSensor(unittest.TestCase):
+
+    def test_read(self):
+        port = SimulatedPort(PHASES, position=2, steps_per_rev=24,
+                             index_position=2)
+        sensor = IndexSensor(port, 24, index_position=2)
+        self.assertTrue(sensor.active())
+        self.assertEqual(sensor.read(49), 50)
+        self.assertEqual(sensor.read(2), 2)
+        port.setData(PHASES[3])
+        self.assertFalse(sensor.active())
+        self.assertEqual(sensor.read(3), None)
+
+
+class TestClosedLoop(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        # the rotor cannot follow steps less than 5ms apart
+        self.port = SimulatedPort(PHASES, self.clock, min_interval=0.005,
+                                  steps_per_rev=24)
+        self.stepper = StepperMotor(PHASES, delay=0.01, steps_per_rev=24,
+                                    scheduler=self.clock.scheduler(),
+                                    port=self.port)
+
+    def test_follows(self):
+        loop = ClosedLoop(self.stepper, self.port)
+        self.assertEqual(loop.rotate(90), 6)
+        self.assertEqual(loop.measured, 6)
+        self.assertEqual(loop.stalls, 0)
+        self.assertEqual(loop.speed, 1.0)
+
+    def test_retries_slower(self):
+        loop = ClosedLoop(self.stepper, QuadratureEncoder(self.port))
+        self.stepper.delay = 0.002
+        with mock.patch('stepper_motor.feedback.logger'):
+            loop.turn_motor(1)
+        self.assertEqual(self.stepper.position, 24)
+        self.assertEqual(self.port.position, 24)
+        self.assertEqual(loop.stalls, 2)
+        self.assertEqual(loop.speed, 0.25)
+        # later moves stay slow enough
+        loop.rotate(90)
+        self.assertEqual(loop.stalls, 2)
+        self.assertEqual(self.port.position, 30)
+        loop.reset_speed()
+        self.assertEqual(loop.speed, 1.0)
+
+    def test_out_of_retries(self):
+        loop = ClosedLoop(self.stepper, self.port, retries=0)
+        self.stepper.delay = 0.002
+        try:
+            loop.turn_motor(1)
+        except StallError as err:
+            self.assertEqual((err.commanded, err.measured), (4, 1))
+        else:
+            self.fail('StallError not raised')
+        # the motor takes the measured position
+        self.assertEqual(self.stepper.position, 1)
+
+    def test_index(self):
+        loop = ClosedLoop(self.stepper, IndexSensor(self.port, 24), retries=0)
+        # passes the index every revolution
+        self.assertEqual(loop.turn_motor(2), 0)
+        self.assertEqual(loop.measured, 48)
+        self.stepper.delay = 0.002
+        try:
+            loop.turn_motor(2)
+        except StallError as err:
+            # slipped back to the index a third of a revolution on
+            self.assertEqual((err.commanded, err.measured), (56, 48))
+        else:
+            self.fail('StallError not raised')
+
+    def test_missed_index(self):
+        lines = mock.Mock(getInPaperOut=mock.Mock(return_value=False))
+        loop = ClosedLoop(self.stepper, IndexSensor(lines, 24))
+        try:
+            loop.turn_motor(2)
+        except StallError as err:
+            self.assertEqual((err.commanded, err.measured), (27, None))
+        else:
+            self.fail('StallError not raised')
+        self.assertEqual(self.stepper.position, 27)
+
+    def test_keeps_post_step(self):
+        post_step = mock.Mock()
+        self.stepper.instruments = StepInstruments(post_step=post_step)
+        ClosedLoop(self.stepper, self.port).rotate(30)
+        post_step.assert_called_with(2, PHASES[2])
+        self.assertEqual(self.stepper.instruments.steps, 2)
+
+    def test_plain_moves_unchecked(self):
+        loop = ClosedLoop(self.stepper, self.port)
+        loop.rotate(30)
+        self.assertEqual(self.stepper.instruments, None)
+        # too fast for the rotor, but not checked
+        self.stepper.delay = 0.002
+        self.stepper.turn_motor(1)
+        self.assertEqual(self.stepper.position, 26)
+        self.assertEqual(loop.stalls, 0)
+
+    def test_restores_post_step(self):
+        post_step = mock.Mock()
+        instruments = StepInstruments(post_step=post_step)
+        self.stepper.instruments = instruments
+        self.stepper.delay = 0.002
+        self.assertRaises(StallError,
+                          ClosedLoop(self.stepper, self.port, retries=0).rotate, 90)
+        self.assertTrue(self.stepper.instruments is instruments)
+        self.assertTrue(instruments.post_step is post_step)
+
+    def test_path_rejected(self):
+        loop = ClosedLoop(self.stepper, self.port)
+        plan = self.stepper.plan_path([90, 0])
+        self.assertRaises(ValueError, loop.execute, plan)
+        self.assertEqual(self.port.values.tolist(), [])
+
+    def test_invalid_backoff(self):
+        self.assertRaises(ValueError, ClosedLoop, self.stepper, self.port,
+                          backoff=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
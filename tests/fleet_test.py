@@ -0,0 +1,121 @@
+import functools
+import mock
+import os
+import time
+import unittest
+
+from stepper_motor import fleet
+from stepper_motor.fleet import Fleet, Rig, pin_to_cpu
+from stepper_motor.motor_position import StepperMotor
+from stepper_motor.ports import SimulatedPort, VirtualClock
+from stepper_motor.worker import MoveCancelled
+
+PHASES = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+
+
+def simulated_motor(position=0):
+    # created in the worker process
+    clock = VirtualClock()
+    return StepperMotor(PHASES, position, delay=0.01, steps_per_rev=24,
+                        scheduler=clock.scheduler(),
+                        port=SimulatedPort(PHASES, clock, position=position))
+
+
+class TestFleet(unittest.TestCase):
+
+    def setUp(self):
+        self.fleet = Fleet([Rig('left', simulated_motor),
+                            Rig('right', functools.partial(simulated_motor, 6))])
+
+    def tearDown(self):
+        self.fleet.shutdown()
+
+    def test_moves(self):
+        left = self.fleet.rotate('left', 90)
+        right = self.fleet.turn_motor('right', -1)
+        self.assertEqual(left.result(5), 6)
+        self.assertEqual(right.result(5), 6)
+        self.assertEqual(self.fleet.turn_to_angle('left', 0).result(5), 0)
+        stats = self.fleet.stats(5)
+        self.assertEqual(sorted(stats), ['left', 'right'])
+        self.assertEqual(stats['left']['moves'], 2)
+        self.assertEqual(stats['left']['steps'], 12)
+        self.assertEqual(stats['right']['steps'], 24)
+        self.assertEqual(stats['right']['position'], -18)
+        self.assertAlmostEqual(stats['right']['rpm'], 250)
+        self.assertEqual(stats['right']['jitter']['steps'], 24)
+        self.assertEqual(stats['left']['plan_cache']['misses'], 2)
+        # each rig has a process of its own
+        self.assertNotEqual(stats['left']['pid'], stats['right']['pid'])
+        self.assertNotEqual(stats['left']['pid'], os.getpid())
+
+    def test_path_steps(self):
+        # out and back, ending where it started
+        self.assertEqual(self.fleet.follow_path('left', [90, 0]).result(5), 0)
+        self.assertEqual(self.fleet.stats(5)['left']['steps'], 12)
+
+    def test_set_rpm(self):
+        self.fleet.set_rpm('left', 60)
+        self.assertAlmostEqual(self.fleet.stats(5)['left']['rpm'], 60)
+        self.assertRaises(ValueError, self.fleet.set_rpm, 'left', 0)
+
+    def test_failure(self):
+        move = self.fleet.turn_to_angle('left', 90, 2)
+        self.assertRaises(ValueError, move.result, 5)
+        self.assertEqual(self.fleet.stats(5)['left']['failures'], 1)
+        # the rig carries on
+        self.assertEqual(self.fleet.rotate('left', 15).result(5), 1)
+
+    def test_stop(self):
+        spinning = self.fleet.spin('right')
+        queued = self.fleet.rotate('right', 90)
+        for _ in range(500):
+            if spinning.running():
+                break
+            time.sleep(0.01)
+        self.fleet.stop('right')
+        spinning.result(5)
+        self.assertRaises(MoveCancelled, queued.result, 5)
+        stats = self.fleet.stats(5)['right']
+        self.assertEqual(stats['cancelled'], 1)
+        self.assertTrue(stats['position'] > 6)
+        # commands after the stop run
+        self.assertEqual(self.fleet.rotate('right', 15).result(5),
+                         (stats['position'] + 1) % 24)
+
+    def test_unknown_rig(self):
+        self.assertRaises(KeyError, self.fleet.rotate, 'middle', 90)
+
+    def test_distinct_names(self):
+        self.assertRaises(ValueError, Fleet, [Rig('left', simulated_motor),
+                                              Rig('left', simulated_motor)])
+
+
+class TestPinToCpu(unittest.TestCase):
+
+    def test_sched_setaffinity(self):
+        setaffinity = mock.Mock()
+        with mock.patch.object(fleet.os, 'sched_setaffinity', setaffinity,
+                               create=True):
+            self.assertTrue(pin_to_cpu(1))
+        setaffinity.assert_called_once_with(0, [1])
+
+    def test_psutil(self):
+        psutil = mock.Mock()
+        with mock.patch.object(fleet.os, 'sched_setaffinity', None,
+                               create=True), \
+                mock.patch.object(fleet, 'psutil', psutil):
+            self.assertTrue(pin_to_cpu(2))
+        psutil.Process.return_value.cpu_affinity.assert_called_once_with([2])
+
+    def test_unsupported(self):
+        with mock.patch.object(fleet.os, 'sched_setaffinity', None,
+                               create=True), \
+                mock.patch.object(fleet, 'psutil', None), \
+                mock.patch.object(fleet, 'logger') as logger:
+            self.assertFalse(pin_to_cpu(0))
+        self.assertTrue(logger.warning.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
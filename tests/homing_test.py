@@ -0,0 +1,94 @@
+import mock
+import unittest
+
+from stepper_motor.feedback import IndexSensor, LimitSwitch
+from stepper_motor.homing import HomingError, home
+from stepper_motor.kinematics import ANTICLOCKWISE
+from stepper_motor.motor_position import StepperMotor
+from stepper_motor.phases import FULL, phase_table
+from stepper_motor.ports import SimulatedPort, VirtualClock
+from stepper_motor.stop import StopToken
+
+PHASES = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+
+
+class TestHome(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        # the rotor is 16 steps from where the motor was left
+        self.port = SimulatedPort(PHASES, self.clock, position=16,
+                                  steps_per_rev=24, index_position=5)
+        self.stepper = StepperMotor(PHASES, delay=0.01, steps_per_rev=24,
+                                    scheduler=self.clock.scheduler(),
+                                    port=self.port)
+
+    def test_index(self):
+        sensor = IndexSensor(self.port, 24, index_position=5)
+        self.assertEqual(home(self.stepper, sensor), 5)
+        self.assertEqual(self.stepper.position, 5)
+        self.assertEqual(self.port.position, 29)
+        self.assertEqual(self.port.faults, [])
+        # back off past the sensor then approach it slowly
+        self.assertEqual(list(self.port.values[-5:]), PHASES[1:6])
+        self.assertAlmostEqual(self.port.times[-1] - self.port.times[-2], 0.04)
+
+    def test_limit_switch(self):
+        lines = mock.Mock()
+        lines.getInSelected.side_effect = lambda: self.port.position <= 10
+        state_file = mock.Mock()
+        self.assertEqual(home(self.stepper, LimitSwitch(lines),
+                              ANTICLOCKWISE, backoff=2, home_position=3,
+                              state_file=state_file), 3)
+        self.assertEqual(self.port.position, 10)
+        state_file.write.assert_called_once_with(3)
+
+    def test_starts_on_sensor(self):
+        self.port.position = 29
+        self.stepper.position = 13
+        sensor = IndexSensor(self.port, 24, index_position=5)
+        self.assertEqual(home(self.stepper, sensor, slow_delay=0.02), 5)
+        self.assertEqual(self.port.position, 29)
+        self.assertAlmostEqual(self.port.times[-1] - self.port.times[-2], 0.02)
+
+    def test_saves_half_steps(self):
+        port = SimulatedPort(phase_table(FULL), self.clock, steps_per_rev=12,
+                             index_position=3)
+        stepper = StepperMotor(None, mode=FULL, steps_per_rev=12,
+                               scheduler=self.clock.scheduler(), port=port)
+        state_file = mock.Mock()
+        home(stepper, IndexSensor(port, 12, index_position=3),
+             state_file=state_file)
+        state_file.write.assert_called_once_with(6)
+
+    def test_not_found(self):
+        lines = mock.Mock(getInSelected=mock.Mock(return_value=False))
+        self.assertRaises(HomingError, home, self.stepper, LimitSwitch(lines),
+                          max_steps=30)
+        self.assertEqual(self.stepper.position, 30)
+
+    def test_stopped(self):
+        stop = StopToken()
+        stop.set()
+        sensor = IndexSensor(self.port, 24, index_position=5)
+        self.assertEqual(home(self.stepper, sensor, stop=stop), None)
+        self.assertEqual(self.stepper.position, 0)
+
+
+    def test_stop_decelerates(self):
+        stop = StopToken(deceleration=2000)
+        write = self.port.setData
+        def stop_after_three(value):
+            write(value)
+            if len(self.port.values) == 3:
+                stop.set()
+        self.port.setData = stop_after_three
+        sensor = IndexSensor(self.port, 24, index_position=5)
+        self.assertEqual(home(self.stepper, sensor, stop=stop), None)
+        # slowed to a stop rather than stopping after the third step
+        self.assertEqual(self.stepper.position, 4)
+        self.assertEqual(self.port.faults, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
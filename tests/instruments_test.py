@@ -0,0 +1,106 @@
+import unittest
+
+from stepper_motor.instruments import BUCKETS, StepInstruments
+
+
+class FakeClock(object):
+    "Clock advancing by a fixed tick each time it is read."
+    def __init__(self, tick):
+        self.now = 0.0
+        self.tick = tick
+
+    def time(self):
+        self.now += self.tick
+        return self.now
+
+
+class TestStepInstruments(unittest.TestCase):
+
+    def test_invalid_window(self):
+        self.assertRaises(ValueError, StepInstruments, window=0)
+
+    def test_step(self):
+        written = []
+        calls = []
+        instruments = StepInstruments(
+            pre_step=lambda position, value: calls.append(('pre', written[:])),
+            post_step=lambda position, value: calls.append(('post', written[:])),
+            clock=FakeClock(0.001).time)
+        instruments.begin()
+        instruments.step(written.append, 1, 0x07)
+        self.assertEqual(written, [0x07])
+        self.assertEqual(calls, [('pre', [])])
+        instruments.stepped(1, 0x07)
+        self.assertEqual(calls, [('pre', []), ('post', [0x07])])
+        self.assertEqual(instruments.steps, 1)
+        self.assertAlmostEqual(instruments.write_time, 0.001)
+
+    def test_missed(self):
+        instruments = StepInstruments(tolerance=0.001)
+        instruments.waited(0.0005)
+        instruments.waited(0.002)
+        self.assertEqual(instruments.missed, 1)
+
+    def test_histogram(self):
+        # each step is read twice, so the interval is two ticks
+        instruments = StepInstruments(clock=FakeClock(0.0015).time)
+        instruments.begin()
+        for position in range(5):
+            instruments.step(lambda value: None, position, 0)
+        snapshot = instruments.snapshot()
+        intervals = snapshot['intervals']
+        self.assertEqual(intervals['count'], 4)
+        self.assertAlmostEqual(intervals['mean'], 0.003)
+        histogram = dict(intervals['histogram'])
+        self.assertEqual(histogram[0.005], 4)
+        self.assertEqual(sum(histogram.values()), 4)
+        self.assertEqual(len(intervals['histogram']), len(BUCKETS) + 1)
+
+    def test_histogram_rolls(self):
+        instruments = StepInstruments(window=3, clock=FakeClock(0.06).time)
+        instruments.begin()
+        for position in range(10):
+            instruments.step(lambda value: None, position, 0)
+        intervals = instruments.snapshot()['intervals']
+        self.assertEqual(intervals['count'], 3)
+        self.assertEqual(sum(count for _, count in intervals['histogram']), 3)
+        self.assertEqual(dict(intervals['histogram'])[0.2], 3)
+
+    def test_begin_ignores_gap_between_moves(self):
+        clock = FakeClock(0.001)
+        instruments = StepInstruments(clock=clock.time)
+        instruments.begin()
+        instruments.step(lambda value: None, 1, 0)
+        clock.now += 10
+        instruments.begin()
+        instruments.step(lambda value: None, 2, 0)
+        self.assertEqual(instruments.snapshot()['intervals']['count'], 0)
+
+    def test_reset(self):
+        instruments = StepInstruments()
+        instruments.begin()
+        instruments.step(lambda value: None, 1, 0)
+        instruments.step(lambda value: None, 2, 0)
+        instruments.waited(1.0)
+        instruments.reset()
+        snapshot = instruments.snapshot()
+        self.assertEqual(snapshot['steps'], 0)
+        self.assertEqual(snapshot['missed'], 0)
+        self.assertEqual(snapshot['write_time'], 0.0)
+        self.assertEqual(snapshot['intervals']['count'], 0)
+        self.assertEqual(snapshot['steps_per_second'], 0.0)
+
+    def test_steps_per_second(self):
+        # each step is read twice, so steps are 0.01 seconds apart
+        instruments = StepInstruments(clock=FakeClock(0.005).time,
+                                      speed_window=4)
+        self.assertRaises(ValueError, StepInstruments, speed_window=1)
+        instruments.begin()
+        instruments.step(lambda value: None, 1, 0)
+        self.assertEqual(instruments.steps_per_second(), 0.0)
+        for position in range(2, 10):
+            instruments.step(lambda value: None, position, 0)
+        self.assertAlmostEqual(instruments.steps_per_second(), 100)
+        self.assertAlmostEqual(instruments.snapshot()['steps_per_second'], 100)
+        instruments.begin()
+        self.assertEqual(instruments.steps_per_second(), 0.0)
@@ -0,0 +1,88 @@
+import mock
+import unittest
+
+from stepper_motor import kinematics
+from stepper_motor.kinematics import (
+    ANTICLOCKWISE,
+    CLOCKWISE,
+    angle_to_cycles,
+    angles_to_cycles,
+    degrees_per_second_to_delay,
+    delay_to_degrees_per_second,
+    delay_to_rpm,
+    offset_to_state,
+    offsets_to_states,
+    rpm_to_delay,
+    state_to_angle,
+    state_to_offset,
+    states_to_angles,
+    states_to_offsets,
+)
+
+
+class TestKinematics(unittest.TestCase):
+
+    QTY = 192
+    STATES = range(-200, 400, 7)
+    ANGLES = [-725.5, -360, -90.25, 0, 0.1, 45, 90, 179.9, 180, 180.1, 270,
+              359.99, 360, 721.3] + [i * 1.875 for i in range(192)]
+
+    def test_speed_conversions(self):
+        self.assertAlmostEqual(rpm_to_delay(60, 200), 0.005)
+        self.assertAlmostEqual(delay_to_rpm(0.005, 200), 60)
+        self.assertAlmostEqual(degrees_per_second_to_delay(360, 200), 0.005)
+        self.assertAlmostEqual(delay_to_degrees_per_second(0.005, 200), 360)
+        self.assertEqual(delay_to_rpm(0, 200), float('inf'))
+        self.assertEqual(delay_to_degrees_per_second(0, 200), float('inf'))
+        self.assertRaises(ValueError, rpm_to_delay, 0, 200)
+        self.assertRaises(ValueError, degrees_per_second_to_delay, -1, 200)
+
+    def check(self, convert, expected):
+        self.assertEqual(list(convert()), expected)
+        with mock.patch.object(kinematics, 'numpy', None):
+            self.assertEqual(list(convert()), expected)
+
+    def test_states_to_angles(self):
+        self.check(lambda: states_to_angles(self.STATES, self.QTY),
+                   [state_to_angle(s, self.QTY) for s in self.STATES])
+
+    def test_states_to_offsets(self):
+        self.check(lambda: states_to_offsets(self.STATES, self.QTY),
+                   [state_to_offset(s, self.QTY) for s in self.STATES])
+
+    def test_offsets_to_states(self):
+        offsets = [i / 64.0 for i in range(65)] + [0.3, 0.7]
+        self.check(lambda: offsets_to_states(offsets, self.QTY),
+                   [offset_to_state(o, self.QTY) for o in offsets])
+        self.assertRaises(AssertionError, offsets_to_states, [0.5, 1.1], 24)
+        with mock.patch.object(kinematics, 'numpy', None):
+            self.assertRaises(AssertionError, offsets_to_states, [-0.1], 24)
+
+    def test_angles_to_cycles_one_state(self):
+        for direction in (None, CLOCKWISE, ANTICLOCKWISE):
+            for state in (0, 1, 96, 191):
+                self.check(
+                    lambda: angles_to_cycles(self.ANGLES, state, self.QTY,
+                                             direction),
+                    [angle_to_cycles(a, state, self.QTY, direction)
+                     for a in self.ANGLES])
+
+    def test_angles_to_cycles_per_state(self):
+        states = [(i * 37) % self.QTY for i in range(len(self.ANGLES))]
+        for direction in (None, CLOCKWISE, ANTICLOCKWISE):
+            self.check(
+                lambda: angles_to_cycles(self.ANGLES, states, self.QTY,
+                                         direction),
+                [angle_to_cycles(a, s, self.QTY, direction)
+                 for a, s in zip(self.ANGLES, states)])
+
+    def test_angles_to_cycles_range(self):
+        cycles = angles_to_cycles(self.ANGLES, 5, self.QTY)
+        self.assertTrue(all(-0.5 <= c <= 0.5 for c in cycles))
+        cycles = angles_to_cycles(self.ANGLES, 5, self.QTY, CLOCKWISE)
+        self.assertTrue(all(0 <= c < 1 for c in cycles))
+        cycles = angles_to_cycles(self.ANGLES, 5, self.QTY, ANTICLOCKWISE)
+        self.assertTrue(all(-1 < c <= 0 for c in cycles))
+
+    def test_angles_to_cycles_invalid_direction(self):
+        self.assertRaises(ValueError, angles_to_cycles, [90], 0, 24, 0)
@@ -0,0 +1,23 @@
+import sys
+import unittest
+
+from stepper_motor.lazy import LazyModule, optional_module
+
+
+class TestOptionalModule(unittest.TestCase):
+
+    def test_missing(self):
+        self.assertEqual(optional_module('no_such_module_installed'), None)
+
+    def test_imported_on_first_use(self):
+        sys.modules.pop('colorsys', None)
+        colorsys = optional_module('colorsys')
+        self.assertTrue(isinstance(colorsys, LazyModule))
+        self.assertNotIn('colorsys', sys.modules)
+        self.assertEqual(colorsys.rgb_to_hsv(1, 0, 0), (0, 1, 1))
+        self.assertIn('colorsys', sys.modules)
+        self.assertTrue(colorsys.rgb_to_hsv is sys.modules['colorsys'].rgb_to_hsv)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,27 @@
+import json
 import mock
+import os
+import shutil
+import tempfile
 import unittest
+from StringIO import StringIO
 
 from stepper_motor.motor_position import (
     angle_to_cycles,
+    compact_phases,
+    main,
     offset_to_state,
     state_to_angle,
     state_to_offset,
     StepperMotor,
 )
+from stepper_motor.instruments import StepInstruments
+from stepper_motor.kinematics import ANTICLOCKWISE, CLOCKWISE
+from stepper_motor.path import Waypoint
+from stepper_motor.phases import FULL, HALF, WAVE, phase_table
+from stepper_motor.ports import SimulatedPort, VirtualClock
+from stepper_motor.state import StateFile
+from stepper_motor.stop import StopToken
 
 class TestMotorPosition(unittest.TestCase):
     
@@ -58,6 +72,24 @@ class TestMotorPosition(unittest.TestCase):
         self.assertEqual(angle_to_cycles(180, 18, qty), -0.25)
         # quarter turn over rollover backwards
         self.assertEqual(angle_to_cycles(300, 2, qty), -0.25)
+        # eighth of a turn over rollover forwards
+        self.assertEqual(angle_to_cycles(0, 21, qty), 0.125)
+    
+    def test_angle_to_cycles_direction(self):
+        qty = 24
+        self.assertEqual(angle_to_cycles(180, 18, qty, CLOCKWISE), 0.75)
+        self.assertEqual(angle_to_cycles(180, 6, qty, ANTICLOCKWISE), -0.75)
+        self.assertEqual(angle_to_cycles(180, 6, qty, CLOCKWISE), 0.25)
+        # already there, no turn either way
+        self.assertEqual(angle_to_cycles(90, 6, qty, ANTICLOCKWISE), 0)
+        self.assertEqual(angle_to_cycles(90, 6, qty, CLOCKWISE), 0)
+        self.assertRaises(ValueError, angle_to_cycles, 90, 6, qty, 2)
+    
+    def test_turn_to_angle_direction(self):
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=18, delay=0,
+                               port=mock.Mock())
+        stepper.turn_to_angle(180, direction=CLOCKWISE)
+        self.assertEqual(stepper.position, 36)
         
     def test_stepper_generator_forward(self):
         stepper = StepperMotor(self.MOTOR_INPUTS, state=0)
@@ -108,7 +140,8 @@ class TestMotorPosition(unittest.TestCase):
         
     def test_turn_motor(self):
         mock_parallel = mock.Mock()
-        stepper = StepperMotor(self.MOTOR_INPUTS, state=2)
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=2,
+                               scheduler=VirtualClock().scheduler())
         stepper.parallel_interface = mock_parallel
         
         # turn 1 x rotation == 24 x steps
@@ -125,7 +158,8 @@ class TestMotorPosition(unittest.TestCase):
         
     def test_turn_motor_backwards(self):
         mock_parallel = mock.Mock()
-        stepper = StepperMotor(self.MOTOR_INPUTS)
+        stepper = StepperMotor(self.MOTOR_INPUTS,
+                               scheduler=VirtualClock().scheduler())
         stepper.parallel_interface = mock_parallel
         
         # turn -2.5 x rotation (24) == 60 x steps
@@ -149,4 +183,413 @@ class TestMotorPosition(unittest.TestCase):
         self.assertEqual(new_state, 11)
         self.assertEqual(mock_parallel.setData.call_count, 0)
         self.assertEqual(mock_parallel.setData.call_args, None)
-        
\ No newline at end of file
+                
+    def test_stepper_generator_trace(self):
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=0)
+        with mock.patch('stepper_motor.motor_position.logger') as logger:
+            logger.isEnabledFor.return_value = False
+            list(stepper.stepper_generator(3))
+            self.assertEqual(logger.debug.call_count, 0)
+            
+            logger.isEnabledFor.return_value = True
+            list(stepper.stepper_generator(3))
+            self.assertEqual(logger.debug.call_count, 3)
+            # trace reports the last state moved to
+            self.assertEqual(logger.debug.call_args[0][2], 6)
+        
+    def test_turn_motor_with_profile(self):
+        mock_parallel = mock.Mock()
+        profile = mock.Mock()
+        profile.delays.return_value = [0.001, 0.002, 0.001]
+        scheduler = mock.Mock()
+        stepper = StepperMotor(self.MOTOR_INPUTS, scheduler=scheduler,
+                               profile=profile)
+        stepper.parallel_interface = mock_parallel
+        
+        self.assertEqual(stepper.turn_motor(-0.125), 21)
+        profile.delays.assert_called_once_with(-3)
+        deadlines = [c[0][0] for c in scheduler.wait_until.call_args_list]
+        for deadline, expected in zip(deadlines, [0.001, 0.003, 0.004]):
+            self.assertAlmostEqual(deadline, expected)
+        self.assertEqual(mock_parallel.setData.call_count, 3)
+        
+    def test_plan_motor(self):
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=22, delay=0.01)
+        plan = stepper.plan_motor(0.125)
+        # planning does not move the motor
+        self.assertEqual(stepper.state, 22)
+        self.assertEqual(list(plan.values), [0x0D, 0x05, 0x07])
+        self.assertEqual(plan.start_position, 22)
+        self.assertEqual(plan.end_position, 25)
+        self.assertAlmostEqual(plan.duration, 0.03)
+        
+    def test_plan_cache(self):
+        stepper = StepperMotor(self.MOTOR_INPUTS, delay=0, port=mock.Mock())
+        for _ in range(3):
+            stepper.rotate(120)
+        # every move starts from the same phase
+        self.assertEqual(stepper.position, 24)
+        self.assertEqual(stepper.plan_cache.stats()['hits'], 2)
+        stepper.delay = 0.01
+        self.assertAlmostEqual(stepper.plan_rotate(120).duration, 0.08)
+        self.assertEqual(len(stepper.plan_cache), 2)
+        
+    def test_plan_to_angle_and_rotate(self):
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=18)
+        self.assertEqual(stepper.plan_to_angle(180).steps, -6)
+        self.assertEqual(stepper.plan_to_angle(180, start_position=6).steps, 6)
+        self.assertEqual(stepper.plan_rotate(-45).steps, -3)
+        
+    def test_execute(self):
+        mock_parallel = mock.Mock()
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=1, delay=0)
+        stepper.parallel_interface = mock_parallel
+        plan = stepper.plan_steps(-3)
+        self.assertEqual(stepper.execute(plan), 22)
+        self.assertEqual([c[0][0] for c in mock_parallel.setData.call_args_list],
+                         [0x05, 0x0D, 0x09])
+        
+    def test_execute_interrupted(self):
+        mock_parallel = mock.Mock()
+        mock_parallel.setData.side_effect = [None, None, KeyboardInterrupt]
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=0, delay=0)
+        stepper.parallel_interface = mock_parallel
+        self.assertRaises(KeyboardInterrupt, stepper.turn_motor, 1)
+        # state records the steps which were written
+        self.assertEqual(stepper.state, 2)
+        
+    def test_execute_stop_token(self):
+        clock = VirtualClock()
+        stop = StopToken(deceleration=1200)
+        class StoppingPort(SimulatedPort):
+            def setData(self, value):
+                SimulatedPort.setData(self, value)
+                if len(self.values) == 10:
+                    stop.set()
+        port = StoppingPort(self.MOTOR_INPUTS[:8], clock)
+        stepper = StepperMotor(self.MOTOR_INPUTS, delay=0.01,
+                               scheduler=clock.scheduler(), port=port)
+        self.assertEqual(stepper.execute(stepper.plan_steps(-100), stop), 11)
+        # three more steps slowing down
+        self.assertEqual(len(port.values), 13)
+        self.assertEqual(stepper.position, -13)
+        self.assertEqual(port.position, -13)
+        intervals = [b - a for a, b in zip(port.times, port.times[1:])]
+        self.assertAlmostEqual(intervals[9], 0.01)
+        self.assertTrue(intervals[9] < intervals[10] < intervals[11])
+    
+    def test_execute_stop_token_immediate(self):
+        stop = StopToken(deceleration=1200)
+        stop.set(immediate=True)
+        stepper = StepperMotor(self.MOTOR_INPUTS, delay=0.01,
+                               scheduler=VirtualClock().scheduler(),
+                               port=mock.Mock())
+        stepper.execute(stepper.plan_steps(100), stop)
+        self.assertEqual(stepper.position, 0)
+    
+    def test_spin_stop_token(self):
+        clock = VirtualClock()
+        stop = StopToken(deceleration=1200)
+        port = mock.Mock()
+        stepper = StepperMotor(self.MOTOR_INPUTS, delay=0.01,
+                               scheduler=clock.scheduler(), port=port)
+        def stop_at_fifty(value):
+            if port.setData.call_count == 50:
+                stop.set()
+        port.setData.side_effect = stop_at_fifty
+        stepper.spin(stop=stop)
+        self.assertEqual(stepper.position, 53)
+        self.assertEqual(stepper.steps_moved, 53)
+    
+    def test_spin_stop_ramp_instrumented(self):
+        clock = VirtualClock()
+        stop = StopToken(deceleration=1200)
+        post_step = mock.Mock()
+        checkpoint = mock.Mock()
+        stepper = StepperMotor(self.MOTOR_INPUTS, delay=0.01,
+                               scheduler=clock.scheduler(),
+                               port=SimulatedPort(self.MOTOR_INPUTS[:8], clock))
+        stepper.instruments = StepInstruments(post_step=post_step,
+                                              clock=clock.time)
+        stepper.checkpoint = checkpoint
+        def stop_at_23(position, value):
+            if position == 23:
+                stop.set()
+        post_step.side_effect = stop_at_23
+        stepper.spin(stop=stop)
+        self.assertEqual(stepper.position, 26)
+        # the steps slowing down are counted too
+        self.assertEqual(stepper.instruments.steps, 26)
+        post_step.assert_called_with(26, self.MOTOR_INPUTS[2])
+        checkpoint.save.assert_called_with(24)
+    
+    def test_turn_to_angle(self):
+        mock_parallel = mock.Mock()
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=3, delay=0)
+        stepper.parallel_interface = mock_parallel
+        self.assertEqual(stepper.turn_to_angle(90), 6)
+        self.assertEqual(mock_parallel.setData.call_count, 3)
+        
+    def test_compact_phases(self):
+        self.assertEqual(compact_phases(self.MOTOR_INPUTS),
+                         (0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D))
+        self.assertEqual(compact_phases([1, 2, 1]), (1, 2, 1))
+        self.assertEqual(compact_phases([3, 3, 3]), (3,))
+        
+    def test_motor_inputs_from_phases(self):
+        stepper = StepperMotor(self.MOTOR_INPUTS[:8], steps_per_rev=24)
+        self.assertEqual(stepper.phases, tuple(self.MOTOR_INPUTS[:8]))
+        self.assertEqual(len(stepper.MOTOR_INPUTS), 24)
+        self.assertEqual(stepper.MOTOR_INPUTS, self.MOTOR_INPUTS)
+        self.assertEqual(stepper.MOTOR_INPUTS[-1], 0x0D)
+        self.assertRaises(IndexError, stepper.MOTOR_INPUTS.__getitem__, 24)
+        self.assertRaises(ValueError, StepperMotor, [], steps_per_rev=24)
+        
+    def test_position_is_unbounded(self):
+        mock_parallel = mock.Mock()
+        stepper = StepperMotor(self.MOTOR_INPUTS[:8], state=20, delay=0,
+                               steps_per_rev=24)
+        stepper.parallel_interface = mock_parallel
+        self.assertEqual(stepper.turn_motor(2.25), 2)
+        self.assertEqual(stepper.position, 74)
+        self.assertEqual(mock_parallel.setData.call_args[0][0], 0x06)
+        self.assertEqual(stepper.rotate(-1080), 2)
+        self.assertEqual(stepper.position, 2)
+        
+    def test_high_resolution_motor(self):
+        mock_parallel = mock.Mock()
+        stepper = StepperMotor(self.MOTOR_INPUTS[:8], delay=0,
+                               steps_per_rev=20000)
+        stepper.parallel_interface = mock_parallel
+        self.assertEqual(stepper.turn_to_angle(90), 5000)
+        self.assertEqual(mock_parallel.setData.call_args[0][0],
+                         self.MOTOR_INPUTS[5000 % 8])
+        
+    def test_turn_motor_simulated(self):
+        clock = VirtualClock()
+        port = SimulatedPort(self.MOTOR_INPUTS[:8], clock, position=2)
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=2, delay=0.05,
+                               scheduler=clock.scheduler(), port=port)
+        self.assertEqual(stepper.turn_motor(-417), 2)
+        self.assertEqual(len(port.values), 10008)
+        # a realistic move in no time at all
+        self.assertAlmostEqual(clock.now, 500.4)
+        self.assertAlmostEqual(port.times[1] - port.times[0], 0.05)
+        self.assertEqual(port.faults, [])
+        self.assertEqual(port.position, stepper.position)
+
+    def test_follow_path_simulated(self):
+        clock = VirtualClock()
+        port = SimulatedPort(self.MOTOR_INPUTS[:8], clock)
+        stepper = StepperMotor(self.MOTOR_INPUTS, delay=0.01,
+                               scheduler=clock.scheduler(), port=port)
+        path = [90, 180, Waypoint(rotate=-45, dwell=0.5), 270]
+        self.assertEqual(stepper.plan_path(path).steps, 18)
+        self.assertEqual(stepper.follow_path(path), 18)
+        self.assertEqual(len(port.values), 12 + 3 + 9)
+        self.assertAlmostEqual(clock.now, 24 * 0.01 + 0.5)
+        self.assertEqual(port.faults, [])
+        self.assertEqual(port.position, 18)
+        # the steps back count as well
+        self.assertEqual(stepper.steps_moved, 24)
+    
+    def test_mode_from_pins(self):
+        stepper = StepperMotor(None, mode=FULL, steps_per_rev=96,
+                               port=mock.Mock())
+        self.assertEqual(stepper.phases, (0x05, 0x06, 0x0A, 0x09))
+        self.assertRaises(ValueError, StepperMotor, None)
+        self.assertRaises(ValueError, StepperMotor, self.MOTOR_INPUTS,
+                          mode=FULL, port=mock.Mock())
+    
+    def test_set_mode_keeps_position(self):
+        port = mock.Mock()
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=6, mode=HALF,
+                               delay=0, port=port)
+        self.assertEqual(stepper.set_mode(FULL), 3)
+        self.assertEqual(stepper.steps_per_rev, 12)
+        self.assertFalse(port.setData.called)
+        stepper.turn_motor(0.25)
+        self.assertEqual(stepper.position, 6)
+        self.assertEqual(port.setData.call_args_list[-1], mock.call(0x0A))
+        stepper.set_mode(HALF)
+        self.assertEqual(stepper.position, 12)
+        self.assertEqual(stepper.MOTOR_INPUTS, self.MOTOR_INPUTS)
+    
+    def test_set_mode_moves_half_step(self):
+        port = mock.Mock()
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=5, mode=HALF,
+                               delay=0, port=port)
+        self.assertEqual(stepper.set_mode(FULL, direction=-1), 2)
+        port.setData.assert_called_once_with(0x0A)
+        # odd half steps are wave positions
+        stepper.set_mode(HALF)
+        self.assertEqual(stepper.set_mode(WAVE), 3)
+        self.assertEqual(port.setData.call_count, 2)
+    
+    def test_set_mode_half_step_recorded(self):
+        stepper = StepperMotor(self.MOTOR_INPUTS, state=5, mode=HALF,
+                               delay=0, port=mock.Mock())
+        stepper.instruments = StepInstruments()
+        stepper.checkpoint = mock.Mock()
+        stepper.set_mode(FULL)
+        self.assertEqual(stepper.position, 3)
+        self.assertEqual(stepper.steps_moved, 1)
+        self.assertEqual(stepper.instruments.steps, 1)
+        # in half steps, as checkpoints are recorded
+        stepper.checkpoint.end.assert_called_once_with(6)
+    
+    def test_set_mode_unknown(self):
+        stepper = StepperMotor(self.MOTOR_INPUTS, port=mock.Mock())
+        self.assertRaises(ValueError, stepper.set_mode, FULL)
+    
+    def test_turn_motor_instrumented(self):
+        clock = VirtualClock()
+        calls = []
+        stepper = StepperMotor(self.MOTOR_INPUTS, delay=0.01,
+                               scheduler=clock.scheduler(),
+                               port=mock.Mock())
+        stepper.instruments = StepInstruments(
+            pre_step=lambda position, value: calls.append(('pre', position, value)),
+            post_step=lambda position, value: calls.append(('post', position, value)),
+            clock=clock.time)
+        stepper.turn_motor(-0.5)
+        self.assertEqual(stepper.position, -12)
+        self.assertEqual(calls[:4], [('pre', -1, 0x0D), ('post', -1, 0x0D),
+                                     ('pre', -2, 0x09), ('post', -2, 0x09)])
+        self.assertEqual(calls[-1], ('post', -12, self.MOTOR_INPUTS[12]))
+        snapshot = stepper.instruments.snapshot()
+        self.assertEqual(snapshot['steps'], 12)
+        self.assertEqual(snapshot['missed'], 0)
+        self.assertEqual(snapshot['intervals']['count'], 11)
+        self.assertAlmostEqual(snapshot['intervals']['mean'], 0.01)
+    
+    def test_speed(self):
+        stepper = StepperMotor(self.MOTOR_INPUTS, delay=0.1, port=mock.Mock())
+        self.assertAlmostEqual(stepper.rpm, 25)
+        self.assertAlmostEqual(stepper.degrees_per_second, 150)
+        stepper.rpm = 50
+        self.assertAlmostEqual(stepper.delay, 0.05)
+        stepper.degrees_per_second = 30
+        self.assertAlmostEqual(stepper.delay, 0.5)
+        self.assertRaises(ValueError, setattr, stepper, 'rpm', 0)
+        stepper.delay = 0
+        self.assertEqual(stepper.rpm, float('inf'))
+    
+    def test_measured_rpm(self):
+        clock = VirtualClock()
+        stepper = StepperMotor(self.MOTOR_INPUTS, delay=0.05,
+                               scheduler=clock.scheduler(),
+                               port=mock.Mock())
+        self.assertEqual(stepper.measured_rpm(), None)
+        stepper.instruments = StepInstruments(clock=clock.time)
+        stepper.turn_motor(1)
+        self.assertAlmostEqual(stepper.measured_rpm(), stepper.rpm)
+    
+    @mock.patch('stepper_motor.motor_position.open_parallel')
+    def test_port_opened_by_first_move(self, open_parallel):
+        stepper = StepperMotor(self.MOTOR_INPUTS, delay=0)
+        stepper.plan_rotate(90)
+        self.assertFalse(open_parallel.called)
+        stepper.rotate(90)
+        stepper.rotate(90)
+        open_parallel.assert_called_once_with()
+        self.assertEqual(open_parallel.return_value.setData.call_count, 12)
+    
+    def test_turn_motor_post_step_raises(self):
+        def stall(position, value):
+            if position == 5:
+                raise RuntimeError('stalled')
+        stepper = StepperMotor(self.MOTOR_INPUTS, delay=0, port=mock.Mock())
+        stepper.instruments = StepInstruments(post_step=stall)
+        self.assertRaises(RuntimeError, stepper.turn_motor, 1)
+        # the step was written before the hook raised
+        self.assertEqual(stepper.position, 5)
+
+
+@mock.patch('logging.basicConfig')
+@mock.patch('stepper_motor.motor_position.open_parallel')
+class TestCommandLine(unittest.TestCase):
+    
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'motor_state.ini')
+    
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+    
+    def run_main(self, *arguments):
+        stdout = StringIO()
+        with mock.patch('sys.stdout', stdout):
+            try:
+                main(['--state_file', self.path] + list(arguments))
+            except SystemExit as exit:
+                self.assertEqual(exit.code, 0)
+        return stdout.getvalue()
+    
+    def test_list(self, open_parallel, basic_config):
+        output = self.run_main('--list')
+        self.assertIn('191 : 358.12 deg : 0xd hex', output)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(open_parallel.called)
+    
+    def test_status(self, open_parallel, basic_config):
+        StateFile(self.path).write(30)
+        output = self.run_main('--status')
+        self.assertEqual(output.strip(),
+                         'Position 30 half steps, state index 30, 56.25 degrees')
+        self.assertFalse(open_parallel.called)
+    
+    def test_status_while_locked(self, open_parallel, basic_config):
+        StateFile(self.path).write(30)
+        with StateFile(self.path):
+            output = self.run_main('--status')
+        self.assertIn('Position 30 half steps', output)
+    
+    def test_locked(self, open_parallel, basic_config):
+        with StateFile(self.path), mock.patch('sys.stderr', StringIO()) as stderr:
+            with self.assertRaises(SystemExit) as raised:
+                main(['--state_file', self.path, '--lock_timeout', '0.1',
+                      '--rotate', '90'])
+        self.assertEqual(raised.exception.code, 2)
+        self.assertIn('locked by another process', stderr.getvalue())
+        self.assertFalse(open_parallel.called)
+    
+    def test_rpm_with_profile(self, open_parallel, basic_config):
+        with mock.patch('sys.stderr', StringIO()) as stderr:
+            with self.assertRaises(SystemExit) as raised:
+                main(['--state_file', self.path, '--profile', 'trapezoidal',
+                      '--rpm', '30', '--rotate', '90'])
+        self.assertEqual(raised.exception.code, 2)
+        self.assertIn('--max_speed', stderr.getvalue())
+        self.assertFalse(open_parallel.called)
+    
+    def test_plan_angle_zero(self, open_parallel, basic_config):
+        StateFile(self.path).write(30)
+        plan = json.loads(self.run_main('--plan', '--angle', '0'))
+        self.assertEqual(plan['steps'], -30)
+        self.assertFalse(open_parallel.called)
+    
+    def test_reset(self, open_parallel, basic_config):
+        StateFile(self.path).write(30)
+        self.run_main('--reset', '--mode', 'wave')
+        self.assertEqual(StateFile(self.path).read(), 0)
+        self.assertFalse(open_parallel.called)
+    
+    def test_move(self, open_parallel, basic_config):
+        with mock.patch('signal.signal'):
+            self.run_main('--rotate', '90', '--delay', '0')
+        self.assertEqual(StateFile(self.path).read(), 48)
+        self.assertEqual(open_parallel.return_value.setData.call_count, 48)
+    
+    def test_home_then_move(self, open_parallel, basic_config):
+        StateFile(self.path).write(30)
+        # the rotor is not where the state file says
+        port = SimulatedPort(phase_table(HALF), position=104,
+                             steps_per_rev=192)
+        open_parallel.return_value = port
+        with mock.patch('signal.signal'):
+            self.run_main('--home', '--home_angle', '90', '--angle', '180',
+                          '--delay', '0')
+        self.assertEqual(StateFile(self.path).read(), 96)
+        self.assertEqual(port.position, 192 + 48)
+        self.assertEqual(port.faults, [])
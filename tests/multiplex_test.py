@@ -0,0 +1,94 @@
+import mock
+import unittest
+
+from stepper_motor.multiplex import (
+    MultiMotorDriver,
+    SharedPort,
+)
+
+PHASES = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+
+
+class TestSharedPort(unittest.TestCase):
+
+    def test_channels_keep_other_bits(self):
+        port = mock.Mock()
+        shared = SharedPort(port)
+        low = shared.channel(0)
+        high = shared.channel(4)
+        low.setData(0x05)
+        high.setData(0x0E)
+        low.setData(0x07)
+        self.assertEqual([c[0][0] for c in port.setData.call_args_list],
+                         [0x05, 0xE5, 0xE7])
+
+    def test_unchanged_register_not_written(self):
+        port = mock.Mock()
+        shared = SharedPort(port)
+        low = shared.channel(0)
+        low.setData(0x05)
+        low.setData(0x05)
+        self.assertEqual(port.setData.call_count, 1)
+        self.assertEqual(shared.saved, 1)
+
+    def test_batch(self):
+        port = mock.Mock()
+        shared = SharedPort(port)
+        low = shared.channel(0)
+        high = shared.channel(4)
+        with shared.batch():
+            low.setData(0x05)
+            high.setData(0x0E)
+        port.setData.assert_called_once_with(0xE5)
+        self.assertEqual(shared.stats(), {'writes': 1, 'saved': 1})
+
+    def test_channel_must_fit(self):
+        shared = SharedPort(mock.Mock())
+        self.assertRaises(ValueError, shared.channel, 6)
+        self.assertRaises(ValueError, shared.channel, -1)
+
+
+class TestMultiMotorDriver(unittest.TestCase):
+
+    def setUp(self):
+        self.port = mock.Mock()
+        self.driver = MultiMotorDriver(self.port, scheduler=mock.Mock())
+        self.x = self.driver.add_motor(PHASES, shift=0, delay=0.01,
+                                       steps_per_rev=24)
+        self.y = self.driver.add_motor(PHASES, shift=4, delay=0.02,
+                                       steps_per_rev=24)
+
+    def test_overlapping_motors(self):
+        self.assertRaises(ValueError, self.driver.add_motor, PHASES, shift=2)
+
+    def test_single_motor_move_through_channel(self):
+        self.x.turn_motor(1 / 24.0)
+        self.port.setData.assert_called_once_with(0x07)
+
+    def test_coordinated_move(self):
+        coordinated = self.driver.compile([(self.x, self.x.plan_steps(4)),
+                                           (self.y, self.y.plan_steps(-2))])
+        # steps due together are combined into one write
+        self.assertEqual(len(coordinated), 4)
+        self.assertEqual(list(coordinated.values), [0xD7, 0xD6, 0x9E, 0x9A])
+        for time, expected in zip(coordinated.times, [0.01, 0.02, 0.03, 0.04]):
+            self.assertAlmostEqual(time, expected)
+
+        self.assertEqual(self.driver.execute(coordinated), [4, 22])
+        self.assertEqual(self.port.setData.call_count, 4)
+        self.assertEqual(self.driver.shared.value, 0x9A)
+        self.assertEqual(self.driver.shared.written, 0x9A)
+        self.assertEqual(self.y.position, -2)
+
+    def test_coordinated_move_interrupted(self):
+        self.port.setData.side_effect = [None, None, KeyboardInterrupt]
+        self.assertRaises(KeyboardInterrupt, self.driver.rotate_motors,
+                          [(self.x, 60), (self.y, 30)])
+        # the third write was not made
+        self.assertEqual(self.x.position, 2)
+        self.assertEqual(self.y.position, 1)
+
+    def test_turn_motors(self):
+        self.assertEqual(self.driver.turn_motors([(self.y, 0.25), (self.x, 0)]),
+                         [6, 0])
+        self.assertEqual(self.port.setData.call_count, 6)
@@ -0,0 +1,80 @@
+import unittest
+from array import array
+
+from stepper_motor.kinematics import CLOCKWISE
+from stepper_motor.path import Waypoint, compile_path, path_runs
+from stepper_motor.profiles import ConstantProfile, TrapezoidalProfile
+
+MOTOR_INPUTS = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+
+
+class TestWaypoint(unittest.TestCase):
+
+    def test_requires_one_target(self):
+        self.assertRaises(ValueError, Waypoint)
+        self.assertRaises(ValueError, Waypoint, angle=90, rotate=90)
+        self.assertRaises(ValueError, Waypoint, angle=90, dwell=-1)
+
+    def test_steps_from(self):
+        self.assertEqual(Waypoint(angle=90).steps_from(0, 24), 6)
+        self.assertEqual(Waypoint(angle=270).steps_from(0, 24), -6)
+        self.assertEqual(Waypoint(angle=270, direction=CLOCKWISE)
+                         .steps_from(0, 24), 18)
+        # relative to the current position, not its angle
+        self.assertEqual(Waypoint(rotate=-720).steps_from(30, 24), -48)
+
+
+class TestPathRuns(unittest.TestCase):
+
+    def test_same_direction_joined(self):
+        self.assertEqual(path_runs([30, 60, 90], 0, 24), [(6, 0.0)])
+
+    def test_reversal_splits(self):
+        self.assertEqual(path_runs([90, 45, 0], 0, 24), [(6, 0.0), (-6, 0.0)])
+
+    def test_dwell_splits(self):
+        self.assertEqual(path_runs([Waypoint(angle=30, dwell=0.5), 90], 0, 24),
+                         [(2, 0.5), (4, 0.0)])
+
+    def test_repeated_waypoint_dwells(self):
+        self.assertEqual(path_runs([90, Waypoint(angle=90, dwell=0.5), 180], 0, 24),
+                         [(6, 0.5), (6, 0.0)])
+
+    def test_dwell_at_start(self):
+        self.assertEqual(path_runs([Waypoint(rotate=0, dwell=1), 90], 0, 24),
+                         [(0, 1), (6, 0.0)])
+
+    def test_nowhere(self):
+        self.assertEqual(path_runs([0, 360], 0, 24), [])
+
+
+class TestCompilePath(unittest.TestCase):
+
+    def test_reversal(self):
+        plan = compile_path(MOTOR_INPUTS, 0, [(3, 0.0), (-2, 0.0)],
+                            ConstantProfile(0.1))
+        self.assertEqual(plan.positions, array('l', [1, 2, 3, 2, 1]))
+        self.assertEqual(plan.values, array('B', [0x07, 0x06, 0x0E, 0x06, 0x07]))
+        self.assertEqual(plan.end_position, 1)
+        self.assertAlmostEqual(plan.duration, 0.5)
+
+    def test_dwell(self):
+        plan = compile_path(MOTOR_INPUTS, 0, [(2, 1.0), (1, 0.0)],
+                            ConstantProfile(0.1))
+        self.assertEqual([round(t, 6) for t in plan.times], [0.1, 1.2, 1.3])
+
+    def test_hold_at_start(self):
+        plan = compile_path(MOTOR_INPUTS, 9, [(0, 1.0), (1, 0.0)],
+                            ConstantProfile(0.1))
+        self.assertEqual(plan.positions, array('l', [9, 10]))
+        self.assertEqual(plan.values, array('B', [0x07, 0x06]))
+        self.assertAlmostEqual(plan.times[0], 1.0)
+
+    def test_blending_is_faster(self):
+        profile = TrapezoidalProfile(max_speed=200, acceleration=400)
+        stops = [(48, 0.0)] * 4
+        joined = compile_path(MOTOR_INPUTS, 0, path_runs([90, 180, 270, 0], 0, 192),
+                              profile)
+        separate = compile_path(MOTOR_INPUTS, 0, stops, profile)
+        self.assertEqual(joined.positions, separate.positions)
+        self.assertTrue(joined.duration < separate.duration * 0.75)
@@ -0,0 +1,71 @@
+import unittest
+
+from stepper_motor import phases
+from stepper_motor.motor_position import COIL_PHASES
+from stepper_motor.phases import (
+    FULL,
+    HALF,
+    WAVE,
+    from_half_position,
+    half_steps,
+    phase_table,
+    to_half_position,
+)
+
+
+class TestPhaseTable(unittest.TestCase):
+
+    def test_rig_half_step(self):
+        self.assertEqual(phase_table(HALF), tuple(COIL_PHASES))
+
+    def test_full_step(self):
+        self.assertEqual(phase_table(FULL), (0x05, 0x06, 0x0A, 0x09))
+        # every other half step
+        self.assertEqual(phase_table(FULL), phase_table(HALF)[::2])
+
+    def test_wave(self):
+        self.assertEqual(phase_table(WAVE), (0x01, 0x04, 0x02, 0x08))
+
+    def test_pin_mapping(self):
+        pins = (0x10, 0x20, 0x40, 0x80, 0x01, 0x02)
+        self.assertEqual(phase_table(WAVE, pins), pins)
+        self.assertEqual(len(phase_table(HALF, pins)), 12)
+        self.assertEqual(phase_table(FULL, pins)[-1], 0x12)
+
+    def test_memoized(self):
+        table = phase_table(HALF, [0x01, 0x02, 0x04, 0x08])
+        self.assertTrue(phase_table(HALF, (0x01, 0x02, 0x04, 0x08)) is table)
+        self.assertTrue(phases._tables.hits > 0)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, phase_table, 'micro')
+        self.assertRaises(ValueError, phase_table, FULL, (0x01,))
+
+
+class TestHalfPositions(unittest.TestCase):
+
+    def test_half_steps(self):
+        self.assertEqual(half_steps(HALF), 1)
+        self.assertEqual(half_steps(FULL), 2)
+        self.assertEqual(half_steps(WAVE), 2)
+
+    def test_round_trip(self):
+        for mode in (WAVE, FULL, HALF):
+            for position in range(-20, 20):
+                half = to_half_position(mode, position)
+                self.assertEqual(from_half_position(mode, half), position)
+
+    def test_same_phase(self):
+        # positions of each mode hold the rotor where the half step does
+        half = phase_table(HALF)
+        for position in range(-8, 8):
+            full = to_half_position(FULL, position)
+            self.assertEqual(phase_table(FULL)[position % 4], half[full % 8])
+            wave = to_half_position(WAVE, position)
+            # the opposed outer ends cancel, leaving the wave coil end
+            self.assertEqual(half[(wave - 1) % 8] & half[(wave + 1) % 8],
+                             phase_table(WAVE)[position % 4])
+
+    def test_unreachable(self):
+        self.assertEqual(from_half_position(FULL, 3), None)
+        self.assertEqual(from_half_position(WAVE, -2), None)
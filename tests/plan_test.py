@@ -0,0 +1,152 @@
+import mock
+import unittest
+from array import array
+
+from stepper_motor import plan as plan_module
+from stepper_motor.profiles import (
+    ConstantProfile,
+    MotionProfile,
+    TrapezoidalProfile,
+)
+from stepper_motor.plan import (
+    MovePlan,
+    PathPlan,
+    PlanCache,
+    compile_steps,
+    cumulative_times,
+)
+
+MOTOR_INPUTS = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D] * 3
+
+
+class TestMovePlan(unittest.TestCase):
+
+    def test_compile_forwards(self):
+        plan = compile_steps(MOTOR_INPUTS, 6, 4, [0.1] * 4)
+        self.assertEqual(plan.values, array('B', [0x0D, 0x05, 0x07, 0x06]))
+        self.assertEqual(len(plan), 4)
+        self.assertEqual(plan.end_position, 10)
+        self.assertEqual(plan.position_at(-1), 6)
+        self.assertEqual(plan.position_at(0), 7)
+        for time, expected in zip(plan.times, [0.1, 0.2, 0.3, 0.4]):
+            self.assertAlmostEqual(time, expected)
+        self.assertAlmostEqual(plan.duration, 0.4)
+
+    def test_compile_backwards_over_rollover(self):
+        plan = compile_steps(MOTOR_INPUTS, 1, -3, [0.1] * 3)
+        self.assertEqual(list(plan.values), [0x05, 0x0D, 0x09])
+        self.assertEqual(plan.direction, -1)
+        self.assertEqual(plan.end_position, -2)
+        self.assertEqual(plan.position_at(2), -2)
+
+    def test_compile_nowhere(self):
+        plan = compile_steps(MOTOR_INPUTS, 11, 0, [])
+        self.assertEqual(len(plan), 0)
+        self.assertEqual(plan.duration, 0)
+        self.assertEqual(plan.end_position, 11)
+
+    def test_mismatched_lengths(self):
+        self.assertRaises(ValueError, MovePlan, array('B', [1, 2]),
+                          array('d', [0.1]), 0, 2)
+        self.assertRaises(ValueError, MovePlan, array('B', [1]),
+                          array('d', [0.1]), 0, 2)
+
+    def test_serialise(self):
+        plan = compile_steps(MOTOR_INPUTS, 5, -2, [0.25, 0.5])
+        self.assertEqual(plan.to_dict(), {'start_position': 5, 'steps': -2,
+                                          'values': [0x0A, 0x0E],
+                                          'times': [0.25, 0.75]})
+        self.assertEqual(MovePlan.from_json(plan.to_json()), plan)
+        self.assertNotEqual(compile_steps(MOTOR_INPUTS, 5, 2, [0.25, 0.5]), plan)
+        self.assertEqual(list(plan), [(0x0A, 0.25), (0x0E, 0.75)])
+        self.assertEqual(repr(plan),
+                         'MovePlan(start_position=5, steps=-2, duration=0.750000)')
+
+    def test_cumulative_times_without_numpy(self):
+        with mock.patch.object(plan_module, 'numpy', None):
+            self.assertEqual(cumulative_times([0.5, 0.25, 1]),
+                             array('d', [0.5, 0.75, 1.75]))
+
+    def test_cumulative_times_long(self):
+        delays = array('d', [0.001 * (n % 7) for n in xrange(5000)])
+        times = cumulative_times(delays)
+        with mock.patch.object(plan_module, 'numpy', None):
+            self.assertEqual(cumulative_times(delays), times)
+
+    def test_rebase(self):
+        plan = compile_steps(MOTOR_INPUTS, 6, 4, [0.1] * 4)
+        moved = plan.rebase(14)
+        self.assertEqual(moved.start_position, 14)
+        self.assertEqual(moved.end_position, 18)
+        self.assertTrue(moved.values is plan.values)
+        self.assertEqual(moved, compile_steps(MOTOR_INPUTS, 14, 4, [0.1] * 4))
+
+
+class TestPlanCache(unittest.TestCase):
+
+    def test_repeated_move(self):
+        cache = PlanCache()
+        plan = cache.compile(MOTOR_INPUTS, 6, 4, ConstantProfile(0.1))
+        self.assertEqual(plan, compile_steps(MOTOR_INPUTS, 6, 4, [0.1] * 4))
+        self.assertTrue(cache.compile(MOTOR_INPUTS, 6, 4,
+                                      ConstantProfile(0.1)) is plan)
+        self.assertEqual(cache.stats(),
+                         {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 64})
+
+    def test_same_phase(self):
+        cache = PlanCache()
+        plan = cache.compile(MOTOR_INPUTS, 6, -4, ConstantProfile(0.1))
+        # a whole phase cycle on
+        moved = cache.compile(MOTOR_INPUTS, 30, -4, ConstantProfile(0.1))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertTrue(moved.values is plan.values)
+        self.assertEqual(moved, compile_steps(MOTOR_INPUTS, 30, -4, [0.1] * 4))
+
+    def test_distinct_moves(self):
+        cache = PlanCache()
+        profile = TrapezoidalProfile(200, 1000)
+        cache.compile(MOTOR_INPUTS, 6, 4, profile)
+        cache.compile(MOTOR_INPUTS, 7, 4, profile)
+        cache.compile(MOTOR_INPUTS, 6, -4, profile)
+        cache.compile(MOTOR_INPUTS, 6, 4, TrapezoidalProfile(300, 1000))
+        cache.compile(MOTOR_INPUTS, 6, 4, ConstantProfile(0.1))
+        cache.compile(MOTOR_INPUTS[::-1], 6, 4, profile)
+        self.assertEqual(cache.stats()['hits'], 0)
+        self.assertEqual(len(cache), 6)
+
+    def test_uncached_moves(self):
+        cache = PlanCache(max_steps=4)
+        cache.compile(MOTOR_INPUTS, 6, 5, ConstantProfile(0.1))
+        profile = MotionProfile()
+        profile._python_delays = lambda steps: [0.1] * steps
+        plan = cache.compile(MOTOR_INPUTS, 6, 4, profile)
+        self.assertEqual(plan, compile_steps(MOTOR_INPUTS, 6, 4, [0.1] * 4))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['misses'], 0)
+
+
+class TestPathPlan(unittest.TestCase):
+
+    def test_positions(self):
+        plan = PathPlan(array('B', [1, 2, 3, 2]), array('d', [0.1, 0.2, 0.3, 0.4]),
+                        array('l', [11, 12, 13, 12]), 10)
+        self.assertEqual(plan.steps, 2)
+        self.assertEqual(plan.end_position, 12)
+        self.assertEqual(plan.position_at(-1), 10)
+        self.assertEqual(plan.position_at(2), 13)
+        self.assertEqual(len(plan), 4)
+
+    def test_mismatched_positions(self):
+        self.assertRaises(ValueError, PathPlan, array('B', [1, 2]),
+                          array('d', [0.1, 0.2]), array('l', [1]), 0)
+
+    def test_serialise(self):
+        plan = PathPlan(array('B', [1, 2]), array('d', [0.1, 0.2]),
+                        array('l', [-1, 0]), 0)
+        self.assertEqual(PathPlan.from_json(plan.to_json()), plan)
+
+    def test_rebase(self):
+        plan = PathPlan(array('B', [1, 2]), array('d', [0.1, 0.2]),
+                        array('l', [-1, 0]), 0).rebase(8)
+        self.assertEqual(list(plan.positions), [7, 8])
+        self.assertEqual(plan.end_position, 8)
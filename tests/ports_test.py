@@ -0,0 +1,164 @@
+import mock
+import sys
+import unittest
+
+from stepper_motor.ports import (
+    ILLEGAL,
+    SKIPPED,
+    UNKNOWN,
+    DryRunPort,
+    ParallelPort,
+    ShadowPort,
+    SimulatedPort,
+    VirtualClock,
+    open_parallel,
+)
+
+PHASES = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+
+
+class TestPorts(unittest.TestCase):
+
+    def test_dry_run(self):
+        port = DryRunPort()
+        port.setData(0x05)
+        port.setData(0x07)
+        self.assertEqual(port.call_count, 2)
+        self.assertEqual(port.value, 0x07)
+
+    def test_parallel_port(self):
+        parallel = mock.Mock()
+        with mock.patch.dict(sys.modules, {'parallel': parallel}):
+            port = ParallelPort('/dev/parport1')
+        parallel.Parallel.assert_called_once_with('/dev/parport1')
+        port.setData(0x05)
+        parallel.Parallel.return_value.setData.assert_called_once_with(0x05)
+        self.assertEqual(port.getInBusy, parallel.Parallel.return_value.getInBusy)
+
+    def test_open_parallel(self):
+        parallel = mock.Mock()
+        with mock.patch.dict(sys.modules, {'parallel': parallel}):
+            port = open_parallel()
+        self.assertTrue(isinstance(port, ParallelPort))
+        parallel.Parallel.assert_called_once_with(0)
+
+    @mock.patch('sys.stdout')
+    def test_open_parallel_dry_run(self, stdout):
+        # without pyparallel
+        with mock.patch.dict(sys.modules, {'parallel': None}):
+            self.assertTrue(isinstance(open_parallel(), DryRunPort))
+
+    def test_virtual_clock(self):
+        clock = VirtualClock()
+        scheduler = clock.scheduler()
+        scheduler.start()
+        scheduler.wait(0.5)
+        scheduler.wait(0.25)
+        self.assertEqual(clock.time(), 0.75)
+        self.assertEqual(scheduler.jitter()['max'], 0)
+        clock.sleep(-1)
+        self.assertEqual(clock.time(), 0.75)
+
+
+class TestShadowPort(unittest.TestCase):
+
+    def written(self, port):
+        return [c[0][0] for c in port.setData.call_args_list]
+
+    def test_skips_unchanged_writes(self):
+        port = mock.Mock()
+        shadow = ShadowPort(port)
+        for value in (0x05, 0x05, 0x07, 0x07, 0x07, 0x05):
+            shadow.setData(value)
+        self.assertEqual(self.written(port), [0x05, 0x07, 0x05])
+        self.assertEqual(shadow.stats(), {'writes': 3, 'saved': 3})
+
+    def test_known_value(self):
+        port = mock.Mock()
+        shadow = ShadowPort(port, value=0x05)
+        shadow.setData(0x05)
+        self.assertFalse(port.setData.called)
+        self.assertEqual(shadow.saved, 1)
+
+    def test_failed_write_is_retried(self):
+        port = mock.Mock()
+        port.setData.side_effect = [IOError, None]
+        shadow = ShadowPort(port)
+        self.assertRaises(IOError, shadow.setData, 0x05)
+        shadow.setData(0x05)
+        self.assertEqual(self.written(port), [0x05, 0x05])
+        self.assertEqual(shadow.writes, 1)
+
+    def test_update(self):
+        port = mock.Mock()
+        shadow = ShadowPort(port)
+        shadow.update(0x0F, 0x05)
+        shadow.update(0xF0, 0x70)
+        shadow.update(0xF0, 0x70)
+        self.assertEqual(self.written(port), [0x05, 0x75])
+        self.assertEqual(shadow.saved, 1)
+
+    def test_batch_coalesces_updates(self):
+        port = mock.Mock()
+        shadow = ShadowPort(port)
+        with shadow.batch():
+            shadow.update(0x0F, 0x05)
+            with shadow.batch():
+                shadow.update(0xF0, 0x70)
+            self.assertFalse(port.setData.called)
+        self.assertEqual(self.written(port), [0x75])
+        self.assertEqual(shadow.stats(), {'writes': 1, 'saved': 1})
+
+    def test_batch_without_change(self):
+        port = mock.Mock()
+        shadow = ShadowPort(port, value=0x75)
+        with shadow.batch():
+            shadow.update(0x0F, 0x07)
+            shadow.update(0x0F, 0x05)
+        self.assertFalse(port.setData.called)
+        self.assertEqual(shadow.saved, 2)
+
+    def test_close(self):
+        port = mock.Mock()
+        ShadowPort(port).close()
+        port.close.assert_called_once_with()
+        # ports without close
+        ShadowPort(object()).close()
+
+
+class TestSimulatedPort(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.port = SimulatedPort(PHASES, self.clock, min_interval=0.01)
+
+    def write(self, *values):
+        for value in values:
+            self.port.setData(value)
+            self.clock.sleep(0.02)
+
+    def test_rotor_follows_steps(self):
+        self.write(0x07, 0x06, 0x07, 0x05, 0x0D, 0x0D)
+        self.assertEqual(self.port.position, -1)
+        self.assertEqual(self.port.faults, [])
+        self.assertEqual(self.port.writes[:2], [(0.0, 0x07), (0.02, 0x06)])
+
+    def test_illegal_and_unknown_values(self):
+        self.write(0x06, 0xFF)
+        self.assertEqual(self.port.position, 0)
+        self.assertEqual(self.port.faults, [(0.0, 0x06, ILLEGAL),
+                                            (0.02, 0xFF, UNKNOWN)])
+
+    def test_repeated_phases(self):
+        self.assertRaises(ValueError, SimulatedPort, PHASES * 3)
+
+    def test_steps_too_fast_are_skipped(self):
+        self.port.setData(0x07)
+        self.clock.sleep(0.005)
+        self.port.setData(0x06)
+        self.assertEqual(self.port.position, 1)
+        self.assertEqual(self.port.faults, [(0.005, 0x06, SKIPPED)])
+        # the rotor has lost the coils so the next step is illegal
+        self.clock.sleep(0.02)
+        self.port.setData(0x0E)
+        self.assertEqual(self.port.faults[-1][2], ILLEGAL)
@@ -0,0 +1,84 @@
+import mock
+import unittest
+
+from stepper_motor import profiles
+from stepper_motor.profiles import (
+    ConstantProfile,
+    SCurveProfile,
+    TrapezoidalProfile,
+)
+
+
+class TestMotionProfiles(unittest.TestCase):
+
+    def test_constant(self):
+        self.assertEqual(list(ConstantProfile(0.05).delays(-3)), [0.05] * 3)
+        self.assertEqual(len(ConstantProfile(0.05).delays(0)), 0)
+
+    def test_invalid_ramp(self):
+        self.assertRaises(ValueError, TrapezoidalProfile, 0, 100)
+        self.assertRaises(ValueError, SCurveProfile, 100, -1)
+
+    def test_trapezoidal_ramps(self):
+        profile = TrapezoidalProfile(max_speed=200, acceleration=1000,
+                                     start_speed=50)
+        delays = profile.delays(100)
+        self.assertEqual(len(delays), 100)
+        # starts and ends at the start speed
+        self.assertAlmostEqual(delays[0], 1 / 50.0)
+        self.assertAlmostEqual(delays[-1], 1 / 50.0)
+        # v**2 = u**2 + 2as
+        self.assertAlmostEqual(delays[1], 1 / (50 ** 2 + 2000) ** 0.5)
+        # cruises at max speed in the middle
+        self.assertAlmostEqual(delays[50], 1 / 200.0)
+        # symmetric accelerating and decelerating
+        self.assertEqual(list(delays), list(reversed(delays)))
+        # much faster than running the whole move at the start speed
+        self.assertTrue(sum(delays) < 0.5 * 100 / 50.0)
+
+    def test_trapezoidal_short_move_is_triangular(self):
+        profile = TrapezoidalProfile(max_speed=1000, acceleration=100)
+        delays = profile.delays(5)
+        self.assertTrue(min(delays) > 1 / 1000.0)
+        self.assertEqual(min(delays), delays[2])
+
+    def test_s_curve_ramps_smoothly(self):
+        trapezoid = TrapezoidalProfile(200, 1000, start_speed=50).delays(400)
+        s_curve = SCurveProfile(200, 1000, start_speed=50).delays(400)
+        self.assertAlmostEqual(s_curve[0], 1 / 50.0)
+        self.assertAlmostEqual(s_curve[200], 1 / 200.0)
+        # the gentler start takes longer to reach full speed
+        self.assertTrue(s_curve[5] > trapezoid[5])
+        self.assertTrue(sum(s_curve) > sum(trapezoid))
+        speeds = [1 / d for d in s_curve[:200]]
+        self.assertEqual(speeds, sorted(speeds))
+
+    def test_s_curve_at_start_speed(self):
+        delays = SCurveProfile(100, 1000, start_speed=100).delays(4)
+        self.assertEqual(list(delays), [0.01] * 4)
+
+    def test_tables_are_cached(self):
+        profile = TrapezoidalProfile(200, 1000)
+        self.assertTrue(profile.delays(50) is profile.delays(-50))
+        self.assertFalse(profile.delays(50) is profile.delays(60))
+
+    def test_key(self):
+        self.assertEqual(ConstantProfile(0.05).key, ConstantProfile(0.05).key)
+        self.assertNotEqual(ConstantProfile(0.05).key,
+                            ConstantProfile(0.1).key)
+        self.assertEqual(TrapezoidalProfile(200, 1000).key,
+                         TrapezoidalProfile(200, 1000).key)
+        self.assertNotEqual(TrapezoidalProfile(200, 1000).key,
+                            SCurveProfile(200, 1000).key)
+        self.assertNotEqual(TrapezoidalProfile(200, 1000).key,
+                            TrapezoidalProfile(200, 1000, start_speed=10).key)
+
+    def test_python_matches_numpy(self):
+        if profiles.numpy is None:
+            self.skipTest('numpy is not installed')
+        for profile_class in (TrapezoidalProfile, SCurveProfile):
+            vectorised = profile_class(300, 2000).delays(250)
+            with mock.patch.object(profiles, 'numpy', None):
+                python = profile_class(300, 2000).delays(250)
+            for a, b in zip(vectorised, python):
+                self.assertAlmostEqual(a, b, 12)
@@ -0,0 +1,151 @@
+import unittest
+
+from stepper_motor.kinematics import ANTICLOCKWISE
+from stepper_motor.motor_position import StepperMotor
+from stepper_motor.ports import SimulatedPort, VirtualClock
+from stepper_motor.program import (
+    ANGLE,
+    ProgramError,
+    ProgramRunner,
+    ROTATE,
+    SPEED,
+    WAIT,
+    parse,
+    parse_line,
+    speed_to_delay,
+)
+from stepper_motor.stop import StopToken
+
+PHASES = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+
+
+class TestParse(unittest.TestCase):
+
+    def test_parse_line(self):
+        self.assertEqual(parse_line('rotate 45', 3), (ROTATE, 45.0, 3))
+        self.assertEqual(parse_line('ANGLE 270 ccw'),
+                         (ANGLE, (270.0, ANTICLOCKWISE), 0))
+        self.assertEqual(parse_line('SPEED 120rpm'), (SPEED, (120.0, 'rpm'), 0))
+        self.assertEqual(parse_line('SPEED 90 deg/s'),
+                         (SPEED, (90.0, 'deg/s'), 0))
+        self.assertEqual(parse_line('WAIT 0.5  # settle'), (WAIT, 0.5, 0))
+        self.assertEqual(parse_line('   # comment'), None)
+        self.assertEqual(parse_line(''), None)
+
+    def test_parse_line_errors(self):
+        for line in ('JUMP 4', 'ROTATE', 'ROTATE left', 'ANGLE 90 up',
+                     'SPEED 120', 'SPEED -1rpm', 'WAIT -1', 'REPEAT 1.5',
+                     'END 2'):
+            self.assertRaises(ProgramError, parse_line, line, 1)
+
+    def test_error_line_number(self):
+        try:
+            list(parse(['ROTATE 10', '', 'SPIN 4']))
+        except ProgramError as err:
+            self.assertIn('Line 3', str(err))
+        else:
+            self.fail('ProgramError not raised')
+
+    def test_repeat(self):
+        program = ['REPEAT 2', ' ROTATE 1', ' REPEAT 3', '  WAIT 1', ' END',
+                   'END', 'REPEAT 0', 'ROTATE 5', 'END', 'ROTATE 2']
+        commands = [(command, argument) for command, argument, _ in
+                    parse(program)]
+        self.assertEqual(commands, ([(ROTATE, 1.0)] + [(WAIT, 1.0)] * 3) * 2
+                         + [(ROTATE, 2.0)])
+
+    def test_unbalanced_repeat(self):
+        self.assertRaises(ProgramError, list, parse(['REPEAT 2', 'ROTATE 1']))
+        self.assertRaises(ProgramError, list, parse(['ROTATE 1', 'END']))
+
+    def test_streaming(self):
+        # instructions are produced before the rest of the program is read
+        def lines():
+            yield 'ROTATE 1'
+            raise AssertionError('read too far')
+        self.assertEqual(next(parse(lines()))[0], ROTATE)
+
+    def test_speed_to_delay(self):
+        self.assertAlmostEqual(speed_to_delay(60, 'rpm', 200), 0.005)
+        self.assertAlmostEqual(speed_to_delay(360, 'deg/s', 200), 0.005)
+        self.assertAlmostEqual(speed_to_delay(200, 'steps/s', 200), 0.005)
+        self.assertEqual(speed_to_delay(0.005, 's', 200), 0.005)
+
+
+class TestProgramRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.port = SimulatedPort(PHASES, self.clock)
+        self.stepper = StepperMotor(PHASES * 3, delay=0.01,
+                                    scheduler=self.clock.scheduler(),
+                                    port=self.port)
+
+    def test_run(self):
+        state = ProgramRunner(self.stepper).run(
+            ['ROTATE 90', 'ANGLE 0 CW', 'CYCLE -0.5', 'ANGLE 90'])
+        # 6 steps, 18 on the long way round, 12 back and 6 back
+        self.assertEqual(len(self.port.values), 42)
+        self.assertEqual(self.stepper.position, 6)
+        self.assertEqual(state, 6)
+        self.assertEqual(self.port.position, 6)
+        self.assertEqual(self.port.faults, [])
+
+    def test_no_gaps(self):
+        ProgramRunner(self.stepper).run(['REPEAT 50', 'ROTATE 15', 'END'])
+        self.assertEqual(len(self.port.times), 50)
+        intervals = [b - a for a, b in zip(self.port.times,
+                                           self.port.times[1:])]
+        for interval in intervals:
+            self.assertAlmostEqual(interval, 0.01)
+
+    def test_speed_and_wait(self):
+        ProgramRunner(self.stepper).run(
+            ['SPEED 100 steps/s', 'ROTATE 30', 'WAIT 0.25', 'SPEED 0.02s',
+             'ROTATE 30'])
+        times = self.port.times
+        self.assertEqual(len(times), 4)
+        self.assertAlmostEqual(times[1] - times[0], 0.01)
+        # held for the last step's delay then the wait
+        self.assertAlmostEqual(times[2] - times[1], 0.26)
+        self.assertAlmostEqual(times[3] - times[2], 0.02)
+        self.assertEqual(self.stepper.delay, 0.02)
+
+    def test_error_after_earlier_commands(self):
+        runner = ProgramRunner(self.stepper)
+        self.assertRaises(ProgramError, runner.run,
+                          ['ROTATE 30', 'ROTATE sideways', 'ROTATE 30'])
+        self.assertEqual(self.stepper.position, 2)
+
+    def test_stop(self):
+        stop = StopToken()
+        clock = self.clock
+        class StoppingPort(SimulatedPort):
+            def setData(self, value):
+                SimulatedPort.setData(self, value)
+                if len(self.values) == 5:
+                    stop.set()
+        port = StoppingPort(PHASES, clock)
+        stepper = StepperMotor(PHASES * 3, delay=0.01,
+                               scheduler=clock.scheduler(), port=port)
+        ProgramRunner(stepper, lookahead=2).run(
+            ['REPEAT 1000', 'ROTATE 15', 'END'], stop)
+        self.assertEqual(stepper.position, 5)
+
+    def test_late_move_is_not_rushed(self):
+        # a move which starts late is timed from when it starts
+        class SlowPort(SimulatedPort):
+            def setData(self, value):
+                SimulatedPort.setData(self, value)
+                if len(self.values) == 2:
+                    self.clock.sleep(0.5)
+        port = SlowPort(PHASES, self.clock)
+        stepper = StepperMotor(PHASES * 3, delay=0.01,
+                               scheduler=self.clock.scheduler(), port=port)
+        ProgramRunner(stepper).run(['ROTATE 30', 'ROTATE 30'])
+        times = port.times
+        self.assertAlmostEqual(times[3] - times[2], 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
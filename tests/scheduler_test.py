@@ -0,0 +1,79 @@
+import unittest
+
+from stepper_motor.scheduler import (
+    HYBRID,
+    SLEEP,
+    SPIN,
+    StepScheduler,
+)
+
+
+class FakeClock(object):
+    "Clock which only moves when slept on or polled."
+    def __init__(self, tick=0.0):
+        self.now = 0.0
+        self.tick = tick
+        self.sleeps = []
+
+    def time(self):
+        self.now += self.tick
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestStepScheduler(unittest.TestCase):
+
+    def test_invalid_mode(self):
+        self.assertRaises(ValueError, StepScheduler, mode='nap')
+
+    def test_sleep_to_absolute_deadlines(self):
+        clock = FakeClock()
+        scheduler = StepScheduler(SLEEP, clock=clock.time, sleep=clock.sleep)
+        scheduler.start()
+        # the work done for each step is absorbed by the next sleep
+        clock.now += 0.01
+        scheduler.wait(0.05)
+        clock.now += 0.02
+        scheduler.wait(0.05)
+        self.assertEqual(clock.sleeps, [0.04, 0.03])
+        self.assertAlmostEqual(clock.now, 0.1)
+
+    def test_late_steps_do_not_sleep(self):
+        clock = FakeClock()
+        scheduler = StepScheduler(SLEEP, clock=clock.time, sleep=clock.sleep)
+        scheduler.start()
+        clock.now += 0.07
+        scheduler.wait(0.05)
+        self.assertEqual(clock.sleeps, [])
+        # the next deadline is still measured from the start of the move
+        scheduler.wait(0.05)
+        self.assertAlmostEqual(clock.sleeps[0], 0.03)
+        jitter = scheduler.jitter()
+        self.assertEqual(jitter['steps'], 2)
+        self.assertAlmostEqual(jitter['max'], 0.02)
+        self.assertAlmostEqual(jitter['overrun'], 0.0)
+
+    def test_hybrid_spins_for_the_last_part(self):
+        clock = FakeClock(tick=0.0001)
+        scheduler = StepScheduler(HYBRID, spin_threshold=0.001,
+                                  clock=clock.time, sleep=clock.sleep)
+        scheduler.start()
+        scheduler.wait(0.01)
+        self.assertEqual(len(clock.sleeps), 1)
+        self.assertAlmostEqual(clock.sleeps[0], 0.0089)
+        self.assertTrue(clock.now >= 0.01)
+        self.assertTrue(scheduler.jitter()['max'] < 0.0002)
+
+    def test_spin_never_sleeps(self):
+        clock = FakeClock(tick=0.001)
+        scheduler = StepScheduler(SPIN, clock=clock.time, sleep=clock.sleep)
+        scheduler.start()
+        scheduler.wait_until(0.005)
+        self.assertEqual(clock.sleeps, [])
+        self.assertTrue(clock.now >= 0.005)
+
+    def test_jitter_without_move(self):
+        self.assertEqual(StepScheduler().jitter()['steps'], 0)
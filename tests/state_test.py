@@ -0,0 +1,143 @@
+import mock
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from stepper_motor.motor_position import StepperMotor
+from stepper_motor.state import (
+    Checkpoint,
+    StateFile,
+    StateLocked,
+    load_position,
+)
+
+PHASES = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+
+
+class TestStateFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'motor_state.ini')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_read_write(self):
+        state_file = StateFile(self.path)
+        self.assertEqual(state_file.read(), None)
+        state_file.write(-250)
+        self.assertEqual(state_file.read(), -250)
+        state_file.write(17)
+        self.assertEqual(state_file.read(), 17)
+        # only the state and nothing temporary is left behind
+        self.assertEqual(os.listdir(self.tempdir), ['motor_state.ini'])
+        self.assertTrue(state_file.remove())
+        self.assertFalse(state_file.remove())
+
+    def test_failed_write_keeps_old_state(self):
+        state_file = StateFile(self.path)
+        state_file.write(5)
+        with mock.patch('os.rename', side_effect=OSError('disk')):
+            self.assertRaises(OSError, state_file.write, 6)
+        self.assertEqual(state_file.read(), 5)
+        self.assertEqual(os.listdir(self.tempdir), ['motor_state.ini'])
+        # including when interrupted
+        with mock.patch('os.rename', side_effect=KeyboardInterrupt):
+            self.assertRaises(KeyboardInterrupt, state_file.write, 6)
+        self.assertEqual(os.listdir(self.tempdir), ['motor_state.ini'])
+
+    def test_write_syncs_directory(self):
+        with mock.patch('os.fsync') as fsync:
+            StateFile(self.path).write(5)
+        # the file then the directory
+        self.assertEqual(fsync.call_count, 2)
+
+    def test_write_keeps_mode(self):
+        umask = os.umask(0o022)
+        try:
+            StateFile(self.path).write(5)
+            self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+            os.chmod(self.path, 0o664)
+            StateFile(self.path).write(6)
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o664)
+
+    def test_lock_excludes_other_processes(self):
+        with StateFile(self.path) as state_file:
+            self.assertTrue(state_file.locked)
+            other = subprocess.call([sys.executable, '-c', (
+                "import sys\n"
+                "from stepper_motor.state import StateFile, StateLocked\n"
+                "try:\n"
+                "    StateFile(%r).lock(blocking=False)\n"
+                "except StateLocked:\n"
+                "    sys.exit(3)\n") % self.path])
+            self.assertEqual(other, 3)
+        self.assertFalse(state_file.locked)
+        # free once unlocked
+        StateFile(self.path).lock(blocking=False)
+
+    def test_lock_timeout(self):
+        with StateFile(self.path):
+            # flock excludes other open files in this process too
+            self.assertRaises(StateLocked, StateFile(self.path).lock,
+                              timeout=0.1)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.state_file = StateFile(os.path.join(self.tempdir, 'motor_state.ini'))
+        self.path = os.path.join(self.tempdir, 'motor_state.ini.checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_recover(self):
+        checkpoint = Checkpoint(self.path)
+        self.assertEqual(checkpoint.recover(), None)
+        checkpoint.begin(10)
+        checkpoint.save(-3000)
+        checkpoint.close()
+        # as if the process had died during the move
+        checkpoint = Checkpoint(self.path)
+        self.assertEqual(checkpoint.recover(), -3000)
+        checkpoint.end(-3001)
+        self.assertEqual(checkpoint.recover(), None)
+
+    @mock.patch('stepper_motor.state.logger')
+    def test_load_position(self, logger):
+        self.state_file.write(4)
+        checkpoint = Checkpoint(self.path)
+        self.assertEqual(load_position(self.state_file, checkpoint), 4)
+        checkpoint.save(9)
+        self.assertEqual(load_position(self.state_file, checkpoint), 9)
+        # the recovered position is now the saved state
+        self.assertEqual(self.state_file.read(), 9)
+        self.assertEqual(checkpoint.recover(), None)
+
+    def test_motor_checkpoints_during_move(self):
+        checkpoint = Checkpoint(self.path)
+        stepper = StepperMotor(PHASES, delay=0, steps_per_rev=24)
+        stepper.checkpoint = checkpoint
+        stepper.checkpoint_every = 10
+        saved = []
+        def write(value):
+            saved.append(checkpoint.recover())
+            if len(saved) == 25:
+                raise KeyboardInterrupt()
+        stepper.parallel_interface = mock.Mock()
+        stepper.parallel_interface.setData.side_effect = write
+        self.assertRaises(KeyboardInterrupt, stepper.turn_motor, 2)
+        self.assertEqual(saved[0], 0)
+        self.assertEqual(saved[10], 10)
+        self.assertEqual(saved[24], 20)
+        # finished at the true position
+        self.assertEqual(checkpoint.recover(), None)
+        self.assertEqual(stepper.position, 24)
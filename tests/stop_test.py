@@ -0,0 +1,42 @@
+import math
+import unittest
+
+from stepper_motor.stop import StopToken
+
+
+class TestStopToken(unittest.TestCase):
+
+    def test_event(self):
+        stop = StopToken()
+        self.assertFalse(stop.is_set())
+        self.assertFalse(stop.wait(0))
+        stop.set()
+        self.assertTrue(stop.is_set())
+        self.assertTrue(stop.wait(0))
+        stop.clear()
+        self.assertFalse(stop.is_set())
+
+    def test_invalid_deceleration(self):
+        self.assertRaises(ValueError, StopToken, 0)
+
+    def test_ramp(self):
+        stop = StopToken(deceleration=1000)
+        delays = stop.ramp(0.01)
+        expected = [1 / math.sqrt(speed) for speed in (8000, 6000, 4000)]
+        self.assertEqual(len(delays), 3)
+        for delay, slower in zip(delays, expected):
+            self.assertAlmostEqual(delay, slower)
+
+    def test_no_ramp(self):
+        # stops dead without a deceleration, when unpaced or already slow
+        self.assertEqual(StopToken().ramp(0.01), [])
+        self.assertEqual(StopToken(1000).ramp(0), [])
+        self.assertEqual(StopToken(1000).ramp(0.05), [])
+
+    def test_immediate(self):
+        stop = StopToken(deceleration=1000)
+        stop.set(immediate=True)
+        self.assertEqual(stop.ramp(0.01), [])
+        stop.clear()
+        self.assertFalse(stop.immediate)
+        self.assertEqual(len(stop.ramp(0.01)), 3)
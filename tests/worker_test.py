@@ -0,0 +1,116 @@
+import mock
+import threading
+import unittest
+
+from stepper_motor.motor_position import StepperMotor
+from stepper_motor.worker import (
+    MotorWorker,
+    MoveCancelled,
+    MoveFuture,
+    MoveTimeout,
+)
+
+PHASES = [0x05, 0x07, 0x06, 0x0E, 0x0A, 0x0B, 0x09, 0x0D]
+
+
+class TestMoveFuture(unittest.TestCase):
+
+    def test_result(self):
+        future = MoveFuture()
+        self.assertRaises(MoveTimeout, future.result, 0)
+        callback = mock.Mock()
+        future.add_done_callback(callback)
+        self.assertTrue(future.set_running())
+        self.assertFalse(future.cancel())
+        future.set_result(12)
+        self.assertTrue(future.done())
+        self.assertEqual(future.result(), 12)
+        self.assertEqual(future.exception(), None)
+        callback.assert_called_once_with(future)
+
+    def test_exception(self):
+        future = MoveFuture()
+        error = IOError('port')
+        future.set_exception(error)
+        self.assertRaises(IOError, future.result)
+        self.assertEqual(future.exception(), error)
+
+    def test_cancel(self):
+        future = MoveFuture()
+        self.assertTrue(future.cancel())
+        self.assertTrue(future.cancelled())
+        self.assertFalse(future.set_running())
+        self.assertRaises(MoveCancelled, future.result)
+
+
+class TestMotorWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.stepper = StepperMotor(PHASES, delay=0, steps_per_rev=24)
+        # setData is created up front, as mock creates child mocks on first
+        # use and two threads could each create one
+        self.stepper.parallel_interface = mock.Mock(setData=mock.Mock())
+        self.worker = MotorWorker(self.stepper)
+
+    def tearDown(self):
+        self.worker.stop()
+        self.worker.shutdown()
+
+    def test_moves_run_in_order(self):
+        first = self.worker.rotate(90)
+        second = self.worker.turn_to_angle(0)
+        third = self.worker.turn_motor(-1.5)
+        self.assertEqual(first.result(1), 6)
+        self.assertEqual(second.result(1), 0)
+        self.assertEqual(third.result(1), 12)
+        self.assertEqual(self.stepper.position, -36)
+
+    @mock.patch('stepper_motor.worker.logger')
+    def test_failed_move(self, logger):
+        self.stepper.parallel_interface.setData.side_effect = IOError('port')
+        self.assertRaises(IOError, self.worker.rotate(90).result, 1)
+        # the worker carries on with later moves
+        self.stepper.parallel_interface.setData.side_effect = None
+        self.assertEqual(self.worker.rotate(90).result(1), 6)
+
+    def test_spin_until_stopped(self):
+        self.worker.set_delay(0.001)
+        spinning = self.worker.spin(direction=-1)
+        queued = self.worker.rotate(90)
+        # wait for at least one revolution
+        writes = threading.Event()
+        def count(value):
+            if self.stepper.position <= -30:
+                writes.set()
+        self.stepper.parallel_interface.setData.side_effect = count
+        self.assertTrue(writes.wait(5))
+        self.worker.set_rpm(120)
+        self.assertAlmostEqual(self.stepper.delay, 60.0 / (120 * 24))
+        self.worker.stop()
+        self.assertEqual(spinning.result(1), self.stepper.state)
+        self.assertRaises(MoveCancelled, queued.result, 1)
+        self.assertTrue(self.stepper.position < -24)
+        # moves after the stop run
+        self.worker.set_delay(0)
+        self.assertEqual(self.worker.turn_to_angle(0).result(1), 0)
+
+    def test_stop_decelerates(self):
+        stepper = StepperMotor(PHASES, delay=0.001, steps_per_rev=24,
+                               port=mock.Mock(setData=mock.Mock()))
+        worker = MotorWorker(stepper, deceleration=100000)
+        try:
+            spinning = worker.spin()
+            started = threading.Event()
+            stepper.parallel_interface.setData.side_effect = \
+                lambda value: stepper.position > 10 and started.set()
+            self.assertTrue(started.wait(5))
+            worker.stop()
+            position = stepper.position
+            spinning.result(1)
+            # three steps slowing from 1000 steps per second
+            self.assertTrue(stepper.position - position >= 3)
+        finally:
+            worker.shutdown()
+
+    def test_invalid_rpm(self):
+        self.assertRaises(ValueError, self.worker.set_rpm, 0)